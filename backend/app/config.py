@@ -1,11 +1,61 @@
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # Réplica de lectura para reportes (ver app/database.py); vacío = todo al primario
+    DATABASE_REPLICA_URL: str = ""
+    DB_REPLICA_REINTENTO_SEGUNDOS: int = 30
     ANTHROPIC_API_KEY: str = ""
     ENVIRONMENT: str = "development"
 
+    # Pool de conexiones por proceso (con N workers se abren hasta
+    # N × (DB_POOL_SIZE + DB_MAX_OVERFLOW) conexiones contra Postgres)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 300
+    DB_STATEMENT_TIMEOUT_MS: int = 0     # 0 = sin límite
+    # Timeout por ruta (patrón fnmatch sobre el template → ms), el patrón más largo gana
+    DB_TIMEOUTS_POR_RUTA: Dict[str, int] = {
+        "/productos/buscar": 2000,
+        "/pos/*": 2000,
+        "/clientes*": 10000,
+        "/finanzas/*": 15000,
+        "/movimientos/*": 15000,
+        "/sucursales/comparacion": 15000,
+    }
+
+    # Registro de consultas lentas (ver app/services/consultas_lentas.py)
+    CONSULTA_LENTA_MS: int = 500
+    CONSULTAS_LENTAS_MAX: int = 200
+    ADMIN_TOKEN: str = ""                # vacío = /admin cerrado (403)
+
+    # Servidor de producción (ver gunicorn.conf.py)
+    PORT: int = 8000
+    WEB_WORKERS: int = 0                 # 0 = uno por CPU, hasta 4
+    WEB_TIMEOUT: int = 60
+    WEB_MAX_REQUESTS: int = 2000         # reciclar workers cada N requests (0 = nunca)
+    MIGRAR_AL_INICIAR: bool = True       # gunicorn migra una vez en el master y lo apaga en los workers
+
+    # Cache de dashboards (ver app/services/cache.py)
+    CACHE_HABILITADO: bool = True
+    CACHE_URL: str = ""              # vacío = memoria del proceso | redis://host:6379/0
+    CACHE_TTL_SEGUNDOS: int = 60
+    CACHE_MAX_ENTRADAS: int = 512
+
+    # Compresión de respuestas (ver app/services/serializacion.py)
+    COMPRESION_MIN_BYTES: int = 1024
+    COMPRESION_CALIDAD_BROTLI: int = 4
+    COMPRESION_NIVEL_GZIP: int = 6
+
+    # Catálogo del punto de venta en memoria (ver app/services/catalogo_pos.py)
+    POS_CATALOGO_VERIFICAR_MS: int = 1000
+    POS_CATALOGO_MARGEN_SEGUNDOS: int = 30
+    POS_CATALOGO_RECONSTRUIR_SEGUNDOS: int = 900
+
     class Config:
         env_file = ".env"
 
@@ -1,20 +1,31 @@
+import logging
 import os
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
 
-from app.database import Base, engine, SessionLocal
+from app.config import settings
+from app.database import Base, engine, read_engine, SessionLocal
 from app.routers import productos, ventas, compras, clientes, finanzas, deudas, stock, recordatorios
 from app.routers.movimientos_sucursales import movimientos_router, sucursales_router
-from app.routers import categorias_productos
+from app.routers import admin, categorias_productos, pos
 from app.routers import marcas_config as marcas_config_router
 from app.routers.configuracion_erp import config_router, sugerencias_router
+from app.services import busqueda, caja, consultas_lentas, inventario, metricas, precios, timeline
+from app.services.serializacion import RespuestaJSON, agregar_compresion
+from app.services.eventos import DOMINIOS, FINANZAS, VENTAS, emitir
 
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que serializa migraciones y seed entre procesos
+_LOCK_MIGRACIONES = 7_301_001
 
 
 def _run_migrations():
+    Base.metadata.create_all(bind=engine)
     with engine.connect() as conn:
         conn.execute(
             text("ALTER TABLE sucursales ADD COLUMN IF NOT EXISTS es_central BOOLEAN DEFAULT FALSE NOT NULL")
@@ -58,10 +69,75 @@ def _run_migrations():
             ) VALUES (1, 3, 5, 30, 15)
             ON CONFLICT (id) DO NOTHING
         """))
+        # Totales de stock mantenidos por variante (app/services/inventario.py)
+        conn.execute(text("ALTER TABLE variantes ADD COLUMN IF NOT EXISTS stock_total INTEGER NOT NULL DEFAULT 0"))
+        conn.execute(text("ALTER TABLE variantes ADD COLUMN IF NOT EXISTS stock_central INTEGER NOT NULL DEFAULT 0"))
+        # Transferencias de compra vinculadas por FK (antes solo por el texto de `notas`)
+        tenia_compra_id = conn.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'transferencias' AND column_name = 'compra_id'"
+        )).first()
+        if not tenia_compra_id:
+            conn.execute(text(
+                "ALTER TABLE transferencias ADD COLUMN IF NOT EXISTS compra_id INTEGER REFERENCES compras(id)"
+            ))
+            conn.execute(text("""
+                UPDATE transferencias t SET compra_id = c.id
+                FROM compras c
+                WHERE t.compra_id IS NULL
+                  AND t.sucursal_origen_id IS NULL
+                  AND (t.notas LIKE 'Distribución de compra #%'
+                       OR t.notas LIKE 'Ingreso al depósito central — compra #%')
+                  AND c.id = CAST(substring(t.notas FROM '#([0-9]+)$') AS INTEGER)
+            """))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_transferencias_compra "
+            "ON transferencias (compra_id) WHERE compra_id IS NOT NULL"
+        ))
+        # Índices para alertas de stock bajo (app/services/alertas_stock.py)
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_stock_sucursal_variante_sucursal "
+            "ON stock_sucursal (variante_id, sucursal_id) INCLUDE (cantidad)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_variantes_activas_producto "
+            "ON variantes (producto_id) INCLUDE (stock_minimo) WHERE activa"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_variantes_faltantes "
+            "ON variantes ((stock_minimo - stock_total) DESC) WHERE activa AND stock_total <= stock_minimo"
+        ))
+        # Historial de precios: series por variante y compactación
+        conn.execute(text("ALTER TABLE precio_historial ADD COLUMN IF NOT EXISTS cambios INTEGER NOT NULL DEFAULT 1"))
+        conn.execute(text("ALTER TABLE precio_historial ADD COLUMN IF NOT EXISTS desde TIMESTAMPTZ"))
+        conn.execute(text("ALTER TABLE precio_historial ADD COLUMN IF NOT EXISTS valor_minimo NUMERIC(12,2)"))
+        conn.execute(text("ALTER TABLE precio_historial ADD COLUMN IF NOT EXISTS valor_maximo NUMERIC(12,2)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_precio_historial_variante_campo_fecha "
+            "ON precio_historial (variante_id, campo, fecha)"
+        ))
+        # Línea de tiempo de movimientos: un índice (fecha, id) por rama del UNION
+        for nombre, definicion in timeline.INDICES.items():
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {nombre} ON {definicion}"))
+        # Versiones por dominio (cache de dashboards / eventos de escritura)
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS versiones_dominio (
+                dominio VARCHAR(50) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                actualizado_en TIMESTAMPTZ DEFAULT NOW()
+            )
+        """))
+        conn.execute(
+            text("INSERT INTO versiones_dominio (dominio, version) "
+                 "SELECT unnest(CAST(:dominios AS VARCHAR[])), 0 ON CONFLICT (dominio) DO NOTHING"),
+            {"dominios": list(DOMINIOS)},
+        )
+        # Búsqueda de productos: pg_trgm + tsvector mantenido por triggers
+        busqueda.instalar(conn)
         conn.commit()
 
 
-async def _seed_and_migrate():
+def _seed_and_migrate():
     from app.models import Sucursal, CategoriaGasto, CategoriaProducto, Variante, StockSucursal
 
     _run_migrations()
@@ -96,6 +172,8 @@ async def _seed_and_migrate():
         # ── Migración one-time: variante.stock_actual → StockSucursal(central) ─
         central = db.query(Sucursal).filter(Sucursal.es_central == True).first()
         variantes_con_stock = db.query(Variante).filter(Variante.stock_actual > 0).all()
+        if variantes_con_stock:
+            inventario.declarar_motivo(db, "migracion")
         for variante in variantes_con_stock:
             ss = db.query(StockSucursal).filter(
                 StockSucursal.variante_id == variante.id,
@@ -114,13 +192,54 @@ async def _seed_and_migrate():
         if variantes_con_stock:
             db.commit()
 
+        # ── Totales de stock por variante: backfill / corrección de desvíos ──
+        corregidas = inventario.reparar_totales(db)
+        if corregidas:
+            db.commit()
+            logger.info("Totales de stock corregidos en %d variantes", corregidas)
+
+        # ── Ventas viejas sin costo_unitario: costo vigente a la fecha de venta ──
+        completados = precios.completar_costos_ventas(db)
+        if completados:
+            emitir(db, VENTAS, FINANZAS)
+            db.commit()
+            logger.info("Costo histórico completado en %d ítems de venta", completados)
+
+        # ── Libro de caja: se arma desde el historial la primera vez ──
+        if caja.inicializar(db):
+            db.commit()
+            logger.info("Libro de caja reconstruido desde el historial")
+
+        # ── Libro de stock: la primera foto marca el inicio del historial ──
+        if inventario.inicio_historial(db) is None:
+            inventario.tomar_snapshot(db)
+            db.commit()
+
     finally:
         db.close()
 
 
+def migrar():
+    """
+    Esquema, migraciones y datos iniciales.  Un advisory lock de Postgres
+    los serializa entre workers, réplicas y deploys superpuestos: el
+    primero en tomarlo aplica todo y los demás encuentran los pasos ya
+    hechos (todos son idempotentes).
+    """
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:clave)"), {"clave": _LOCK_MIGRACIONES})
+        try:
+            _seed_and_migrate()
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:clave)"), {"clave": _LOCK_MIGRACIONES})
+            conn.commit()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await _seed_and_migrate()
+    # Con gunicorn ya migró el master antes de forkear (ver gunicorn.conf.py)
+    if settings.MIGRAR_AL_INICIAR:
+        migrar()
     yield
 
 
@@ -129,6 +248,7 @@ app = FastAPI(
     description="API para gestión de stock, ventas y finanzas",
     version="1.2.0",
     lifespan=lifespan,
+    default_response_class=RespuestaJSON,
 )
 
 ALLOWED_ORIGINS = [o.strip() for o in os.getenv(
@@ -136,6 +256,11 @@ ALLOWED_ORIGINS = [o.strip() for o in os.getenv(
     "http://localhost:5173,http://localhost:3000"
 ).split(",") if o.strip()]
 
+metricas.registrar_pool(
+    {"primario": engine, **({"replica": read_engine} if read_engine is not engine else {})}
+)
+agregar_compresion(app)
+app.add_middleware(metricas.MetricasMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
@@ -152,14 +277,31 @@ app.include_router(clientes.router)
 app.include_router(finanzas.router)
 app.include_router(deudas.router)
 app.include_router(stock.router)
+app.include_router(pos.router)
 app.include_router(recordatorios.router)
 app.include_router(movimientos_router)
 app.include_router(sucursales_router)
 app.include_router(marcas_config_router.router)
 app.include_router(config_router)
 app.include_router(sugerencias_router)
+app.include_router(admin.router)
+
+
+@app.exception_handler(OperationalError)
+def error_operacional(request: Request, exc: OperationalError):
+    # 57014 = query_canceled: statement_timeout de la ruta (ver app/services/consultas_lentas.py)
+    if getattr(exc.orig, "pgcode", None) == "57014":
+        return JSONResponse(status_code=503, content={"detail": "La consulta superó el tiempo máximo de la ruta"})
+    logger.exception("Error de base de datos en %s", request.url.path)
+    return JSONResponse(status_code=500, content={"detail": "Error de base de datos"})
 
 
 @app.get("/", tags=["Health"])
 def health_check():
     return {"status": "ok", "app": "Gestión de Suplementos v1.2"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def exponer_metricas():
+    """Métricas en formato Prometheus (text exposition 0.0.4)."""
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,6 @@
 from sqlalchemy import (
-    Column, Integer, String, Numeric, Boolean, DateTime,
-    ForeignKey, Enum, Text, func, UniqueConstraint
+    Column, Integer, BigInteger, String, Numeric, Boolean, DateTime,
+    ForeignKey, Enum, Text, func, text, UniqueConstraint, Index
 )
 from sqlalchemy.orm import relationship
 import enum
@@ -111,6 +111,9 @@ class Variante(Base):
     precio_venta = Column(Numeric(12, 2), nullable=False, default=0)
     stock_actual = Column(Integer, default=0)   # stock en depósito central
     stock_minimo = Column(Integer, default=0)
+    # Totales mantenidos desde stock_sucursal (ver app/services/inventario.py)
+    stock_total = Column(Integer, nullable=False, default=0, server_default="0")
+    stock_central = Column(Integer, nullable=False, default=0, server_default="0")
     activa = Column(Boolean, default=True)
     creado_en = Column(DateTime(timezone=True), server_default=func.now())
     actualizado_en = Column(DateTime(timezone=True), onupdate=func.now())
@@ -140,11 +143,52 @@ class StockSucursal(Base):
     sucursal = relationship("Sucursal", back_populates="stocks")
 
 
+# ─── MOVIMIENTOS DE STOCK (libro append-only) ────────────────────────────────
+
+class MovimientoStock(Base):
+    """Cada cambio de stock_sucursal: delta, motivo y referencia (ver app/services/inventario.py)."""
+    __tablename__ = "movimientos_stock"
+    __table_args__ = (
+        Index("ix_movimientos_stock_fecha", "fecha"),
+        Index("ix_movimientos_stock_variante_sucursal_fecha", "variante_id", "sucursal_id", "fecha"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    variante_id = Column(Integer, ForeignKey("variantes.id"), nullable=False)
+    sucursal_id = Column(Integer, ForeignKey("sucursales.id"), nullable=False)
+    delta = Column(Integer, nullable=False)
+    motivo = Column(String(30), nullable=False)   # venta | compra | transferencia | ajuste | …
+    referencia_id = Column(Integer)
+    fecha = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class SnapshotStock(Base):
+    """Foto completa de stock_sucursal; punto de partida para reconstruir el stock a una fecha."""
+    __tablename__ = "snapshots_stock"
+
+    id = Column(Integer, primary_key=True)
+    fecha = Column(DateTime(timezone=True), nullable=False, unique=True)
+    filas = Column(Integer, nullable=False, default=0)
+
+
+class SnapshotStockItem(Base):
+    __tablename__ = "snapshot_stock_items"
+
+    snapshot_id = Column(Integer, ForeignKey("snapshots_stock.id", ondelete="CASCADE"), primary_key=True)
+    variante_id = Column(Integer, primary_key=True)
+    sucursal_id = Column(Integer, primary_key=True)
+    cantidad = Column(Integer, nullable=False)
+
+
 # ─── TRANSFERENCIAS ───────────────────────────────────────────────────────────
 
 class Transferencia(Base):
     """Movimiento de stock entre central y sucursales, o entre sucursales."""
     __tablename__ = "transferencias"
+    __table_args__ = (
+        Index("ix_transferencias_compra", "compra_id", postgresql_where=text("compra_id IS NOT NULL")),
+        Index("ix_transferencias_fecha", "fecha", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     variante_id = Column(Integer, ForeignKey("variantes.id"), nullable=False)
@@ -153,6 +197,7 @@ class Transferencia(Base):
     sucursal_destino_id = Column(Integer, ForeignKey("sucursales.id"), nullable=True)  # null = central
     cantidad = Column(Integer, nullable=False)
     notas = Column(Text)
+    compra_id = Column(Integer, ForeignKey("compras.id"), nullable=True)   # ingreso de stock por compra
     fecha = Column(DateTime(timezone=True), server_default=func.now())
 
     variante = relationship("Variante", foreign_keys=[variante_id], back_populates="transferencias_origen")
@@ -179,6 +224,9 @@ class Cliente(Base):
 
 class Venta(Base):
     __tablename__ = "ventas"
+    __table_args__ = (
+        Index("ix_ventas_confirmadas_fecha", "fecha", "id", postgresql_where=text("estado = 'confirmada'")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     cliente_id = Column(Integer, ForeignKey("clientes.id"), nullable=True)
@@ -216,8 +264,15 @@ class VentaItem(Base):
 # ─── HISTORIAL DE PRECIOS ─────────────────────────────────────────────────────
 
 class PrecioHistorial(Base):
-    """Registra cambios de costo o precio_venta en una variante."""
+    """
+    Registra cambios de costo o precio_venta en una variante.  Las filas
+    compactadas (ver app/services/precios.py) resumen varios cambios de un
+    período: anterior del primero, nuevo del último, mínimo y máximo.
+    """
     __tablename__ = "precio_historial"
+    __table_args__ = (
+        Index("ix_precio_historial_variante_campo_fecha", "variante_id", "campo", "fecha"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     variante_id = Column(Integer, ForeignKey("variantes.id"), nullable=False)
@@ -225,6 +280,11 @@ class PrecioHistorial(Base):
     valor_anterior = Column(Numeric(12, 2), nullable=False)
     valor_nuevo = Column(Numeric(12, 2), nullable=False)
     fecha = Column(DateTime(timezone=True), server_default=func.now())
+    # Solo en filas compactadas
+    cambios = Column(Integer, nullable=False, default=1, server_default="1")
+    desde = Column(DateTime(timezone=True))
+    valor_minimo = Column(Numeric(12, 2))
+    valor_maximo = Column(Numeric(12, 2))
 
     variante = relationship("Variante", back_populates="historial_precios")
 
@@ -233,6 +293,9 @@ class PrecioHistorial(Base):
 
 class Compra(Base):
     __tablename__ = "compras"
+    __table_args__ = (
+        Index("ix_compras_fecha", "fecha", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     proveedor = Column(String(200))
@@ -265,6 +328,9 @@ class CompraItem(Base):
 
 class Gasto(Base):
     __tablename__ = "gastos"
+    __table_args__ = (
+        Index("ix_gastos_fecha", "fecha", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     concepto = Column(String(300), nullable=False)
@@ -283,6 +349,9 @@ class Gasto(Base):
 
 class AjusteSaldo(Base):
     __tablename__ = "ajustes_saldo"
+    __table_args__ = (
+        Index("ix_ajustes_saldo_fecha", "fecha", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tipo = Column(Enum(MetodoPagoEnum), nullable=False)
@@ -292,11 +361,41 @@ class AjusteSaldo(Base):
     fecha = Column(DateTime(timezone=True), server_default=func.now())
 
 
+# ─── CAJA (libro de movimientos de dinero) ────────────────────────────────────
+
+class MovimientoCaja(Base):
+    """Asiento del libro de caja; `saldo` es el saldo corrido del método tras el movimiento."""
+    __tablename__ = "movimientos_caja"
+    __table_args__ = (
+        Index("ix_movimientos_caja_metodo_fecha", "metodo_pago", "fecha", "id"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    metodo_pago = Column(Enum(MetodoPagoEnum), nullable=False)
+    monto = Column(Numeric(14, 2), nullable=False)     # + ingreso / - egreso
+    saldo = Column(Numeric(14, 2), nullable=False)
+    origen = Column(String(20), nullable=False)        # venta | compra | gasto | ajuste
+    referencia_id = Column(Integer)
+    fecha = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
+class SaldoCaja(Base):
+    """Saldo actual por método de pago (una fila por método, lectura O(1))."""
+    __tablename__ = "saldos_caja"
+
+    metodo_pago = Column(Enum(MetodoPagoEnum), primary_key=True)
+    saldo = Column(Numeric(14, 2), nullable=False, default=0)
+    actualizado_en = Column(DateTime(timezone=True), server_default=func.now())
+
+
 # ─── AJUSTE DE GANANCIA ───────────────────────────────────────────────────────
 
 class GananciaAjuste(Base):
     """Registra cada vez que el usuario 'limpió' (separó) la ganancia acumulada."""
     __tablename__ = "ganancia_ajuste"
+    __table_args__ = (
+        Index("ix_ganancia_ajuste_fecha", "fecha", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     monto_extraido = Column(Numeric(12, 2), nullable=False)
@@ -357,3 +456,14 @@ class ConfiguracionERP(Base):
     ventana_dias_analisis_ventas = Column(Integer, nullable=False, default=30)
     umbral_ventas_producto_estrella = Column(Integer, nullable=False, default=15)
     actualizado_en = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+# ─── VERSIONES POR DOMINIO ────────────────────────────────────────────────────
+
+class VersionDominio(Base):
+    """Contador que se incrementa en cada commit que modifica el dominio (ver services/eventos)."""
+    __tablename__ = "versiones_dominio"
+
+    dominio = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    actualizado_en = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,30 @@
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import List, Optional
+
+from app.config import settings
+from app.schemas import ConsultaLentaResponse
+from app.services import consultas_lentas
+
+
+def _verificar_token(x_admin_token: Optional[str] = Header(None)):
+    """/admin exige ADMIN_TOKEN en X-Admin-Token; sin ADMIN_TOKEN configurado queda cerrado."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Configurá ADMIN_TOKEN para usar /admin")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+
+
+router = APIRouter(prefix="/admin", tags=["Administración"], dependencies=[Depends(_verificar_token)])
+
+
+@router.get("/consultas-lentas", response_model=List[ConsultaLentaResponse])
+def listar_consultas_lentas(limite: Optional[int] = Query(None, ge=1, le=1000)):
+    """Consultas lentas de este proceso (con varios workers, cada uno tiene las suyas)."""
+    return consultas_lentas.registradas(limite)
+
+
+@router.delete("/consultas-lentas")
+def limpiar_consultas_lentas():
+    return {"eliminadas": consultas_lentas.limpiar()}
@@ -5,6 +5,8 @@ from pydantic import BaseModel, Field
 
 from app.database import get_db
 from app.models import CategoriaProducto
+from app.services.eventos import emitir, CATEGORIAS
+from app.services.http_condicional import condicional
 
 router = APIRouter(prefix="/categorias-producto", tags=["Categorías Producto"])
 
@@ -28,7 +30,7 @@ class CategoriaProductoResponse(BaseModel):
 
 # ─── Endpoints ───────────────────────────────────────────────────────────────
 
-@router.get("", response_model=List[CategoriaProductoResponse])
+@router.get("", response_model=List[CategoriaProductoResponse], dependencies=[Depends(condicional(CATEGORIAS))])
 def listar_categorias(db: Session = Depends(get_db)):
     return (
         db.query(CategoriaProducto)
@@ -47,6 +49,7 @@ def crear_categoria(data: CategoriaProductoCreate, db: Session = Depends(get_db)
         raise HTTPException(status_code=400, detail="Ya existe una categoría con ese nombre")
     cat = CategoriaProducto(nombre=data.nombre)
     db.add(cat)
+    emitir(db, CATEGORIAS)
     db.commit()
     db.refresh(cat)
     return cat
@@ -60,6 +63,7 @@ def actualizar_categoria(
     if not cat:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     cat.nombre = data.nombre
+    emitir(db, CATEGORIAS)
     db.commit()
     db.refresh(cat)
     return cat
@@ -71,4 +75,5 @@ def eliminar_categoria(categoria_id: int, db: Session = Depends(get_db)):
     if not cat:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     cat.activa = False
+    emitir(db, CATEGORIAS)
     db.commit()
\ No newline at end of file
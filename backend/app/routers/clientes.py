@@ -5,7 +5,7 @@ from typing import Optional, List
 from decimal import Decimal
 from datetime import datetime, timedelta
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models import Cliente, Venta, VentaItem
 from app.schemas import (
     ClienteCreate, ClienteUpdate, ClienteResponse, ClienteConResumen
@@ -75,7 +75,7 @@ def top_clientes_del_mes(
     mes: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
     limite: int = Query(10, le=50),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     now = datetime.now()
     mes = mes or now.month
@@ -114,7 +114,7 @@ def top_clientes_del_mes(
 @router.get("/top-historico", response_model=List[ClienteConResumen])
 def top_clientes_historico(
     limite: int = Query(10, le=50),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     resultados = (
         db.query(
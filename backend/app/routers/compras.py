@@ -1,4 +1,7 @@
+from collections import defaultdict
+
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from sqlalchemy import insert, text
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from decimal import Decimal
@@ -7,6 +10,9 @@ from app.database import get_db
 from app.models import Compra, CompraItem, Variante, StockSucursal, Sucursal, Transferencia, TipoTransferenciaEnum
 from app.schemas import CompraCreate, CompraCreateConDistribucion, CompraResponse, FacturaIAResponse
 from app.services.ia_facturas import procesar_factura_con_ia
+from app.services.metricas import MOVIMIENTOS_STOCK
+from app.services.eventos import emitir, COMPRAS, STOCK, PRODUCTOS
+from app.services.inventario import mover_stock, registrar_movimientos, sumar_a_totales
 
 router = APIRouter(prefix="/compras", tags=["Compras"])
 
@@ -19,26 +25,6 @@ def _get_central(db: Session) -> Sucursal:
     return central
 
 
-def _sumar_stock_sucursal(db: Session, variante_id: int, sucursal_id: int, cantidad: int):
-    ss = db.query(StockSucursal).filter(
-        StockSucursal.variante_id == variante_id,
-        StockSucursal.sucursal_id == sucursal_id
-    ).first()
-    if ss:
-        ss.cantidad += cantidad
-    else:
-        db.add(StockSucursal(variante_id=variante_id, sucursal_id=sucursal_id, cantidad=cantidad))
-
-
-def _restar_stock_sucursal(db: Session, variante_id: int, sucursal_id: int, cantidad: int):
-    ss = db.query(StockSucursal).filter(
-        StockSucursal.variante_id == variante_id,
-        StockSucursal.sucursal_id == sucursal_id
-    ).first()
-    if ss:
-        ss.cantidad = max(0, ss.cantidad - cantidad)
-
-
 @router.get("", response_model=List[CompraResponse])
 def listar_compras(
     sucursal_id: Optional[int] = Query(None),
@@ -78,15 +64,26 @@ def obtener_compra(compra_id: int, db: Session = Depends(get_db)):
 
 
 def _registrar_items(db: Session, compra: Compra, items_data: list) -> Decimal:
-    """Crea CompraItems, actualiza stock y registra transferencias. Retorna el total."""
+    """
+    Crea CompraItems, actualiza stock y registra transferencias. Retorna el total.
+
+    Camino en bloque: las variantes se traen en una consulta, items y
+    transferencias se insertan con un executemany cada uno y el stock entra
+    con un único upsert por (variante, sucursal).  Una factura de 200 líneas
+    repartida en 5 sucursales son ~6 sentencias en lugar de >1.000.
+    """
     central = _get_central(db)
+    ids = {i.variante_id for i in items_data}
+    variantes = {v.id: v for v in db.query(Variante).filter(Variante.id.in_(ids))}
+    faltantes = sorted(ids - variantes.keys())
+    if faltantes:
+        raise HTTPException(status_code=404, detail=f"Variante {faltantes[0]} no encontrada")
+
     total = Decimal("0")
+    items, transferencias = [], []
+    ingresos = defaultdict(int)        # (variante_id, sucursal_id) → cantidad
 
     for item_data in items_data:
-        variante = db.query(Variante).filter(Variante.id == item_data.variante_id).first()
-        if not variante:
-            raise HTTPException(status_code=404, detail=f"Variante {item_data.variante_id} no encontrada")
-
         # Validar que la distribución no supere la cantidad comprada
         total_distribuido = sum(d.cantidad for d in item_data.distribucion)
         if total_distribuido > item_data.cantidad:
@@ -98,59 +95,101 @@ def _registrar_items(db: Session, compra: Compra, items_data: list) -> Decimal:
         subtotal = item_data.costo_unitario * item_data.cantidad
         total += subtotal
 
-        db.add(CompraItem(
-            compra_id=compra.id,
-            variante_id=item_data.variante_id,
-            cantidad=item_data.cantidad,
-            costo_unitario=item_data.costo_unitario,
-            subtotal=subtotal,
-        ))
-        variante.costo = item_data.costo_unitario
+        items.append({
+            "compra_id": compra.id,
+            "variante_id": item_data.variante_id,
+            "cantidad": item_data.cantidad,
+            "costo_unitario": item_data.costo_unitario,
+            "subtotal": subtotal,
+        })
+        variantes[item_data.variante_id].costo = item_data.costo_unitario
 
         # Lo que no se distribuye explícitamente va al depósito central
-        a_central = item_data.cantidad - total_distribuido
-        if a_central > 0:
-            _sumar_stock_sucursal(db, variante.id, central.id, a_central)
-            db.add(Transferencia(
-                variante_id=variante.id,
-                tipo=TipoTransferenciaEnum.central_a_sucursal,
-                sucursal_origen_id=None,
-                sucursal_destino_id=central.id,
-                cantidad=a_central,
-                notas=f"Ingreso al depósito central — compra #{compra.id}",
-            ))
-
-        for dist in item_data.distribucion:
-            if dist.cantidad > 0:
-                _sumar_stock_sucursal(db, variante.id, dist.sucursal_id, dist.cantidad)
-                db.add(Transferencia(
-                    variante_id=variante.id,
-                    tipo=TipoTransferenciaEnum.central_a_sucursal,
-                    sucursal_origen_id=None,
-                    sucursal_destino_id=dist.sucursal_id,
-                    cantidad=dist.cantidad,
-                    notas=f"Distribución de compra #{compra.id}",
-                ))
-
+        destinos = [(central.id, item_data.cantidad - total_distribuido,
+                     f"Ingreso al depósito central — compra #{compra.id}")]
+        destinos += [(d.sucursal_id, d.cantidad, f"Distribución de compra #{compra.id}") for d in item_data.distribucion]
+        for sucursal_id, cantidad, notas in destinos:
+            if cantidad > 0:
+                ingresos[(item_data.variante_id, sucursal_id)] += cantidad
+                transferencias.append({
+                    "variante_id": item_data.variante_id,
+                    "tipo": TipoTransferenciaEnum.central_a_sucursal,
+                    "sucursal_origen_id": None,
+                    "sucursal_destino_id": sucursal_id,
+                    "cantidad": cantidad,
+                    "notas": notas,
+                    "compra_id": compra.id,
+                })
+
+    db.execute(insert(CompraItem), items)
+    if transferencias:
+        db.execute(insert(Transferencia), transferencias)
+    mover_stock(db, ingresos, "compra", compra.id)
+    db.expire(compra, ["items"])
     return total
 
 
 def _revertir_items(db: Session, compra: Compra):
-    """Revierte completamente el stock de una compra antes de modificarla o eliminarla."""
-    for item in compra.items:
-        # Revertir todas las transferencias asociadas a esta compra
-        transferencias = db.query(Transferencia).filter(
-            Transferencia.variante_id == item.variante_id,
-            Transferencia.notas.in_([
-                f"Distribución de compra #{compra.id}",
-                f"Ingreso al depósito central — compra #{compra.id}",
-            ])
+    """
+    Revierte completamente el stock de una compra antes de modificarla o eliminarla.
+
+    Las transferencias de la compra se ubican por `compra_id` (indexado) y se
+    borran en un solo DELETE; el stock se descuenta en un solo UPDATE por
+    (variante, sucursal), sin bajar de 0, y cada cambio real queda en el libro
+    de movimientos.
+    """
+    borradas = db.execute(
+        text("DELETE FROM transferencias WHERE compra_id = :id RETURNING variante_id, sucursal_destino_id, cantidad"),
+        {"id": compra.id},
+    ).all()
+    a_restar = defaultdict(int)
+    for variante_id, sucursal_id, cantidad in borradas:
+        a_restar[(variante_id, sucursal_id)] += cantidad
+
+    if a_restar:
+        claves = sorted(a_restar)
+        params = {
+            "variantes": [v for v, _ in claves],
+            "sucursales": [s for _, s in claves],
+            "cantidades": [a_restar[k] for k in claves],
+        }
+        filtro = """
+            FROM unnest(CAST(:variantes AS INTEGER[]), CAST(:sucursales AS INTEGER[]), CAST(:cantidades AS INTEGER[]))
+                 AS d(variante_id, sucursal_id, cantidad)
+        """
+        # Lock primero: el UPDATE siguiente lee el valor previo desde la misma tabla
+        db.execute(
+            text(f"""
+                SELECT ss.id FROM stock_sucursal ss
+                JOIN (SELECT d.variante_id, d.sucursal_id {filtro}) d
+                  ON ss.variante_id = d.variante_id AND ss.sucursal_id = d.sucursal_id
+                ORDER BY ss.id FOR UPDATE OF ss
+            """),
+            params,
+        )
+        cambios = db.execute(
+            text(f"""
+                UPDATE stock_sucursal ss
+                SET cantidad = GREATEST(0, ss.cantidad - d.cantidad)
+                {filtro}, stock_sucursal previo
+                WHERE ss.variante_id = d.variante_id AND ss.sucursal_id = d.sucursal_id AND previo.id = ss.id
+                RETURNING ss.variante_id, ss.sucursal_id, ss.cantidad - previo.cantidad
+            """),
+            params,
         ).all()
-        for t in transferencias:
-            _restar_stock_sucursal(db, item.variante_id, t.sucursal_destino_id, t.cantidad)
-            db.delete(t)
+        cambios = [c for c in cambios if c[2]]
+        registrar_movimientos(
+            db, [c[0] for c in cambios], [c[1] for c in cambios], [c[2] for c in cambios],
+            "compra_revertida", compra.id,
+        )
+        # El UPDATE no pasa por el ORM: totales por variante y objetos en sesión se refrescan
+        sumar_a_totales(db, {(c[0], c[1]): c[2] for c in cambios})
+        for obj in list(db.identity_map.values()):
+            if isinstance(obj, (StockSucursal, Transferencia)):
+                db.expire(obj)
 
-        db.delete(item)
+    db.execute(text("DELETE FROM compra_items WHERE compra_id = :id"), {"id": compra.id})
+    db.expire(compra, ["items"])
 
 
 @router.post("", response_model=CompraResponse, status_code=201)
@@ -164,7 +203,9 @@ def registrar_compra(data: CompraCreateConDistribucion, db: Session = Depends(ge
     db.add(compra)
     db.flush()
     compra.total = _registrar_items(db, compra, data.items)
+    emitir(db, COMPRAS, STOCK, PRODUCTOS)
     db.commit()
+    MOVIMIENTOS_STOCK.inc("compra", valor=len(data.items))
     db.refresh(compra)
     return compra
 
@@ -177,7 +218,6 @@ def actualizar_compra(compra_id: int, data: CompraCreateConDistribucion, db: Ses
 
     # Revertir stock e items anteriores
     _revertir_items(db, compra)
-    db.flush()
 
     # Actualizar campos del encabezado
     compra.proveedor = data.proveedor
@@ -185,7 +225,9 @@ def actualizar_compra(compra_id: int, data: CompraCreateConDistribucion, db: Ses
     compra.notas = data.notas
 
     compra.total = _registrar_items(db, compra, data.items)
+    emitir(db, COMPRAS, STOCK, PRODUCTOS)
     db.commit()
+    MOVIMIENTOS_STOCK.inc("compra", valor=len(data.items))
     db.refresh(compra)
     return compra
 
@@ -197,6 +239,9 @@ def eliminar_compra(compra_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Compra no encontrada")
 
     # Revertir CORRECTAMENTE todo el stock (central + sucursales)
+    items = len(compra.items)
     _revertir_items(db, compra)
     db.delete(compra)
+    emitir(db, COMPRAS, STOCK)
     db.commit()
+    MOVIMIENTOS_STOCK.inc("compra_revertida", valor=items)
@@ -22,7 +22,6 @@ from app.models import (
     VentaItem,
     Venta,
     EstadoVentaEnum,
-    StockSucursal,
 )
 from app.schemas import (
     ConfiguracionERPResponse,
@@ -114,16 +113,6 @@ def _obtener_inventario_con_velocidad(db: Session, ventana_dias: int) -> list[di
         .subquery()
     )
 
-    # Subconsulta: stock total por variante (todas las sucursales)
-    stock_sub = (
-        db.query(
-            StockSucursal.variante_id,
-            sqlfunc.coalesce(sqlfunc.sum(StockSucursal.cantidad), 0).label("stock_total"),
-        )
-        .group_by(StockSucursal.variante_id)
-        .subquery()
-    )
-
     # Query principal
     rows = (
         db.query(
@@ -132,11 +121,10 @@ def _obtener_inventario_con_velocidad(db: Session, ventana_dias: int) -> list[di
             Variante.sabor,
             Variante.tamanio,
             Variante.costo,
-            sqlfunc.coalesce(stock_sub.c.stock_total, 0).label("stock_actual"),
+            Variante.stock_total.label("stock_actual"),
             sqlfunc.coalesce(ventas_sub.c.total_vendido, 0).label("total_vendido"),
         )
         .join(Producto, Producto.id == Variante.producto_id)
-        .outerjoin(stock_sub, stock_sub.c.variante_id == Variante.id)
         .outerjoin(ventas_sub, ventas_sub.c.variante_id == Variante.id)
         .filter(Variante.activa == True, Producto.activo == True)
         .all()
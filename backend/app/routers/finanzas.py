@@ -1,20 +1,27 @@
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, text
 from typing import Optional, List
 from decimal import Decimal
-from datetime import datetime
+from datetime import date, datetime
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models import (
     Venta, Compra, Gasto, AjusteSaldo, VentaItem, Variante,
     MetodoPagoEnum, CategoriaGasto, GananciaAjuste
 )
 from app.schemas import (
     LiquidezResponse, AjusteSaldoCreate, AjusteSaldoResponse,
+    SaldosCajaResponse, MovimientoCajaResponse,
     AnalisisMesResponse, ProductoTopResponse, GastoCreate, GastoResponse,
-    ValorStockResponse
+    ValorStockResponse, ValorStockDesglose, DimensionValorStock,
+    RankingVentasResponse, DimensionRanking
 )
+from app.services import caja
+from app.services.cache import cacheado
+from app.services.eventos import emitir, VENTAS, COMPRAS, STOCK, PRODUCTOS, FINANZAS, SUCURSALES
+from app.services.ranking_ventas import ranking, rango_fechas, rango_mes
+from app.services.valuacion_stock import valuar
 
 router = APIRouter(prefix="/finanzas", tags=["Finanzas"])
 
@@ -52,51 +59,12 @@ def _calcular_ganancia_neta(db: Session) -> Decimal:
 # ─── LIQUIDEZ ────────────────────────────────────────────────────────────────
 
 @router.get("/liquidez", response_model=LiquidezResponse)
-def obtener_liquidez(db: Session = Depends(get_db)):
-    def saldo_metodo(metodo: str) -> Decimal:
-        ingresos = db.query(func.sum(Venta.total)).filter(
-            Venta.metodo_pago == metodo,
-            Venta.estado == "confirmada"
-        ).scalar() or Decimal("0")
-
-        egresos_compras = db.query(func.sum(Compra.total)).filter(
-            Compra.metodo_pago == metodo
-        ).scalar() or Decimal("0")
-
-        egresos_gastos = db.query(func.sum(Gasto.monto)).filter(
-            Gasto.metodo_pago == metodo
-        ).scalar() or Decimal("0")
-
-        ultimo_ajuste = db.query(AjusteSaldo).filter(
-            AjusteSaldo.tipo == metodo
-        ).order_by(AjusteSaldo.fecha.desc()).first()
-
-        if ultimo_ajuste:
-            ingresos_post = db.query(func.sum(Venta.total)).filter(
-                Venta.metodo_pago == metodo,
-                Venta.estado == "confirmada",
-                Venta.fecha > ultimo_ajuste.fecha
-            ).scalar() or Decimal("0")
-
-            egresos_post = (
-                (db.query(func.sum(Compra.total)).filter(
-                    Compra.metodo_pago == metodo,
-                    Compra.fecha > ultimo_ajuste.fecha
-                ).scalar() or Decimal("0"))
-                +
-                (db.query(func.sum(Gasto.monto)).filter(
-                    Gasto.metodo_pago == metodo,
-                    Gasto.fecha > ultimo_ajuste.fecha
-                ).scalar() or Decimal("0"))
-            )
-
-            return ultimo_ajuste.monto_nuevo + ingresos_post - egresos_post
-
-        return ingresos - egresos_compras - egresos_gastos
-
-    efectivo = saldo_metodo(MetodoPagoEnum.efectivo)
-    transferencia = saldo_metodo(MetodoPagoEnum.transferencia)
-    tarjeta = saldo_metodo(MetodoPagoEnum.tarjeta)
+def obtener_liquidez(db: Session = Depends(get_read_db)):
+    # Saldo corrido mantenido por el libro de caja (app/services/caja.py)
+    saldos = caja.saldos(db)
+    efectivo = saldos[MetodoPagoEnum.efectivo.value]
+    transferencia = saldos[MetodoPagoEnum.transferencia.value]
+    tarjeta = saldos[MetodoPagoEnum.tarjeta.value]
 
     now = datetime.now()
     ganancia_bruta_total = _calcular_ganancia_bruta(db)
@@ -116,6 +84,32 @@ def obtener_liquidez(db: Session = Depends(get_db)):
     )
 
 
+# ─── LIBRO DE CAJA ───────────────────────────────────────────────────────────
+
+@router.get("/saldos", response_model=SaldosCajaResponse)
+def obtener_saldos(
+    fecha: Optional[datetime] = Query(None, description="Saldo vigente a ese instante (default: actual)"),
+    db: Session = Depends(get_read_db)
+):
+    saldos = caja.saldos(db, fecha)
+    return SaldosCajaResponse(fecha=fecha, total=sum(saldos.values(), Decimal("0")), **saldos)
+
+
+@router.get("/caja", response_model=List[MovimientoCajaResponse])
+def listar_movimientos_caja(
+    metodo_pago: Optional[MetodoPagoEnum] = Query(None),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    limite: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db)
+):
+    """Movimientos de dinero con el saldo corrido del método, más recientes primero."""
+    return caja.movimientos(
+        db, metodo_pago.value if metodo_pago else None, desde, hasta, limite=limite, offset=offset
+    )
+
+
 # ─── LIMPIAR GANANCIA ────────────────────────────────────────────────────────
 
 @router.post("/ganancia/limpiar")
@@ -134,6 +128,7 @@ def limpiar_ganancia(nota: Optional[str] = None, db: Session = Depends(get_db)):
         nota=nota or f"Extracción del {datetime.now().strftime('%d/%m/%Y %H:%M')}",
     )
     db.add(ajuste)
+    emitir(db, FINANZAS)
     db.commit()
     return {"ok": True, "monto_extraido": float(ganancia_actual)}
 
@@ -165,6 +160,7 @@ def ajustar_saldo(data: AjusteSaldoCreate, db: Session = Depends(get_db)):
             nota=data.nota or "Ajuste manual de ganancia",
         )
         db.add(ajuste_ganancia)
+        emitir(db, FINANZAS)
         db.commit()
         db.refresh(ajuste_ganancia)
         return AjusteSaldoResponse(
@@ -187,6 +183,7 @@ def ajustar_saldo(data: AjusteSaldoCreate, db: Session = Depends(get_db)):
         nota=data.nota,
     )
     db.add(ajuste)
+    emitir(db, FINANZAS)
     db.commit()
     db.refresh(ajuste)
     return ajuste
@@ -195,10 +192,11 @@ def ajustar_saldo(data: AjusteSaldoCreate, db: Session = Depends(get_db)):
 # ─── ANÁLISIS DEL MES ────────────────────────────────────────────────────────
 
 @router.get("/analisis-mes", response_model=AnalisisMesResponse)
+@cacheado(VENTAS, COMPRAS, FINANZAS, PRODUCTOS)
 def analisis_del_mes(
     mes: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     now = datetime.now()
     mes = mes or now.month
@@ -242,59 +240,45 @@ def analisis_del_mes(
 
 # ─── PRODUCTOS TOP ────────────────────────────────────────────────────────────
 
+def _rango(mes: Optional[int], anio: Optional[int], desde: Optional[date], hasta: Optional[date]):
+    """desde/hasta (días inclusive) tienen prioridad sobre mes/anio (default: mes actual)."""
+    if desde or hasta:
+        return rango_fechas(desde or date.min, hasta or date.today())
+    now = datetime.now()
+    return rango_mes(mes or now.month, anio or now.year)
+
+
 @router.get("/productos-top", response_model=List[ProductoTopResponse])
 def productos_mas_vendidos(
     mes: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
+    desde: Optional[date] = Query(None),
+    hasta: Optional[date] = Query(None),
+    sucursal_id: Optional[int] = Query(None),
     limite: int = Query(10, le=50),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    now = datetime.now()
-    mes = mes or now.month
-    anio = anio or now.year
-
-    resultados = (
-        db.query(
-            VentaItem.variante_id,
-            func.sum(VentaItem.cantidad).label("cantidad_vendida"),
-            func.sum(VentaItem.subtotal).label("ingreso_total"),
-        )
-        .join(Venta, Venta.id == VentaItem.venta_id)
-        .filter(
-            Venta.estado == "confirmada",
-            extract("month", Venta.fecha) == mes,
-            extract("year", Venta.fecha) == anio,
-        )
-        .group_by(VentaItem.variante_id)
-        .order_by(func.sum(VentaItem.subtotal).desc())
-        .limit(limite)
-        .all()
-    )
-
-    lista = []
-    for variante_id, cantidad, ingreso in resultados:
-        variante = db.query(Variante).filter(Variante.id == variante_id).first()
-        if not variante:
-            continue
+    inicio, fin = _rango(mes, anio, desde, hasta)
+    filas = ranking(db, inicio, fin, ["variante"], sucursal_id=sucursal_id, limite=limite)
+    return [ProductoTopResponse(**f) for f in filas]
 
-        costo_total = variante.costo * cantidad
-        ganancia = ingreso - costo_total
-        margen = float(ganancia / ingreso * 100) if ingreso > 0 else 0.0
 
-        lista.append(ProductoTopResponse(
-            variante_id=variante_id,
-            nombre_producto=variante.producto.nombre,
-            marca=variante.producto.marca,
-            sabor=variante.sabor,
-            tamanio=variante.tamanio,
-            cantidad_vendida=cantidad,
-            ingreso_total=ingreso,
-            costo_total=costo_total,
-            ganancia=ganancia,
-            margen_porcentaje=round(margen, 2)
-        ))
-
-    return lista
+@router.get("/ranking-ventas", response_model=List[RankingVentasResponse])
+@cacheado(VENTAS, PRODUCTOS, SUCURSALES)
+def ranking_ventas(
+    agrupar: List[DimensionRanking] = Query([DimensionRanking.variante], description="Dimensiones de agrupación"),
+    mes: Optional[int] = Query(None),
+    anio: Optional[int] = Query(None),
+    desde: Optional[date] = Query(None),
+    hasta: Optional[date] = Query(None),
+    sucursal_id: Optional[int] = Query(None),
+    limite: Optional[int] = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    """Unidades, ingreso, costo (al momento de la venta) y margen agrupados por las dimensiones pedidas."""
+    inicio, fin = _rango(mes, anio, desde, hasta)
+    filas = ranking(db, inicio, fin, [d.value for d in agrupar], sucursal_id=sucursal_id, limite=limite)
+    return [RankingVentasResponse(**f) for f in filas]
 
 
 # ─── GASTOS ──────────────────────────────────────────────────────────────────
@@ -304,6 +288,7 @@ def registrar_gasto(data: GastoCreate, db: Session = Depends(get_db)):
     from app.models import Gasto
     gasto = Gasto(**data.model_dump())
     db.add(gasto)
+    emitir(db, FINANZAS)
     db.commit()
     db.refresh(gasto)
     return gasto
@@ -314,7 +299,7 @@ def listar_gastos(
     mes: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
     categoria_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     from app.models import Gasto
     query = db.query(Gasto)
@@ -330,7 +315,7 @@ def listar_gastos(
 
 
 @router.get("/categorias-gasto")
-def listar_categorias(db: Session = Depends(get_db)):
+def listar_categorias(db: Session = Depends(get_read_db)):
     return db.query(CategoriaGasto).filter(CategoriaGasto.activa == True).all()
 
 
@@ -338,6 +323,7 @@ def listar_categorias(db: Session = Depends(get_db)):
 def crear_categoria(nombre: str, db: Session = Depends(get_db)):
     cat = CategoriaGasto(nombre=nombre)
     db.add(cat)
+    emitir(db, FINANZAS)
     db.commit()
     db.refresh(cat)
     return cat
@@ -345,69 +331,99 @@ def crear_categoria(nombre: str, db: Session = Depends(get_db)):
 
 # ─── RESUMEN DEL DÍA ─────────────────────────────────────────────────────────
 
+_SQL_RESUMEN_DIA = """
+    WITH diario AS (
+        SELECT CAST(fecha AS DATE) AS dia, SUM(total) AS total
+        FROM ventas
+        WHERE estado = 'confirmada' AND fecha >= CAST(LEAST(:inicio_mes, :ayer) AS TIMESTAMP)
+        GROUP BY 1
+    ),
+    catalogo AS (
+        SELECT id, (precio_venta - costo) / precio_venta * 100 AS margen
+        FROM variantes
+        WHERE activa AND precio_venta > 0 AND costo > 0
+    ),
+    vendidas AS (
+        SELECT vi.variante_id, SUM(vi.cantidad) AS unidades
+        FROM venta_items vi JOIN ventas v ON v.id = vi.venta_id
+        WHERE v.estado = 'confirmada' AND v.fecha >= CAST(:desde_ponderado AS TIMESTAMP)
+        GROUP BY vi.variante_id
+    )
+    SELECT
+        (SELECT COALESCE(SUM(total), 0) FROM diario WHERE dia = :hoy) AS ingresos_hoy,
+        (SELECT COALESCE(SUM(total), 0) FROM diario WHERE dia = :ayer) AS ingresos_ayer,
+        (SELECT COALESCE(array_agg(total ORDER BY dia), '{}') FROM diario WHERE dia >= :inicio_mes) AS tendencia,
+        (SELECT AVG(margen) FROM catalogo) AS margen_promedio,
+        (SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY margen) FROM catalogo) AS margen_mediana,
+        (SELECT SUM(c.margen * u.unidades) / NULLIF(SUM(u.unidades), 0)
+         FROM catalogo c JOIN vendidas u ON u.variante_id = c.id) AS margen_ponderado,
+        CASE WHEN :con_margen_ventas THEN (
+            SELECT (SUM(vi.subtotal) - SUM(vi.costo_unitario * vi.cantidad)) / NULLIF(SUM(vi.subtotal), 0) * 100
+            FROM venta_items vi JOIN ventas v ON v.id = vi.venta_id
+            WHERE v.estado = 'confirmada' AND v.fecha >= CAST(:inicio_mes AS TIMESTAMP)
+              AND vi.costo_unitario IS NOT NULL
+        ) END AS margen_ventas
+"""
+
+
+def _redondear(valor, digitos: int = 1) -> Optional[float]:
+    return round(float(valor), digitos) if valor is not None else None
+
+
 @router.get("/resumen-dia")
-def resumen_del_dia(db: Session = Depends(get_db)):
-    from datetime import date, timedelta
-    from app.models import Variante as VarianteModel
+@cacheado(VENTAS, PRODUCTOS, ttl=30)
+def resumen_del_dia(
+    ventana_dias: int = Query(30, ge=1, le=365, description="Días de ventas para el margen ponderado por unidades"),
+    margen_ventas: bool = Query(False, description="Incluir margen real del mes según costo_unitario de cada venta"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Ingresos de hoy y ayer, serie diaria del mes y estadísticas de margen del
+    catálogo (promedio, mediana y ponderado por unidades vendidas), todo en
+    una sola consulta.  `margen_ventas` agrega el margen realizado del mes con
+    el costo congelado en cada item de venta.
+    """
+    from datetime import timedelta
 
     hoy = date.today()
     ayer = hoy - timedelta(days=1)
 
-    def ingresos_dia(d):
-        inicio = datetime.combine(d, datetime.min.time())
-        fin = datetime.combine(d, datetime.max.time())
-        return db.query(func.sum(Venta.total)).filter(
-            Venta.estado == "confirmada",
-            Venta.fecha >= inicio,
-            Venta.fecha <= fin
-        ).scalar() or Decimal("0")
-
-    ingresos_hoy = ingresos_dia(hoy)
-    ingresos_ayer = ingresos_dia(ayer)
+    fila = db.execute(text(_SQL_RESUMEN_DIA), {
+        "hoy": hoy,
+        "ayer": ayer,
+        "inicio_mes": hoy.replace(day=1),
+        "desde_ponderado": hoy - timedelta(days=ventana_dias),
+        "con_margen_ventas": margen_ventas,
+    }).mappings().one()
 
+    ingresos_hoy = fila["ingresos_hoy"]
+    ingresos_ayer = fila["ingresos_ayer"]
     if ingresos_ayer > 0:
         delta = round(float((ingresos_hoy - ingresos_ayer) / ingresos_ayer * 100), 1)
     else:
         delta = None
 
-    primer_dia = datetime.combine(hoy.replace(day=1), datetime.min.time())
-    ventas_mes = db.query(
-        func.date(Venta.fecha).label("dia"),
-        func.sum(Venta.total).label("total")
-    ).filter(
-        Venta.estado == "confirmada",
-        Venta.fecha >= primer_dia
-    ).group_by(func.date(Venta.fecha)).order_by("dia").all()
-
-    tendencia = [float(row.total) for row in ventas_mes]
-
-    variantes = db.query(VarianteModel).filter(
-        VarianteModel.activa == True,
-        VarianteModel.precio_venta > 0,
-        VarianteModel.costo > 0
-    ).all()
-    if variantes:
-        margenes = [
-            float((v.precio_venta - v.costo) / v.precio_venta * 100)
-            for v in variantes
-        ]
-        margen_promedio = round(sum(margenes) / len(margenes), 1)
-    else:
-        margen_promedio = 0.0
-
     return {
         "ingresos_hoy": float(ingresos_hoy),
         "ingresos_ayer": float(ingresos_ayer),
         "delta_hoy": delta,
-        "tendencia_mensual": tendencia,
-        "margen_promedio": margen_promedio,
+        "tendencia_mensual": [float(t) for t in fila["tendencia"]],
+        "margen_promedio": _redondear(fila["margen_promedio"]) or 0.0,
+        "margen_mediana": _redondear(fila["margen_mediana"]),
+        "margen_ponderado": _redondear(fila["margen_ponderado"]),
+        "margen_ventas": _redondear(fila["margen_ventas"]) if margen_ventas else None,
     }
 
 
 # ─── VALOR TOTAL STOCK ───────────────────────────────────────────────────────
 
 @router.get("/valor-stock", response_model=ValorStockResponse)
-def obtener_valor_total_stock(db: Session = Depends(get_db)):
+@cacheado(STOCK, PRODUCTOS)
+def obtener_valor_total_stock(
+    desglose: List[DimensionValorStock] = Query([], description="Desgloses a incluir: sucursal, marca, categoria"),
+    fecha: Optional[datetime] = Query(None, description="Valuación histórica a esta fecha"),
+    db: Session = Depends(get_read_db)
+):
     """
     Calcula el valor total del stock en pesos.
     Retorna:
@@ -415,43 +431,18 @@ def obtener_valor_total_stock(db: Session = Depends(get_db)):
     - total_valor_venta: suma de (cantidad * precio_venta) para todas las variantes
     - cantidad_total_unidades: cantidad total de unidades en stock
     - diferencia_ganancia_potencial: diferencia entre valor venta y valor costo
+    - desglose: los mismos totales por sucursal / marca / categoría (misma consulta)
     """
-    from app.models import StockSucursal
-    
-    try:
-        # Obtener todos los stocks
-        stocks = db.query(StockSucursal).all()
-        
-        total_valor_costo = Decimal("0")
-        total_valor_venta = Decimal("0")
-        cantidad_total = 0
-        
-        for stock in stocks:
-            variante = stock.variante
-            if not variante:
-                continue
-            cantidad = stock.cantidad
-            
-            valor_costo = Decimal(str(cantidad)) * (variante.costo or Decimal("0"))
-            valor_venta = Decimal(str(cantidad)) * (variante.precio_venta or Decimal("0"))
-            
-            total_valor_costo += valor_costo
-            total_valor_venta += valor_venta
-            cantidad_total += cantidad
-        
-        ganancia_potencial = total_valor_venta - total_valor_costo
-        
-        return ValorStockResponse(
-            total_valor_costo=total_valor_costo,
-            total_valor_venta=total_valor_venta,
-            cantidad_total_unidades=cantidad_total,
-            diferencia_ganancia_potencial=ganancia_potencial
-        )
-    except Exception as e:
-        from fastapi import HTTPException
-        print(f"Error en valor-stock: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error al calcular valor de stock: {str(e)}")
-
+    filas = valuar(db, [d.value for d in desglose], fecha)
+    total, grupos = filas[0], filas[1:]
+    return ValorStockResponse(
+        total_valor_costo=total["total_valor_costo"],
+        total_valor_venta=total["total_valor_venta"],
+        cantidad_total_unidades=total["cantidad_total_unidades"],
+        diferencia_ganancia_potencial=total["diferencia_ganancia_potencial"],
+        fecha=fecha,
+        desglose=[ValorStockDesglose(**g) for g in grupos],
+    )
 
 
 # ─── EXPORTAR CSV ────────────────────────────────────────────────────────────
@@ -460,7 +451,7 @@ def obtener_valor_total_stock(db: Session = Depends(get_db)):
 def exportar_csv(
     mes: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Genera un CSV con el resumen financiero del mes y los movimientos."""
     from fastapi.responses import StreamingResponse
@@ -472,8 +463,8 @@ def exportar_csv(
 
     # Obtener análisis
     analisis = analisis_del_mes(mes=mes, anio=anio, db=db)
-    top = productos_mas_vendidos(mes=mes, anio=anio, limite=20, db=db)
-    gastos_list = listar_gastos(mes=mes, anio=anio, db=db)
+    top = productos_mas_vendidos(mes=mes, anio=anio, desde=None, hasta=None, sucursal_id=None, limite=20, db=db)
+    gastos_list = listar_gastos(mes=mes, anio=anio, categoria_id=None, db=db)
 
     output = io.StringIO()
     writer = csv.writer(output)
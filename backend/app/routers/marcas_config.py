@@ -5,6 +5,8 @@ from pydantic import BaseModel, Field
 
 from app.database import get_db
 from app.models import MarcaConfig
+from app.services.eventos import emitir, MARCAS
+from app.services.http_condicional import condicional
 
 router = APIRouter(prefix="/marcas-config", tags=["Marcas Config"])
 
@@ -26,7 +28,7 @@ class MarcaConfigUpsert(BaseModel):
 
 # ─── Endpoints ───────────────────────────────────────────────────────────────
 
-@router.get("", response_model=List[MarcaConfigResponse])
+@router.get("", response_model=List[MarcaConfigResponse], dependencies=[Depends(condicional(MARCAS))])
 def listar_marcas_config(db: Session = Depends(get_db)):
     """Retorna colores configurados para cada marca."""
     return db.query(MarcaConfig).order_by(MarcaConfig.nombre).all()
@@ -41,6 +43,7 @@ def upsert_marca_config(nombre: str, data: MarcaConfigUpsert, db: Session = Depe
     else:
         config = MarcaConfig(nombre=nombre, color=data.color)
         db.add(config)
+    emitir(db, MARCAS)
     db.commit()
     db.refresh(config)
     return config
@@ -61,6 +64,7 @@ def batch_upsert(marcas: List[dict], db: Session = Depends(get_db)):
             db.add(config)
             db.flush()
         resultado.append(config)
+    emitir(db, MARCAS)
     db.commit()
     for c in resultado:
         db.refresh(c)
@@ -5,13 +5,19 @@ from typing import Optional, List
 from decimal import Decimal
 from datetime import datetime
 
-from app.database import get_db
-from app.models import Venta, Compra, VentaItem, Sucursal, StockSucursal, Variante, Gasto, GananciaAjuste  # Variante usado para producto_mas_vendido
+from app.database import get_db, get_read_db
+from app.models import Venta, Compra, VentaItem, Sucursal, StockSucursal, Variante  # Variante usado para producto_mas_vendido
 from pydantic import BaseModel
 from app.schemas import (
-    VentaResponse, CompraResponse, ResumenPeriodo,
+    VentaResponse, CompraResponse, ResumenPeriodo, MetodoPago,
+    TipoMovimientoTimeline, TimelineResponse,
     SucursalCreate, SucursalResponse, SucursalComparacionResponse
 )
+from app.services.cache import cacheado
+from app.services.eventos import emitir, VENTAS, PRODUCTOS, SUCURSALES
+from app.services.http_condicional import condicional
+from app.services import timeline
+from app.services.ranking_ventas import ranking, rango_mes
 
 class SucursalUpdate(BaseModel):
     nombre: str
@@ -26,7 +32,7 @@ def resumen_periodo(
     fecha_desde: Optional[datetime] = Query(None),
     fecha_hasta: Optional[datetime] = Query(None),
     sucursal_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     query = db.query(Venta).filter(Venta.estado == "confirmada")
 
@@ -86,7 +92,7 @@ def movimientos_ventas(
     sucursal_id: Optional[int] = Query(None),
     metodo_pago: Optional[str] = Query(None),
     cliente_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     query = db.query(Venta).filter(Venta.estado == "confirmada")
 
@@ -109,7 +115,7 @@ def movimientos_compras(
     fecha_desde: Optional[datetime] = Query(None),
     fecha_hasta: Optional[datetime] = Query(None),
     sucursal_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     query = db.query(Compra)
 
@@ -123,55 +129,56 @@ def movimientos_compras(
     return query.order_by(Compra.fecha.desc()).all()
 
 
-@movimientos_router.get("/otros")
-def movimientos_otros(
+@movimientos_router.get("/timeline", response_model=TimelineResponse)
+def movimientos_timeline(
+    tipo: Optional[List[TipoMovimientoTimeline]] = Query(None),
     fecha_desde: Optional[datetime] = Query(None),
     fecha_hasta: Optional[datetime] = Query(None),
     sucursal_id: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    metodo_pago: Optional[MetodoPago] = Query(None),
+    cursor: Optional[str] = Query(None, description="`siguiente` de la página anterior"),
+    limite: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_read_db)
 ):
-    """Devuelve gastos y retiros de ganancia (ganancia_ajuste) en formato combinado."""
-    gastos_q = db.query(Gasto)
-    if fecha_desde:
-        gastos_q = gastos_q.filter(Gasto.fecha >= fecha_desde)
-    if fecha_hasta:
-        gastos_q = gastos_q.filter(Gasto.fecha <= fecha_hasta)
-    if sucursal_id:
-        gastos_q = gastos_q.filter(Gasto.sucursal_id == sucursal_id)
-
-    gastos = [
-        {
-            "id": g.id,
-            "tipo": "gasto",
-            "fecha": g.fecha,
-            "descripcion": g.concepto,
-            "metodo_pago": g.metodo_pago.value if g.metodo_pago else None,
-            "monto": g.monto,
-            "sucursal_id": g.sucursal_id,
-        }
-        for g in gastos_q.all()
-    ]
+    """
+    Ventas, compras, gastos, retiros de ganancia, ajustes de saldo y
+    transferencias en una sola lista, más recientes primero, paginada por
+    cursor.  Ver app/services/timeline.py.
+    """
+    try:
+        items, siguiente = timeline.pagina(
+            db,
+            tipos=[t.value for t in tipo] if tipo else None,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+            sucursal_id=sucursal_id,
+            metodo_pago=metodo_pago.value if metodo_pago else None,
+            cursor=cursor,
+            limite=limite,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return TimelineResponse(items=items, siguiente=siguiente)
 
-    ajustes_q = db.query(GananciaAjuste)
-    if fecha_desde:
-        ajustes_q = ajustes_q.filter(GananciaAjuste.fecha >= fecha_desde)
-    if fecha_hasta:
-        ajustes_q = ajustes_q.filter(GananciaAjuste.fecha <= fecha_hasta)
-
-    ajustes = [
-        {
-            "id": a.id,
-            "tipo": "ganancia",
-            "fecha": a.fecha,
-            "descripcion": a.nota,
-            "monto": a.monto_extraido,
-        }
-        for a in ajustes_q.all()
-    ]
 
-    combined = gastos + ajustes
-    combined.sort(key=lambda x: x["fecha"], reverse=True)
-    return combined
+@movimientos_router.get("/otros")
+def movimientos_otros(
+    fecha_desde: Optional[datetime] = Query(None),
+    fecha_hasta: Optional[datetime] = Query(None),
+    sucursal_id: Optional[int] = Query(None),
+    limite: Optional[int] = Query(None, ge=1, le=5000),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Gastos y retiros de ganancia (ganancia_ajuste) en formato combinado.
+    Es la línea de tiempo restringida a esos dos tipos; para paginar usar
+    /movimientos/timeline?tipo=gasto&tipo=ganancia.
+    """
+    items, _ = timeline.pagina(
+        db, tipos=("gasto", "ganancia"), fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+        sucursal_id=sucursal_id, limite=limite,
+    )
+    return items
 
 
 # ─── SUCURSALES ──────────────────────────────────────────────────────────────
@@ -179,7 +186,7 @@ def movimientos_otros(
 sucursales_router = APIRouter(prefix="/sucursales", tags=["Sucursales"])
 
 
-@sucursales_router.get("", response_model=List[SucursalResponse])
+@sucursales_router.get("", response_model=List[SucursalResponse], dependencies=[Depends(condicional(SUCURSALES))])
 def listar_sucursales(db: Session = Depends(get_db)):
     return db.query(Sucursal).filter(Sucursal.activa == True).all()
 
@@ -188,16 +195,18 @@ def listar_sucursales(db: Session = Depends(get_db)):
 def crear_sucursal(data: SucursalCreate, db: Session = Depends(get_db)):
     sucursal = Sucursal(nombre=data.nombre)
     db.add(sucursal)
+    emitir(db, SUCURSALES)
     db.commit()
     db.refresh(sucursal)
     return sucursal
 
 
 @sucursales_router.get("/comparacion", response_model=List[SucursalComparacionResponse])
+@cacheado(VENTAS, PRODUCTOS, SUCURSALES)
 def comparar_sucursales(
     mes: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     now = datetime.now()
     mes = mes or now.month
@@ -254,6 +263,7 @@ def actualizar_sucursal(sucursal_id: int, data: SucursalUpdate, db: Session = De
     if not sucursal:
         raise HTTPException(status_code=404, detail="Sucursal no encontrada")
     sucursal.nombre = data.nombre
+    emitir(db, SUCURSALES)
     db.commit()
     db.refresh(sucursal)
     return sucursal
@@ -265,6 +275,7 @@ def eliminar_sucursal(sucursal_id: int, db: Session = Depends(get_db)):
     if not sucursal:
         raise HTTPException(status_code=404, detail="Sucursal no encontrada")
     sucursal.activa = False
+    emitir(db, SUCURSALES)
     db.commit()
 
 
@@ -304,40 +315,29 @@ def dashboard_sucursal(
     ).scalar() or Decimal("0")
     porcentaje = float(total_ventas / total_global * 100) if total_global > 0 else 0.0
 
-    # ── Rentabilidad ─────────────────────────────────────────────────────────
-    costo_total = sum(
-        item.variante.costo * item.cantidad
-        for v in ventas
-        for item in v.items
-    )
+    # ── Rentabilidad (costo congelado en cada item) ──────────────────────────
+    inicio, fin = rango_mes(mes, anio)
+    costo_total = ranking(db, inicio, fin, [], sucursal_id=sucursal_id)[0]["costo_total"] or Decimal("0")
     rentabilidad = total_ventas - costo_total
 
     # ── Producto más vendido ─────────────────────────────────────────────────
-    conteo: dict = {}
-    for venta in ventas:
-        for item in venta.items:
-            key = item.variante_id
-            conteo[key] = conteo.get(key, 0) + item.cantidad
-
     producto_mas_vendido = None
-    if conteo:
-        top_variante_id = max(conteo, key=conteo.get)
-        top_variante = db.query(Variante).filter(Variante.id == top_variante_id).first()
-        if top_variante:
-            producto_mas_vendido = {
-                "nombre": top_variante.producto.nombre,
-                "marca": top_variante.producto.marca,
-                "sabor": top_variante.sabor,
-                "tamanio": top_variante.tamanio,
-                "unidades_vendidas": conteo[top_variante_id],
-            }
+    top = ranking(db, inicio, fin, ["variante"], sucursal_id=sucursal_id, limite=1, orden="unidades")
+    if top:
+        producto_mas_vendido = {
+            "nombre": top[0]["nombre_producto"],
+            "marca": top[0]["marca"],
+            "sabor": top[0]["sabor"],
+            "tamanio": top[0]["tamanio"],
+            "unidades_vendidas": top[0]["cantidad_vendida"],
+        }
 
     # ── Stock en sucursal ────────────────────────────────────────────────────
     stocks = db.query(StockSucursal).filter(StockSucursal.sucursal_id == sucursal_id).all()
     stock_total_sucursal = sum(s.cantidad for s in stocks)
 
     # Stock total global (todas las sucursales + central)
-    stock_total_global = int(db.query(func.sum(StockSucursal.cantidad)).scalar() or 0)
+    stock_total_global = int(db.query(func.sum(Variante.stock_total)).scalar() or 0)
     porcentaje_stock = float(stock_total_sucursal / stock_total_global * 100) if stock_total_global > 0 else 0.0
 
     # Desglose de stock por producto
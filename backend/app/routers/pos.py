@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.schemas import PosLookupResponse, PosStockSucursal
+from app.services import catalogo_pos
+
+router = APIRouter(prefix="/pos", tags=["Punto de venta"])
+
+
+@router.get("/lookup", response_model=PosLookupResponse)
+def lookup(
+    response: Response,
+    sku: Optional[str] = Query(None, min_length=1, max_length=100),
+    variante_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Resuelve un SKU escaneado (o un id de variante) desde el catálogo en
+    memoria del proceso (ver app/services/catalogo_pos.py).  La versión va
+    también en el header X-Catalogo-Version, incluso en el 404.
+    """
+    if (sku is None) == (variante_id is None):
+        raise HTTPException(status_code=400, detail="Indicá sku o variante_id")
+    catalogo = catalogo_pos.actual(db)
+    if sku is not None:
+        item = catalogo.por_sku.get(catalogo_pos.normalizar_sku(sku))
+    else:
+        item = catalogo.por_id.get(variante_id)
+    if item is None:
+        raise HTTPException(
+            status_code=404, detail="Variante no encontrada",
+            headers={"X-Catalogo-Version": str(catalogo.version)},
+        )
+    response.headers["X-Catalogo-Version"] = str(catalogo.version)
+    return PosLookupResponse(
+        version=catalogo.version,
+        variante_id=item.variante_id,
+        producto_id=item.producto_id,
+        sku=item.sku,
+        nombre=item.nombre,
+        marca=item.marca,
+        sabor=item.sabor,
+        tamanio=item.tamanio,
+        precio_venta=item.precio_venta,
+        stock_total=item.stock_total,
+        stock=[PosStockSucursal(sucursal_id=s, cantidad=c) for s, c in item.stock],
+    )
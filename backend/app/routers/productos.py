@@ -1,17 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from typing import Optional, List
+from sqlalchemy import func, select, text
+from typing import Optional, List, Union
 from decimal import Decimal
+from datetime import datetime
 from pydantic import BaseModel as PydanticBase
 
 from app.database import get_db
 from app.models import Producto, Variante, PrecioHistorial
 from app.schemas import (
-    ProductoCreate, ProductoUpdate, ProductoResponse,
+    ProductoCreate, ProductoUpdate, ProductoResponse, ProductoListResponse, ProductoBusquedaResponse,
+    VistaProducto, OrdenProducto,
     VarianteCreate, VarianteUpdate, VarianteResponse,
-    AjustePrecioLote, ModoAjustePrecio
+    AjustePrecioLote, ModoAjustePrecio,
+    CampoPrecio, PeriodoPrecio, PrecioSeriePunto, PrecioAFechaResponse
 )
+from app.services import busqueda as busqueda_productos, precios
+from app.services.alertas_stock import productos_con_faltantes
+from app.services.eventos import emitir, PRODUCTOS, STOCK
+from app.services.http_condicional import condicional
 
 router = APIRouter(prefix="/productos", tags=["Productos"])
 
@@ -30,52 +37,98 @@ def _registrar_cambio_precio(db: Session, variante: Variante, campo: str, valor_
 
 # ─── AJUSTE DE PRECIOS POR LOTE (debe ir ANTES de /{producto_id}) ─────────────
 
+# Precio nuevo según el modo, sobre las columnas de `variantes v`
+_PRECIO_NUEVO = {
+    ModoAjustePrecio.porcentaje: "v.precio_venta * (1 + :valor / 100)",
+    ModoAjustePrecio.margen_deseado: "v.costo / (1 - :valor / 100)",
+    ModoAjustePrecio.precio_fijo: "CAST(:valor AS NUMERIC)",
+}
+
+_COLUMNAS_VARIANTE = (
+    "id", "producto_id", "sabor", "tamanio", "sku", "costo", "precio_venta",
+    "stock_minimo", "stock_actual", "activa", "creado_en",
+)
+
+
+def _columnas_variante(**reemplazos: str) -> str:
+    """Columnas de VarianteResponse sobre `v`; `reemplazos` da otra expresión para alguna."""
+    return ", ".join(
+        f"{reemplazos[c]} AS {c}" if c in reemplazos else f"v.{c}" for c in _COLUMNAS_VARIANTE
+    )
+
+
 @router.post("/lote/precio", response_model=List[VarianteResponse])
 def ajustar_precio_lote(data: AjustePrecioLote, db: Session = Depends(get_db)):
     """
-    Ajusta el precio de venta de múltiples variantes de un producto.
+    Ajusta el precio de venta de las variantes activas que cumplan todos
+    los filtros (producto, variantes, marca, categoría).
 
     Modos:
     - porcentaje: precio_nuevo = precio_actual * (1 + valor/100)
     - margen_deseado: precio_nuevo = costo / (1 - valor/100)
     - precio_fijo: precio_nuevo = valor
+
+    Un solo statement: el UPDATE … RETURNING calcula los precios en SQL y
+    el historial se inserta con un INSERT … SELECT sobre las filas
+    devueltas.  Con `simular` devuelve las variantes con el precio que
+    quedaría, sin modificar nada.
     """
-    query = db.query(Variante).filter(
-        Variante.producto_id == data.producto_id,
-        Variante.activa == True
-    )
+    if data.modo == ModoAjustePrecio.margen_deseado and data.valor >= 100:
+        raise HTTPException(status_code=400, detail="El margen no puede ser 100% o más")
 
+    condiciones = ["v.activa"]
+    if data.producto_id is not None:
+        condiciones.append("v.producto_id = :producto_id")
     if data.variante_ids:
-        query = query.filter(Variante.id.in_(data.variante_ids))
+        condiciones.append("v.id = ANY(:variante_ids)")
+    if data.marca:
+        condiciones.append("lower(p.marca) = lower(:marca)")
+    if data.categoria:
+        condiciones.append("lower(p.categoria) = lower(:categoria)")
+    if len(condiciones) == 1:
+        raise HTTPException(status_code=400, detail="Indicá producto_id, variante_ids, marca o categoria")
+
+    parametros = {
+        "valor": data.valor, "producto_id": data.producto_id, "variante_ids": data.variante_ids,
+        "marca": data.marca, "categoria": data.categoria,
+    }
+    seleccion = f"""
+        SELECT v.id, v.precio_venta AS precio_anterior, ROUND({_PRECIO_NUEVO[data.modo]}, 2) AS precio_nuevo
+        FROM variantes v JOIN productos p ON p.id = v.producto_id
+        WHERE {" AND ".join(condiciones)}
+    """
 
-    variantes = query.all()
+    if data.simular:
+        filas = db.execute(text(f"""
+            SELECT {_columnas_variante(precio_venta="o.precio_nuevo")}
+            FROM ({seleccion}) o JOIN variantes v ON v.id = o.id
+            ORDER BY v.id
+        """), parametros).mappings().all()
+    else:
+        filas = db.execute(text(f"""
+            WITH objetivo AS ({seleccion} FOR UPDATE OF v),
+            actualizadas AS (
+                UPDATE variantes v SET precio_venta = o.precio_nuevo, actualizado_en = now()
+                FROM objetivo o
+                WHERE v.id = o.id
+                RETURNING {_columnas_variante()}, o.precio_anterior
+            ),
+            historial AS (
+                INSERT INTO precio_historial (variante_id, campo, valor_anterior, valor_nuevo)
+                SELECT id, 'precio_venta', precio_anterior, precio_venta
+                FROM actualizadas
+                WHERE precio_anterior IS NOT NULL AND precio_anterior <> precio_venta
+            )
+            SELECT * FROM actualizadas ORDER BY id
+        """), parametros).mappings().all()
 
-    if not variantes:
+    if not filas:
         raise HTTPException(status_code=404, detail="No se encontraron variantes para ajustar")
 
-    for variante in variantes:
-        nuevo_precio = None
-        if data.modo == ModoAjustePrecio.porcentaje:
-            factor = 1 + (data.valor / 100)
-            nuevo_precio = round(variante.precio_venta * factor, 2)
-
-        elif data.modo == ModoAjustePrecio.margen_deseado:
-            if data.valor >= 100:
-                raise HTTPException(status_code=400, detail="El margen no puede ser 100% o más")
-            nuevo_precio = round(variante.costo / (1 - data.valor / 100), 2)
-
-        elif data.modo == ModoAjustePrecio.precio_fijo:
-            nuevo_precio = data.valor
-
-        if nuevo_precio is not None:
-            _registrar_cambio_precio(db, variante, 'precio_venta', nuevo_precio)
-            variante.precio_venta = nuevo_precio
-
-    db.commit()
-    for v in variantes:
-        db.refresh(v)
-
-    return variantes
+    if not data.simular:
+        emitir(db, PRODUCTOS)
+        db.commit()
+    return [dict(f) for f in filas]
 
 
 # ─── AJUSTE DE STOCK DIRECTO (también antes de /{producto_id}) ────────────────
@@ -90,6 +143,7 @@ def ajustar_stock(variante_id: int, data: StockAjuste, db: Session = Depends(get
     if not variante:
         raise HTTPException(status_code=404, detail="Variante no encontrada")
     variante.stock_actual = data.stock_actual
+    emitir(db, PRODUCTOS, STOCK)
     db.commit()
     db.refresh(variante)
     return variante
@@ -97,44 +151,94 @@ def ajustar_stock(variante_id: int, data: StockAjuste, db: Session = Depends(get
 
 # ─── PRODUCTOS ───────────────────────────────────────────────────────────────
 
-@router.get("", response_model=List[ProductoResponse])
+@router.get(
+    "/buscar",
+    response_model=List[ProductoBusquedaResponse],
+    dependencies=[Depends(condicional(PRODUCTOS))],
+)
+def buscar_productos(
+    q: str = Query(..., min_length=1, max_length=100, description="Nombre, marca, categoría, sabor, tamaño o SKU"),
+    limite: int = Query(10, ge=1, le=50),
+    solo_activos: bool = Query(True),
+    db: Session = Depends(get_db)
+):
+    """
+    Type-ahead: prefijos por palabra, tolerante a acentos y errores de
+    tipeo, ordenado por relevancia (ver app/services/busqueda.py).
+    """
+    return busqueda_productos.buscar(db, q, limite, solo_activos)
+
+
+@router.get(
+    "",
+    response_model=Union[List[ProductoResponse], List[ProductoListResponse]],
+    dependencies=[Depends(condicional(PRODUCTOS, STOCK))],
+)
 def listar_productos(
     busqueda: Optional[str] = Query(None, description="Buscar por nombre, marca o categoría"),
     categoria: Optional[str] = Query(None),
     marca: Optional[str] = Query(None),
     solo_activos: bool = Query(True),
     con_stock_bajo: bool = Query(False, description="Solo productos bajo stock mínimo"),
+    vista: VistaProducto = Query(VistaProducto.completa, description="lista = sin variantes, con conteo y stock total"),
+    orden: OrdenProducto = Query(OrdenProducto.nombre),
+    descendente: bool = Query(False),
+    limite: Optional[int] = Query(None, ge=1, le=500),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_db)
 ):
-    query = db.query(Producto)
-
+    filtros = []
     if solo_activos:
-        query = query.filter(Producto.activo == True)
+        filtros.append(Producto.activo == True)
     if categoria:
-        query = query.filter(Producto.categoria.ilike(f"%{categoria}%"))
+        filtros.append(Producto.categoria.ilike(f"%{categoria}%"))
     if marca:
-        query = query.filter(Producto.marca.ilike(f"%{marca}%"))
+        filtros.append(Producto.marca.ilike(f"%{marca}%"))
     if busqueda:
-        query = query.filter(
-            or_(
-                Producto.nombre.ilike(f"%{busqueda}%"),
-                Producto.marca.ilike(f"%{busqueda}%"),
-                Producto.categoria.ilike(f"%{busqueda}%")
-            )
-        )
-
-    productos = query.order_by(Producto.nombre).all()
-
+        filtros.append(Producto.id.in_(busqueda_productos.filtro(busqueda)))
     if con_stock_bajo:
-        productos = [
-            p for p in productos
-            if any(
-                sum(ss.cantidad for ss in v.stocks_sucursal) <= v.stock_minimo
-                for v in p.variantes if v.activa
-            )
-        ]
-
-    return productos
+        filtros.append(Producto.id.in_(productos_con_faltantes(solo_activos=solo_activos)))
+
+    if vista == VistaProducto.lista:
+        return _listar_resumido(db, filtros, orden, descendente, limite, offset)
+
+    if orden == OrdenProducto.stock_total:
+        raise HTTPException(status_code=400, detail="orden=stock_total solo está disponible con vista=lista")
+    columna = getattr(Producto, orden.value)
+    query = (
+        db.query(Producto)
+        .filter(*filtros)
+        .order_by(columna.desc() if descendente else columna, Producto.id)
+        .offset(offset)
+    )
+    if limite:
+        query = query.limit(limite)
+    return query.all()
+
+
+def _listar_resumido(db: Session, filtros: list, orden: OrdenProducto, descendente: bool,
+                     limite: Optional[int], offset: int) -> List[ProductoListResponse]:
+    """Vista liviana: una consulta agrupada por producto, sin cargar variantes."""
+    variantes_count = func.count(Variante.id).filter(Variante.activa == True)
+    stock_total = func.coalesce(func.sum(Variante.stock_total).filter(Variante.activa == True), 0)
+
+    columna = stock_total if orden == OrdenProducto.stock_total else getattr(Producto, orden.value)
+    query = (
+        select(
+            Producto.id, Producto.nombre, Producto.marca, Producto.categoria,
+            Producto.imagen_url, Producto.activo,
+            variantes_count.label("variantes_count"),
+            stock_total.label("stock_total"),
+        )
+        .outerjoin(Variante, Variante.producto_id == Producto.id)
+        .where(*filtros)
+        .group_by(Producto.id)
+        .order_by(columna.desc() if descendente else columna, Producto.id)
+        .offset(offset)
+    )
+    if limite:
+        query = query.limit(limite)
+    return [ProductoListResponse.model_validate(fila._mapping) for fila in db.execute(query)]
 
 
 @router.get("/{producto_id}", response_model=ProductoResponse)
@@ -168,6 +272,7 @@ def crear_producto(data: ProductoCreate, db: Session = Depends(get_db)):
         )
         db.add(variante)
 
+    emitir(db, PRODUCTOS)
     db.commit()
     db.refresh(producto)
     return producto
@@ -184,6 +289,7 @@ def actualizar_producto(
     for campo, valor in data.model_dump(exclude_unset=True).items():
         setattr(producto, campo, valor)
 
+    emitir(db, PRODUCTOS)
     db.commit()
     db.refresh(producto)
     return producto
@@ -198,6 +304,7 @@ def eliminar_producto(producto_id: int, db: Session = Depends(get_db)):
     producto.activo = False
     for v in producto.variantes:
         v.activa = False
+    emitir(db, PRODUCTOS)
     db.commit()
 
 
@@ -221,6 +328,7 @@ def crear_variante(
 
     variante = Variante(producto_id=producto_id, **data.model_dump())
     db.add(variante)
+    emitir(db, PRODUCTOS)
     db.commit()
     db.refresh(variante)
     return variante
@@ -239,6 +347,7 @@ def actualizar_variante(
             _registrar_cambio_precio(db, variante, campo, valor)
         setattr(variante, campo, valor)
 
+    emitir(db, PRODUCTOS)
     db.commit()
     db.refresh(variante)
     return variante
@@ -251,24 +360,64 @@ def eliminar_variante(variante_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Variante no encontrada")
 
     variante.activa = False
+    emitir(db, PRODUCTOS)
     db.commit()
 
 
 # ─── HISTORIAL DE PRECIOS ────────────────────────────────────────────────────
 
 @router.get("/variantes/{variante_id}/historial-precios")
-def historial_precios(variante_id: int, db: Session = Depends(get_db)):
-    variante = db.query(Variante).filter(Variante.id == variante_id).first()
-    if not variante:
+def historial_precios(
+    variante_id: int,
+    campo: Optional[CampoPrecio] = Query(None),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    limite: int = Query(500, ge=1, le=5000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Cambios de precio / costo, del más reciente al más viejo (paginado)."""
+    if not db.get(Variante, variante_id):
         raise HTTPException(status_code=404, detail="Variante no encontrada")
-    registros = db.query(PrecioHistorial).filter(
-        PrecioHistorial.variante_id == variante_id
-    ).order_by(PrecioHistorial.fecha.desc()).all()
+    registros = precios.serie(db, variante_id, campo.value if campo else None, desde, hasta, limite, offset)
     return [
         {
-            "id": r.id, "campo": r.campo,
-            "valor_anterior": float(r.valor_anterior),
-            "valor_nuevo": float(r.valor_nuevo),
-            "fecha": r.fecha.isoformat() if r.fecha else None,
+            "id": r["id"], "campo": r["campo"],
+            "valor_anterior": float(r["valor_anterior"]),
+            "valor_nuevo": float(r["valor_nuevo"]),
+            "fecha": r["fecha"].isoformat() if r["fecha"] else None,
+            "cambios": r["cambios"],
         } for r in registros
-    ]
\ No newline at end of file
+    ]
+
+
+@router.get("/variantes/{variante_id}/historial-precios/serie", response_model=List[PrecioSeriePunto])
+def serie_precios(
+    variante_id: int,
+    periodo: PeriodoPrecio = Query(PeriodoPrecio.semana),
+    campo: CampoPrecio = Query(CampoPrecio.precio_venta),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Último valor por período, con mínimo, máximo y cantidad de cambios."""
+    if not db.get(Variante, variante_id):
+        raise HTTPException(status_code=404, detail="Variante no encontrada")
+    return precios.serie_agrupada(db, variante_id, campo.value, periodo.value, desde, hasta)
+
+
+@router.get("/variantes/{variante_id}/precio-a-fecha", response_model=PrecioAFechaResponse)
+def precio_a_fecha(
+    variante_id: int,
+    fecha: datetime = Query(...),
+    db: Session = Depends(get_db)
+):
+    """Costo y precio de venta vigentes a una fecha, según el historial."""
+    if not db.get(Variante, variante_id):
+        raise HTTPException(status_code=404, detail="Variante no encontrada")
+    return PrecioAFechaResponse(
+        variante_id=variante_id,
+        fecha=fecha,
+        costo=precios.a_fecha(db, [variante_id], fecha, "costo")[variante_id],
+        precio_venta=precios.a_fecha(db, [variante_id], fecha, "precio_venta")[variante_id],
+    )
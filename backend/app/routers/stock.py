@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, distinct
+from sqlalchemy import distinct, insert, text
 from typing import Optional, List
+from datetime import datetime
 
 from app.database import get_db
 from app.models import (
@@ -10,8 +11,18 @@ from app.models import (
 )
 from app.schemas import (
     ProductoConStockResponse, VarianteConStockResponse, StockSucursalResponse,
-    TransferenciaCreate, TransferenciaResponse
+    TransferenciaCreate, TransferenciaResponse, AlertaStockResponse,
+    TransferenciaLoteCreate, TransferenciaLoteResponse, TransferenciaLoteLinea,
+    PlanReposicionResponse,
+    MovimientoStockResponse, StockAFechaResponse
 )
+from app.services.alertas_stock import consulta_faltantes
+from app.services.metricas import MOVIMIENTOS_STOCK
+from app.services.cache import cacheado
+from app.services.eventos import emitir, STOCK, PRODUCTOS, SUCURSALES
+from app.services import inventario, reposicion
+from app.services import busqueda as busqueda_productos
+from app.services.http_condicional import condicional
 
 router = APIRouter(prefix="/stock", tags=["Stock"])
 
@@ -48,14 +59,8 @@ def _resolve_sucursal(db: Session, sucursal_id: Optional[int]) -> int:
 def _get_variante_con_stock(variante: Variante) -> VarianteConStockResponse:
     """Construye el response de variante con desglose de stock por sucursal."""
     stock_sucursales = []
-    stock_total = 0
-    stock_central = 0
-
     for ss in variante.stocks_sucursal:
         if ss.sucursal and ss.sucursal.activa:
-            stock_total += ss.cantidad
-            if ss.sucursal.es_central:
-                stock_central = ss.cantidad
             if ss.cantidad > 0:
                 stock_sucursales.append(StockSucursalResponse(
                     sucursal_id=ss.sucursal_id,
@@ -71,8 +76,8 @@ def _get_variante_con_stock(variante: Variante) -> VarianteConStockResponse:
         sku=variante.sku,
         costo=variante.costo,
         precio_venta=variante.precio_venta,
-        stock_central=stock_central,
-        stock_total=stock_total,
+        stock_central=variante.stock_central,
+        stock_total=variante.stock_total,
         stock_minimo=variante.stock_minimo,
         activa=variante.activa,
         creado_en=variante.creado_en,
@@ -83,6 +88,7 @@ def _get_variante_con_stock(variante: Variante) -> VarianteConStockResponse:
 # ─── ENDPOINTS DE STOCK ───────────────────────────────────────────────────────
 
 @router.get("/marcas", response_model=List[str])
+@cacheado(PRODUCTOS)
 def listar_marcas(db: Session = Depends(get_db)):
     """Retorna la lista de marcas distintas de productos activos."""
     rows = (
@@ -94,7 +100,10 @@ def listar_marcas(db: Session = Depends(get_db)):
     return [r[0] for r in rows]
 
 
-@router.get("", response_model=List[ProductoConStockResponse])
+@router.get(
+    "", response_model=List[ProductoConStockResponse],
+    dependencies=[Depends(condicional(PRODUCTOS, STOCK, SUCURSALES))],
+)
 def listar_stock(
     busqueda: Optional[str] = Query(None),
     categoria: Optional[str] = Query(None),
@@ -110,9 +119,7 @@ def listar_stock(
     if marca:
         query = query.filter(Producto.marca.ilike(f"%{marca}%"))
     if busqueda:
-        query = query.filter(
-            or_(Producto.nombre.ilike(f"%{busqueda}%"), Producto.marca.ilike(f"%{busqueda}%"))
-        )
+        query = query.filter(Producto.id.in_(busqueda_productos.filtro(busqueda)))
 
     productos = query.order_by(Producto.nombre).all()
 
@@ -142,6 +149,22 @@ def listar_stock(
     return result
 
 
+@router.get(
+    "/alertas", response_model=List[AlertaStockResponse],
+    dependencies=[Depends(condicional(PRODUCTOS, STOCK, SUCURSALES))],
+)
+def alertas_stock(
+    sucursal_id: Optional[int] = Query(None, description="Evaluar solo el stock de esta sucursal"),
+    limite: Optional[int] = Query(None, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """Variantes activas con stock <= stock mínimo, ordenadas por déficit (mayor primero)."""
+    query = consulta_faltantes(sucursal_id)
+    if limite:
+        query = query.limit(limite)
+    return [AlertaStockResponse.model_validate(fila._mapping) for fila in db.execute(query)]
+
+
 @router.get("/variante/{variante_id}", response_model=VarianteConStockResponse)
 def stock_variante(variante_id: int, db: Session = Depends(get_db)):
     variante = db.query(Variante).filter(Variante.id == variante_id).first()
@@ -170,6 +193,7 @@ def ajustar_stock_manual(
         raise HTTPException(status_code=404, detail="Variante no encontrada")
 
     sucursal_id = _resolve_sucursal(db, data.sucursal_id)
+    inventario.declarar_motivo(db, "ajuste")
 
     ss = db.query(StockSucursal).filter(
         StockSucursal.variante_id == variante_id,
@@ -180,7 +204,9 @@ def ajustar_stock_manual(
     else:
         db.add(StockSucursal(variante_id=variante_id, sucursal_id=sucursal_id, cantidad=data.cantidad))
 
+    emitir(db, STOCK)
     db.commit()
+    MOVIMIENTOS_STOCK.inc("ajuste")
     variante = db.query(Variante).filter(Variante.id == variante_id).first()
     return _get_variante_con_stock(variante)
 
@@ -237,11 +263,152 @@ def crear_transferencia(data: TransferenciaCreate, db: Session = Depends(get_db)
         notas=data.notas,
     )
     db.add(transferencia)
+    inventario.declarar_motivo(db, "transferencia", transferencia)
+    emitir(db, STOCK)
     db.commit()
+    MOVIMIENTOS_STOCK.inc("transferencia")
     db.refresh(transferencia)
     return transferencia
 
 
+@router.post("/transferencias/lote", response_model=TransferenciaLoteResponse, status_code=201)
+def crear_transferencias_lote(data: TransferenciaLoteCreate, db: Session = Depends(get_db)):
+    """
+    Transfiere muchas variantes de un mismo origen a un mismo destino en una
+    sola transacción.  La disponibilidad de todas las líneas se valida con
+    una consulta que bloquea las filas de origen; si alguna no alcanza no se
+    mueve nada y el 400 trae el resultado por línea.  Las líneas repetidas
+    de una misma variante se suman.
+    """
+    central = _get_central(db)
+    origen_id = data.sucursal_origen_id if data.sucursal_origen_id is not None else central.id
+    destino_id = data.sucursal_destino_id if data.sucursal_destino_id is not None else central.id
+    if origen_id == destino_id:
+        raise HTTPException(status_code=400, detail="El origen y destino no pueden ser la misma sucursal")
+    activas = set(db.execute(
+        text("SELECT id FROM sucursales WHERE id = ANY(:ids) AND activa"), {"ids": [origen_id, destino_id]}
+    ).scalars())
+    if origen_id not in activas:
+        raise HTTPException(status_code=404, detail="Sucursal de origen no encontrada")
+    if destino_id not in activas:
+        raise HTTPException(status_code=404, detail="Sucursal de destino no encontrada")
+
+    if origen_id == central.id:
+        tipo = TipoTransferenciaEnum.central_a_sucursal
+    elif destino_id == central.id:
+        tipo = TipoTransferenciaEnum.sucursal_a_central
+    else:
+        tipo = TipoTransferenciaEnum.entre_sucursales
+
+    pedidos = {}
+    for item in data.items:
+        pedidos[item.variante_id] = pedidos.get(item.variante_id, 0) + item.cantidad
+    ids = sorted(pedidos)
+
+    existentes = set(db.execute(
+        text("SELECT id FROM variantes WHERE id = ANY(:ids)"), {"ids": ids}
+    ).scalars())
+    # Lock de las filas de origen en orden de variante: dos lotes concurrentes no se pisan
+    disponibles = dict(db.execute(
+        text("""
+            SELECT variante_id, cantidad FROM stock_sucursal
+            WHERE sucursal_id = :origen AND variante_id = ANY(:ids)
+            ORDER BY variante_id
+            FOR UPDATE
+        """),
+        {"origen": origen_id, "ids": ids},
+    ).all())
+
+    lineas = []
+    for variante_id in ids:
+        disponible = disponibles.get(variante_id, 0)
+        error = None
+        if variante_id not in existentes:
+            error = "Variante no encontrada"
+        elif disponible < pedidos[variante_id]:
+            error = f"Stock insuficiente en origen. Disponible: {disponible}, solicitado: {pedidos[variante_id]}"
+        lineas.append(TransferenciaLoteLinea(
+            variante_id=variante_id, cantidad=pedidos[variante_id], disponible=disponible,
+            ok=error is None, error=error,
+        ))
+    if any(not l.ok for l in lineas):
+        raise HTTPException(status_code=400, detail={
+            "mensaje": "Ninguna línea se transfirió: hay líneas con errores",
+            "lineas": [l.model_dump() for l in lineas],
+        })
+
+    creadas = db.execute(
+        insert(Transferencia).returning(Transferencia.id, Transferencia.variante_id),
+        [
+            {
+                "variante_id": variante_id,
+                "tipo": tipo,
+                "sucursal_origen_id": origen_id,
+                "sucursal_destino_id": destino_id,
+                "cantidad": pedidos[variante_id],
+                "notas": data.notas,
+            }
+            for variante_id in ids
+        ],
+    ).all()
+    transferencia_de = {variante_id: tid for tid, variante_id in creadas}
+
+    deltas, referencias = {}, {}
+    for variante_id in ids:
+        deltas[(variante_id, origen_id)] = -pedidos[variante_id]
+        deltas[(variante_id, destino_id)] = pedidos[variante_id]
+        referencias[(variante_id, origen_id)] = referencias[(variante_id, destino_id)] = transferencia_de[variante_id]
+    inventario.mover_stock(db, deltas, "transferencia", referencias=referencias)
+
+    emitir(db, STOCK)
+    db.commit()
+    MOVIMIENTOS_STOCK.inc("transferencia", valor=len(ids))
+    for linea in lineas:
+        linea.transferencia_id = transferencia_de[linea.variante_id]
+    return TransferenciaLoteResponse(
+        tipo=tipo.value, sucursal_origen_id=origen_id, sucursal_destino_id=destino_id, lineas=lineas
+    )
+
+
+# ─── PLAN DE REPOSICIÓN ──────────────────────────────────────────────────────
+
+@router.get("/plan-reposicion", response_model=PlanReposicionResponse)
+def ver_plan_reposicion(
+    ventana_dias: Optional[int] = Query(None, ge=1, le=365, description="Default: configuración ERP"),
+    dias_cobertura: Optional[int] = Query(None, ge=0, le=365, description="Default: demora proveedor + seguridad"),
+    sucursal_id: Optional[List[int]] = Query(None, description="Limitar a estas sucursales"),
+    db: Session = Depends(get_db)
+):
+    """Transferencias sugeridas desde el central según velocidad de venta por sucursal (no mueve stock)."""
+    try:
+        return reposicion.planificar(db, ventana_dias, dias_cobertura, sucursal_id)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/plan-reposicion", response_model=PlanReposicionResponse, status_code=201)
+def ejecutar_plan_reposicion(
+    ventana_dias: Optional[int] = Query(None, ge=1, le=365),
+    dias_cobertura: Optional[int] = Query(None, ge=0, le=365),
+    sucursal_id: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Calcula el plan con el stock del central bloqueado y lo ejecuta en bloque en la misma transacción."""
+    try:
+        plan = reposicion.planificar(db, ventana_dias, dias_cobertura, sucursal_id, bloquear=True)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    transferencias = reposicion.ejecutar(db, plan)
+    if transferencias:
+        emitir(db, STOCK)
+    db.commit()
+    if transferencias:
+        MOVIMIENTOS_STOCK.inc("transferencia", valor=len(transferencias))
+    for linea in plan["lineas"]:
+        linea["transferencia_id"] = transferencias.get((linea["variante_id"], linea["sucursal_id"]))
+    return dict(plan, ejecutado=True)
+
+
 @router.get("/transferencias", response_model=List[TransferenciaResponse])
 def listar_transferencias(
     variante_id: Optional[int] = Query(None),
@@ -257,3 +424,43 @@ def listar_transferencias(
             (Transferencia.sucursal_destino_id == sucursal_id)
         )
     return query.order_by(Transferencia.fecha.desc()).all()
+
+
+# ─── LIBRO DE MOVIMIENTOS ────────────────────────────────────────────────────
+
+@router.get("/movimientos", response_model=List[MovimientoStockResponse])
+def listar_movimientos_stock(
+    variante_id: Optional[int] = Query(None),
+    sucursal_id: Optional[int] = Query(None),
+    desde: Optional[datetime] = Query(None),
+    hasta: Optional[datetime] = Query(None),
+    limite: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Auditoría: cada cambio de stock con su motivo y referencia, más recientes primero."""
+    return inventario.movimientos(db, variante_id, sucursal_id, desde, hasta, limite=limite, offset=offset)
+
+
+@router.get("/a-fecha", response_model=List[StockAFechaResponse])
+def stock_historico(
+    fecha: datetime = Query(..., description="Instante a reconstruir"),
+    sucursal_id: Optional[int] = Query(None),
+    variante_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Stock por variante y sucursal a una fecha: última foto anterior + movimientos hasta la fecha."""
+    try:
+        return inventario.stock_a_fecha(
+            db, fecha, sucursal_id=sucursal_id, variante_ids=[variante_id] if variante_id else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/snapshots", status_code=201)
+def tomar_snapshot_stock(db: Session = Depends(get_db)):
+    """Toma una foto del stock actual (acorta la reconstrucción de fechas posteriores)."""
+    fecha = inventario.tomar_snapshot(db)
+    db.commit()
+    return {"ok": True, "fecha": fecha}
@@ -8,6 +8,9 @@ from decimal import Decimal
 from app.database import get_db
 from app.models import Venta, VentaItem, Variante, StockSucursal, EstadoVentaEnum
 from app.schemas import VentaCreate, VentaUpdate, VentaResponse
+from app.services.metricas import VENTAS_CREADAS, MOVIMIENTOS_STOCK
+from app.services.eventos import emitir, VENTAS, STOCK
+from app.services.inventario import declarar_motivo
 
 router = APIRouter(prefix="/ventas", tags=["Ventas"])
 
@@ -128,8 +131,13 @@ def crear_venta(data: VentaCreate, db: Session = Depends(get_db)):
     )
     db.add(venta)
     db.flush()
+    declarar_motivo(db, "venta", venta)
     _calcular_y_guardar_venta(db, venta, data.items)
+    emitir(db, VENTAS, STOCK)
     db.commit()
+    VENTAS_CREADAS.inc(data.estado.value)
+    if data.estado == EstadoVentaEnum.confirmada:
+        MOVIMIENTOS_STOCK.inc("venta", valor=len(data.items))
     db.refresh(venta)
     return _venta_a_response(venta)
 
@@ -142,11 +150,15 @@ def confirmar_pedido(venta_id: int, db: Session = Depends(get_db)):
     if venta.estado != EstadoVentaEnum.abierta:
         raise HTTPException(status_code=400, detail="Solo se pueden confirmar pedidos abiertos")
 
+    declarar_motivo(db, "venta", venta)
     for item in venta.items:
         _descontar_stock(db, item.variante_id, venta.sucursal_id, item.cantidad)
+    movimientos = len(venta.items)
 
     venta.estado = EstadoVentaEnum.confirmada
+    emitir(db, VENTAS, STOCK)
     db.commit()
+    MOVIMIENTOS_STOCK.inc("venta", valor=movimientos)
     db.refresh(venta)
     return _venta_a_response(venta)
 
@@ -159,6 +171,7 @@ def actualizar_venta(venta_id: int, data: VentaUpdate, db: Session = Depends(get
     if venta.estado == EstadoVentaEnum.confirmada:
         raise HTTPException(status_code=400, detail="No se puede editar una venta confirmada.")
 
+    declarar_motivo(db, "venta", venta)
     for campo, valor in data.model_dump(exclude_unset=True, exclude={"items"}).items():
         setattr(venta, campo, valor)
 
@@ -168,6 +181,7 @@ def actualizar_venta(venta_id: int, data: VentaUpdate, db: Session = Depends(get
         db.flush()
         _calcular_y_guardar_venta(db, venta, data.items)
 
+    emitir(db, VENTAS, STOCK)
     db.commit()
     db.refresh(venta)
     return _venta_a_response(venta)
@@ -179,9 +193,15 @@ def eliminar_venta(venta_id: int, db: Session = Depends(get_db)):
     if not venta:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
 
+    movimientos = 0
     if venta.estado == EstadoVentaEnum.confirmada:
+        declarar_motivo(db, "venta_revertida", venta.id)
         for item in venta.items:
             _restaurar_stock(db, item.variante_id, venta.sucursal_id, item.cantidad)
+            movimientos += 1
 
     db.delete(venta)
+    emitir(db, VENTAS, STOCK)
     db.commit()
+    if movimientos:
+        MOVIMIENTOS_STOCK.inc("venta_revertida", valor=movimientos)
@@ -94,6 +94,26 @@ class ProductoListResponse(ProductoBase):
     class Config:
         from_attributes = True
 
+class ProductoBusquedaResponse(BaseModel):
+    """Resultado de GET /productos/buscar, ordenado por puntaje"""
+    id: int
+    nombre: str
+    marca: Optional[str] = None
+    categoria: Optional[str] = None
+    imagen_url: Optional[str] = None
+    puntaje: float
+
+class VistaProducto(str, Enum):
+    completa = "completa"  # ProductoResponse con variantes anidadas
+    lista = "lista"        # ProductoListResponse, una sola consulta agrupada
+
+class OrdenProducto(str, Enum):
+    nombre = "nombre"
+    marca = "marca"
+    categoria = "categoria"
+    creado_en = "creado_en"
+    stock_total = "stock_total"  # solo vista=lista
+
 
 # ─── EDICIÓN POR LOTE ────────────────────────────────────────────────────────
 
@@ -103,10 +123,38 @@ class ModoAjustePrecio(str, Enum):
     precio_fijo = "precio_fijo"    # sobreescribe con valor manual
 
 class AjustePrecioLote(BaseModel):
-    producto_id: int
+    """Los filtros se combinan (AND); al menos uno es obligatorio"""
+    producto_id: Optional[int] = None
     variante_ids: Optional[List[int]] = None  # None = todas las variantes
+    marca: Optional[str] = None
+    categoria: Optional[str] = None
     modo: ModoAjustePrecio
     valor: Decimal = Field(..., description="+/-% | margen% | precio fijo en ARS")
+    simular: bool = Field(False, description="Devuelve los precios resultantes sin aplicarlos")
+
+
+class CampoPrecio(str, Enum):
+    costo = "costo"
+    precio_venta = "precio_venta"
+
+class PeriodoPrecio(str, Enum):
+    dia = "dia"
+    semana = "semana"
+    mes = "mes"
+
+class PrecioSeriePunto(BaseModel):
+    """Un período de la serie de precios: último valor y rango del período"""
+    periodo: datetime
+    valor: Decimal
+    minimo: Decimal
+    maximo: Decimal
+    cambios: int
+
+class PrecioAFechaResponse(BaseModel):
+    variante_id: int
+    fecha: datetime
+    costo: Decimal
+    precio_venta: Decimal
 
 
 # ─── CLIENTES ────────────────────────────────────────────────────────────────
@@ -277,6 +325,22 @@ class LiquidezResponse(BaseModel):
     ganancia_bruta_mes: Decimal = Decimal("0")       # ganancia solo del mes actual
     total_retirado: Decimal = Decimal("0")           # suma de retiros de ganancia
 
+class SaldosCajaResponse(BaseModel):
+    fecha: Optional[datetime] = None     # None = saldo actual
+    efectivo: Decimal
+    transferencia: Decimal
+    tarjeta: Decimal
+    total: Decimal
+
+class MovimientoCajaResponse(BaseModel):
+    id: int
+    metodo_pago: str
+    monto: Decimal
+    saldo: Decimal                       # saldo del método después del movimiento
+    origen: str                          # venta | compra | gasto | ajuste
+    referencia_id: Optional[int]
+    fecha: datetime
+
 class AjusteSaldoCreate(BaseModel):
     tipo: str  # efectivo | transferencia | tarjeta | ganancia
     monto_nuevo: Decimal = Field(..., ge=0)
@@ -314,11 +378,51 @@ class ProductoTopResponse(BaseModel):
     ganancia: Decimal
     margen_porcentaje: float
 
+class DimensionRanking(str, Enum):
+    variante = "variante"
+    producto = "producto"
+    marca = "marca"
+    categoria = "categoria"
+    sucursal = "sucursal"
+
+class RankingVentasResponse(BaseModel):
+    """Fila de ranking: solo vienen cargadas las dimensiones pedidas."""
+    variante_id: Optional[int] = None
+    producto_id: Optional[int] = None
+    nombre_producto: Optional[str] = None
+    marca: Optional[str] = None
+    categoria: Optional[str] = None
+    sabor: Optional[str] = None
+    tamanio: Optional[str] = None
+    sucursal_id: Optional[int] = None
+    sucursal_nombre: Optional[str] = None
+    cantidad_vendida: int
+    ingreso_total: Decimal
+    costo_total: Decimal
+    ganancia: Decimal
+    margen_porcentaje: float
+
+class DimensionValorStock(str, Enum):
+    sucursal = "sucursal"
+    marca = "marca"
+    categoria = "categoria"
+
+class ValorStockDesglose(BaseModel):
+    dimension: DimensionValorStock
+    clave: Optional[str]      # id de sucursal | marca | categoría (None = sin asignar)
+    nombre: Optional[str]
+    total_valor_costo: Decimal
+    total_valor_venta: Decimal
+    cantidad_total_unidades: int
+    diferencia_ganancia_potencial: Decimal
+
 class ValorStockResponse(BaseModel):
     total_valor_costo: Decimal
     total_valor_venta: Decimal
     cantidad_total_unidades: int
     diferencia_ganancia_potencial: Decimal
+    fecha: Optional[datetime] = None          # None = stock actual
+    desglose: List[ValorStockDesglose] = []
 
 
 # ─── SUCURSALES ──────────────────────────────────────────────────────────────
@@ -379,6 +483,31 @@ class MovimientoFiltros(BaseModel):
     metodo_pago: Optional[MetodoPago] = None
     cliente_id: Optional[int] = None
 
+class TipoMovimientoTimeline(str, Enum):
+    venta = "venta"
+    compra = "compra"
+    gasto = "gasto"
+    ganancia = "ganancia"
+    ajuste = "ajuste"
+    transferencia = "transferencia"
+
+class MovimientoTimeline(BaseModel):
+    """Fila de la línea de tiempo; `cantidad` y `sucursal_destino_id` solo en transferencias"""
+    id: int
+    tipo: TipoMovimientoTimeline
+    fecha: datetime
+    descripcion: Optional[str] = None
+    monto: Optional[Decimal] = None
+    metodo_pago: Optional[MetodoPago] = None
+    sucursal_id: Optional[int] = None
+    sucursal_destino_id: Optional[int] = None
+    cantidad: Optional[int] = None
+
+class TimelineResponse(BaseModel):
+    """Página de movimientos; `siguiente` es el cursor de la próxima (None si no hay más)"""
+    items: List[MovimientoTimeline]
+    siguiente: Optional[str] = None
+
 class ResumenPeriodo(BaseModel):
     total_ventas: Decimal
     cantidad_ventas: int
@@ -458,6 +587,48 @@ class TransferenciaCreate(BaseModel):
     sucursal_destino_id: Optional[int] = None  # None = central
     notas: Optional[str] = None
 
+class TransferenciaLoteItem(BaseModel):
+    variante_id: int
+    cantidad: int = Field(..., gt=0)
+
+class TransferenciaLoteCreate(BaseModel):
+    sucursal_origen_id: Optional[int] = None   # None = central
+    sucursal_destino_id: Optional[int] = None  # None = central
+    notas: Optional[str] = None
+    items: List[TransferenciaLoteItem] = Field(..., min_length=1, max_length=2000)
+
+class TransferenciaLoteLinea(BaseModel):
+    variante_id: int
+    cantidad: int
+    disponible: int                            # stock en origen antes de mover
+    ok: bool
+    error: Optional[str] = None
+    transferencia_id: Optional[int] = None
+
+class TransferenciaLoteResponse(BaseModel):
+    tipo: str
+    sucursal_origen_id: int
+    sucursal_destino_id: int
+    lineas: List[TransferenciaLoteLinea]
+
+class PlanReposicionLinea(BaseModel):
+    variante_id: int
+    sucursal_id: int
+    cantidad: int                  # a transferir desde el central
+    necesidad: int                 # hasta el objetivo de cobertura
+    stock_actual: int
+    velocidad_diaria: float
+    transferencia_id: Optional[int] = None
+
+class PlanReposicionResponse(BaseModel):
+    central_id: int
+    ventana_dias: int
+    dias_cobertura: int
+    unidades: int                  # total a transferir
+    faltante: int                  # necesidad que el central no cubre
+    ejecutado: bool = False
+    lineas: List[PlanReposicionLinea]
+
 class TransferenciaResponse(BaseModel):
     id: int
     variante_id: int
@@ -466,12 +637,40 @@ class TransferenciaResponse(BaseModel):
     sucursal_destino_id: Optional[int]
     cantidad: int
     notas: Optional[str]
+    compra_id: Optional[int] = None
     fecha: datetime
 
     class Config:
         from_attributes = True
 
 
+class MovimientoStockResponse(BaseModel):
+    id: int
+    variante_id: int
+    sucursal_id: int
+    delta: int
+    motivo: str                    # venta | venta_revertida | compra | compra_revertida | transferencia | ajuste | …
+    referencia_id: Optional[int]
+    fecha: datetime
+
+class StockAFechaResponse(BaseModel):
+    variante_id: int
+    sucursal_id: int
+    cantidad: int
+
+class AlertaStockResponse(BaseModel):
+    variante_id: int
+    producto_id: int
+    producto_nombre: str
+    marca: Optional[str]
+    sabor: Optional[str]
+    tamanio: Optional[str]
+    sku: Optional[str]
+    stock_minimo: int
+    stock: int
+    deficit: int      # stock_minimo - stock (0 = justo en el mínimo)
+
+
 # ─── CONFIGURACIÓN ERP ──────────────────────────────────────────────────────
 
 class ConfiguracionERPResponse(BaseModel):
@@ -518,4 +717,37 @@ class SugerenciaCompraResponse(BaseModel):
     presupuesto_disponible: Decimal
     presupuesto_restante: Decimal
     alerta_presupuesto: Optional[str] = None
-    resumen_ia: str
\ No newline at end of file
+    resumen_ia: str
+
+# ─── PUNTO DE VENTA ─────────────────────────────────────────────────────────
+
+class PosStockSucursal(BaseModel):
+    sucursal_id: int
+    cantidad: int
+
+
+class PosLookupResponse(BaseModel):
+    """Variante resuelta desde el catálogo en memoria; `version` permite detectar datos viejos"""
+    version: int
+    variante_id: int
+    producto_id: int
+    sku: Optional[str] = None
+    nombre: str
+    marca: Optional[str] = None
+    sabor: Optional[str] = None
+    tamanio: Optional[str] = None
+    precio_venta: Decimal
+    stock_total: int
+    stock: List[PosStockSucursal] = []
+
+
+# ─── ADMINISTRACIÓN ─────────────────────────────────────────────────────────
+
+class ConsultaLentaResponse(BaseModel):
+    fecha: datetime
+    ruta: Optional[str] = None
+    duracion_ms: float
+    sql: str
+    parametros: str
+    plan: Optional[str] = None
+    error: Optional[str] = None  # "statement_timeout" si fue cancelada
@@ -0,0 +1,80 @@
+"""
+Detección de stock bajo en SQL.
+
+Una variante está en falta cuando su stock (central + sucursales activas,
+o el de una sucursal puntual) es <= `stock_minimo`.  Para el total general
+se compara la columna mantenida `Variante.stock_total`; por sucursal, la
+suma y la comparación se resuelven con un GROUP BY … HAVING:
+
+    SELECT v.id, …, COALESCE(SUM(ss.cantidad), 0) AS stock
+    FROM variantes v JOIN productos p …
+    LEFT JOIN stock_sucursal ss ON ss.variante_id = v.id [AND ss.sucursal_id = :s]
+    WHERE v.activa AND p.activo
+    GROUP BY v.id, p.id
+    HAVING COALESCE(SUM(ss.cantidad), 0) <= v.stock_minimo
+
+Índices que la sostienen (ver `_run_migrations`): parcial sobre
+`stock_minimo - stock_total` para las variantes activas en falta (ya
+ordenado por déficit) y `stock_sucursal (variante_id, sucursal_id) INCLUDE
+(cantidad)`, que resuelve la suma por sucursal con un index-only scan.
+"""
+
+from typing import Optional
+
+from sqlalchemy import and_, func, select, true
+
+from app.models import Producto, StockSucursal, Variante
+
+
+def consulta_faltantes(sucursal_id: Optional[int] = None, solo_activos: bool = True):
+    """
+    SELECT de variantes en falta, ordenado por déficit (mayor primero).
+    `solo_activos=False` incluye las de productos inactivos.
+    """
+    producto_activo = Producto.activo == True if solo_activos else true()
+    if sucursal_id is None:
+        # Total general: columna mantenida (app/services/inventario.py), sin agregar
+        stock = Variante.stock_total
+        deficit = Variante.stock_minimo - stock
+        return (
+            _columnas(stock, deficit)
+            .join(Producto, Producto.id == Variante.producto_id)
+            .where(Variante.activa == True, producto_activo, stock <= Variante.stock_minimo)
+            .order_by(deficit.desc(), Producto.nombre, Variante.id)
+        )
+
+    stock = func.coalesce(func.sum(StockSucursal.cantidad), 0)
+    deficit = Variante.stock_minimo - stock
+    return (
+        _columnas(stock, deficit)
+        .join(Producto, Producto.id == Variante.producto_id)
+        .outerjoin(
+            StockSucursal,
+            and_(StockSucursal.variante_id == Variante.id, StockSucursal.sucursal_id == sucursal_id),
+        )
+        .where(Variante.activa == True, producto_activo)
+        .group_by(Variante.id, Producto.id)
+        .having(stock <= Variante.stock_minimo)
+        .order_by(deficit.desc(), Producto.nombre, Variante.id)
+    )
+
+
+def _columnas(stock, deficit):
+    return select(
+        Variante.id.label("variante_id"),
+        Producto.id.label("producto_id"),
+        Producto.nombre.label("producto_nombre"),
+        Producto.marca,
+        Variante.sabor,
+        Variante.tamanio,
+        Variante.sku,
+        Variante.stock_minimo,
+        stock.label("stock"),
+        deficit.label("deficit"),
+    )
+
+
+def productos_con_faltantes(sucursal_id: Optional[int] = None, solo_activos: bool = True):
+    """Subconsulta de IDs de producto con al menos una variante en falta."""
+    faltantes = consulta_faltantes(sucursal_id, solo_activos).order_by(None).subquery()
+    return select(faltantes.c.producto_id).distinct()
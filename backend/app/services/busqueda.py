@@ -0,0 +1,198 @@
+"""
+Búsqueda de productos en la base (pg_trgm + full-text).
+
+Cada producto tiene una fila en `busqueda_productos` con:
+
+    documento  tsvector ponderado: nombre (A), marca (B), categoría (C) y
+               sabor / tamaño / SKU de sus variantes activas (D), con la
+               configuración `es_unaccent` (spanish + unaccent)
+    texto      lo mismo en minúsculas y sin acentos, para trigramas
+
+La mantienen triggers sobre `productos` y `variantes` (solo cuando cambian
+las columnas que entran en el documento, no con cada movimiento de stock),
+así que cualquier escritura —ORM, SQL crudo o COPY— queda indexada en la
+misma transacción.  `instalar` crea extensiones, configuración, tabla,
+funciones, triggers e índices, y completa los productos que falten; lo
+llama `_run_migrations` y es idempotente.
+
+Una consulta coincide si el tsquery por prefijos (`whey & choc:*`) matchea
+el documento, si el término es parecido a alguna palabra del texto
+(`<%`, tolera errores de tipeo) o si aparece como subcadena (SKUs
+parciales, desde 3 caracteres).  El puntaje suma `ts_rank` y
+`word_similarity`.  Las tres condiciones resuelven con los índices GIN,
+así que el type-ahead no depende del tamaño del catálogo.
+"""
+
+import re
+from typing import List, Optional
+
+from sqlalchemy import Integer, column, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+# Largo mínimo para buscar por subcadena: con menos de 3 caracteres no hay
+# trigramas y el LIKE recorre todo el índice
+_MIN_SUBCADENA = 3
+
+_SQL_INSTALAR = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() es STABLE; el wrapper con diccionario explícito se puede indexar
+    """
+    CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    """
+    DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+            CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+            ALTER TEXT SEARCH CONFIGURATION es_unaccent
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+        END IF;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS busqueda_productos (
+        producto_id INTEGER PRIMARY KEY REFERENCES productos(id) ON DELETE CASCADE,
+        documento TSVECTOR NOT NULL,
+        texto TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION refrescar_busqueda(ids INTEGER[]) RETURNS void
+    LANGUAGE sql AS $$
+        INSERT INTO busqueda_productos (producto_id, documento, texto)
+        SELECT p.id,
+               setweight(to_tsvector('es_unaccent', p.nombre), 'A')
+               || setweight(to_tsvector('es_unaccent', COALESCE(p.marca, '')), 'B')
+               || setweight(to_tsvector('es_unaccent', COALESCE(p.categoria, '')), 'C')
+               || setweight(to_tsvector('es_unaccent', COALESCE(v.atributos, '')), 'D'),
+               f_unaccent(lower(concat_ws(' ', p.nombre, p.marca, p.categoria, v.atributos)))
+        FROM productos p
+        LEFT JOIN LATERAL (
+            SELECT string_agg(concat_ws(' ', sabor, tamanio, sku), ' ' ORDER BY id) AS atributos
+            FROM variantes
+            WHERE producto_id = p.id AND activa
+        ) v ON TRUE
+        WHERE p.id = ANY(ids)
+        ON CONFLICT (producto_id) DO UPDATE
+            SET documento = EXCLUDED.documento, texto = EXCLUDED.texto
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION trg_busqueda_producto() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM refrescar_busqueda(ARRAY[NEW.id]);
+        RETURN NULL;
+    END $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION trg_busqueda_variante() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM refrescar_busqueda(ARRAY[NEW.producto_id]);
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM refrescar_busqueda(ARRAY[OLD.producto_id]);
+        ELSE
+            PERFORM refrescar_busqueda(ARRAY[OLD.producto_id, NEW.producto_id]);
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    "DROP TRIGGER IF EXISTS busqueda_producto ON productos",
+    """
+    CREATE TRIGGER busqueda_producto
+    AFTER INSERT OR UPDATE OF nombre, marca, categoria ON productos
+    FOR EACH ROW EXECUTE FUNCTION trg_busqueda_producto()
+    """,
+    "DROP TRIGGER IF EXISTS busqueda_variante ON variantes",
+    """
+    CREATE TRIGGER busqueda_variante
+    AFTER INSERT OR DELETE OR UPDATE OF producto_id, sabor, tamanio, sku, activa ON variantes
+    FOR EACH ROW EXECUTE FUNCTION trg_busqueda_variante()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_busqueda_productos_documento ON busqueda_productos USING GIN (documento)",
+    "CREATE INDEX IF NOT EXISTS ix_busqueda_productos_texto ON busqueda_productos USING GIN (texto gin_trgm_ops)",
+    # Productos anteriores a los triggers (o cargados con los triggers deshabilitados)
+    """
+    SELECT refrescar_busqueda(ARRAY(
+        SELECT p.id FROM productos p
+        WHERE NOT EXISTS (SELECT 1 FROM busqueda_productos b WHERE b.producto_id = p.id)
+    ))
+    """,
+]
+
+_CONDICION = """
+    (b.documento @@ to_tsquery('es_unaccent', :busqueda_tsquery)
+     OR f_unaccent(:busqueda_termino) <% b.texto
+     OR (:busqueda_subcadena AND b.texto LIKE '%' || f_unaccent(:busqueda_patron) || '%'))
+"""
+
+_SQL_BUSCAR = f"""
+    SELECT p.id, p.nombre, p.marca, p.categoria, p.imagen_url,
+           ts_rank(b.documento, to_tsquery('es_unaccent', :busqueda_tsquery))
+           + word_similarity(f_unaccent(:busqueda_termino), b.texto) AS puntaje
+    FROM busqueda_productos b
+    JOIN productos p ON p.id = b.producto_id
+    WHERE {_CONDICION}
+      AND (p.activo OR NOT :solo_activos)
+    ORDER BY puntaje DESC, p.nombre, p.id
+    LIMIT :limite
+"""
+
+
+def instalar(conn: Connection):
+    """Crea (o actualiza) todo lo necesario para la búsqueda.  No hace commit."""
+    for sentencia in _SQL_INSTALAR:
+        conn.execute(text(sentencia))
+
+
+def _parametros(termino: str) -> Optional[dict]:
+    """
+    Parámetros de la consulta, o None si el término no tiene palabras.
+    Cada palabra se busca como prefijo (`palabra:*`); las palabras se
+    extraen acá para que ningún carácter del usuario llegue como operador
+    de tsquery.  La subcadena conserva el término tal cual (guiones de SKU
+    incluidos), con los comodines de LIKE escapados.
+    """
+    termino = " ".join(termino.lower().split())
+    palabras = re.findall(r"[^\W_]+", termino)
+    if not palabras:
+        return None
+    return {
+        "busqueda_tsquery": " & ".join(f"{p}:*" for p in palabras),
+        "busqueda_termino": termino,
+        "busqueda_patron": re.sub(r"([\\%_])", r"\\\1", termino),
+        "busqueda_subcadena": len(termino) >= _MIN_SUBCADENA,
+    }
+
+
+def buscar(db: Session, termino: str, limite: int = 10, solo_activos: bool = True) -> List[dict]:
+    """Productos que coinciden con `termino`, del más relevante al menos."""
+    parametros = _parametros(termino)
+    if parametros is None:
+        return []
+    filas = db.execute(
+        text(_SQL_BUSCAR),
+        {**parametros, "limite": limite, "solo_activos": solo_activos},
+    ).mappings().all()
+    return [dict(f, puntaje=round(float(f["puntaje"]), 4)) for f in filas]
+
+
+def filtro(termino: str):
+    """
+    Subconsulta de ids de productos que coinciden con `termino`, para
+    filtrar listados: `query.filter(Producto.id.in_(filtro(busqueda)))`.
+    Un término sin palabras buscables no coincide con nada.
+    """
+    parametros = _parametros(termino)
+    if parametros is None:
+        return text("SELECT producto_id FROM busqueda_productos WHERE FALSE").columns(column("producto_id", Integer))
+    return (
+        text(f"SELECT b.producto_id FROM busqueda_productos b WHERE {_CONDICION}")
+        .bindparams(**parametros)
+        .columns(column("producto_id", Integer))
+    )
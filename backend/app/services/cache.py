@@ -0,0 +1,138 @@
+"""
+Cache de respuestas para endpoints de dashboard.
+
+La clave de cada entrada incluye el endpoint, sus parámetros y la versión
+actual de los dominios de los que depende (ver `app.services.eventos`).
+Una escritura en ventas/compras/stock/... incrementa la versión en la misma
+transacción, por lo que la lectura siguiente ya no encuentra la clave vieja:
+no hace falta borrar nada y funciona igual con varios workers.  Las entradas
+huérfanas se van por TTL o por LRU.
+
+La clave también lleva el día actual: varios endpoints resuelven "hoy" o
+"el mes actual" por su cuenta cuando no reciben fecha/mes/año, y sin eso
+una entrada de ayer se serviría hoy con otro período.
+
+Backend: memoria del proceso (TTL + LRU) por defecto; si CACHE_URL apunta a
+un Redis (`redis://...`) y el paquete `redis` está instalado, se usa ese.
+"""
+
+import functools
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Optional
+
+from app.config import settings
+from app.services.eventos import versiones
+
+logger = logging.getLogger(__name__)
+
+_FALTANTE = object()
+
+
+class CacheMemoria:
+    """TTL + LRU en memoria del proceso."""
+
+    def __init__(self, max_entradas: int = 512):
+        self.max_entradas = max_entradas
+        self._datos: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave: str):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return _FALTANTE
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return _FALTANTE
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave: str, valor: Any, ttl: int):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+class CacheRedis:
+    """Mismo contrato que CacheMemoria, sobre Redis (valores serializados con pickle)."""
+
+    def __init__(self, url: str, prefijo: str = "aurum:cache:"):
+        import redis
+
+        self._cliente = redis.Redis.from_url(url)
+        self._prefijo = prefijo
+
+    def get(self, clave: str):
+        try:
+            crudo = self._cliente.get(self._prefijo + clave)
+        except Exception:
+            logger.warning("Redis no disponible; se omite el cache", exc_info=True)
+            return _FALTANTE
+        return _FALTANTE if crudo is None else pickle.loads(crudo)
+
+    def set(self, clave: str, valor: Any, ttl: int):
+        try:
+            self._cliente.set(self._prefijo + clave, pickle.dumps(valor), ex=ttl)
+        except Exception:
+            logger.warning("Redis no disponible; no se guardó la entrada", exc_info=True)
+
+    def limpiar(self):
+        for clave in self._cliente.scan_iter(self._prefijo + "*"):
+            self._cliente.delete(clave)
+
+
+def _crear_backend():
+    if settings.CACHE_URL.startswith(("redis://", "rediss://")):
+        try:
+            return CacheRedis(settings.CACHE_URL)
+        except ImportError:
+            logger.warning("CACHE_URL apunta a Redis pero el paquete `redis` no está instalado; uso memoria")
+    return CacheMemoria(settings.CACHE_MAX_ENTRADAS)
+
+
+backend = _crear_backend()
+
+
+def cacheado(*dominios: str, ttl: Optional[int] = None):
+    """
+    Decorador para endpoints de lectura que reciben `db: Session`.
+
+    `dominios` — dominios de eventos cuyos cambios invalidan el resultado.
+    `ttl`      — segundos de vida máxima (default: settings.CACHE_TTL_SEGUNDOS).
+    """
+    ttl = ttl if ttl is not None else settings.CACHE_TTL_SEGUNDOS
+
+    def decorador(funcion):
+        nombre = f"{funcion.__module__}.{funcion.__qualname__}"
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            db = kwargs.get("db")
+            if db is None or args or not settings.CACHE_HABILITADO:
+                return funcion(*args, **kwargs)
+
+            parametros = sorted((k, repr(v)) for k, v in kwargs.items() if k != "db")
+            version = sorted(versiones(db, dominios).items())
+            clave = f"{nombre}|{parametros}|{date.today().isoformat()}|{version}"
+
+            valor = backend.get(clave)
+            if valor is _FALTANTE:
+                valor = funcion(*args, **kwargs)
+                backend.set(clave, valor, ttl)
+            return valor
+
+        return envoltura
+
+    return decorador
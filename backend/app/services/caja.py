@@ -0,0 +1,351 @@
+"""
+Libro de caja con saldo corrido por método de pago.
+
+Cada cambio que mueve dinero — venta confirmada (alta, confirmación,
+edición, baja), compra (alta, edición, baja), gasto y ajuste de saldo — deja
+un asiento en `movimientos_caja` con el monto y el saldo resultante del
+método, en la misma transacción.  El saldo actual vive en `saldos_caja`
+(una fila por método), así que leerlo es O(1); el saldo a una fecha es el
+último asiento anterior, resuelto con el índice (metodo_pago, fecha, id).
+
+Fecha de los asientos: siempre la del documento (`ventas.fecha`,
+`compras.fecha`, `gastos.fecha`, `ajustes_saldo.fecha`), tanto en vivo como
+al reconstruir.  Una venta abierta que se confirma días después, o una
+compra que se edita, asientan en la fecha del documento; los asientos
+posteriores a esa fecha corren su saldo hasta el próximo ajuste (que fija
+el saldo y absorbe la diferencia en su monto) o, si no hay ninguno, hasta
+el saldo actual.  Así el saldo a cualquier fecha es el mismo con el libro
+armado en vivo o reconstruido.
+
+Los asientos se arman a partir del propio flush del ORM (igual que los
+totales de stock en `app.services.inventario`): un listener `before_flush`
+compara el aporte a caja de cada Venta/Compra/Gasto antes y después del
+cambio, y `before_commit` los escribe tomando el lock de fila del saldo de
+cada método, lo que serializa el saldo corrido entre requests concurrentes.
+
+    python -m app.services.caja reconstruir   # rearma el libro desde el historial
+"""
+
+import argparse
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import AjusteSaldo, Compra, Gasto, MetodoPagoEnum, Venta
+
+_PENDIENTES = "caja_pendientes"
+
+
+def _valor_enum(valor):
+    return getattr(valor, "value", valor)
+
+
+# ─── Lecturas ────────────────────────────────────────────────────────────────
+
+def saldos(db: Session, fecha: Optional[datetime] = None) -> Dict[str, Decimal]:
+    """Saldo por método: el actual (una fila por método) o el vigente a `fecha`."""
+    if fecha is None:
+        filas = db.execute(text("SELECT metodo_pago, saldo FROM saldos_caja")).all()
+    else:
+        filas = db.execute(
+            text("""
+                SELECT m.metodo_pago, ultimo.saldo
+                FROM saldos_caja m
+                LEFT JOIN LATERAL (
+                    SELECT saldo FROM movimientos_caja mc
+                    WHERE mc.metodo_pago = m.metodo_pago AND mc.fecha <= :fecha
+                    ORDER BY mc.fecha DESC, mc.id DESC
+                    LIMIT 1
+                ) ultimo ON TRUE
+            """),
+            {"fecha": fecha},
+        ).all()
+    encontrados = {_valor_enum(m): s for m, s in filas}
+    return {m.value: encontrados.get(m.value) or Decimal("0") for m in MetodoPagoEnum}
+
+
+def movimientos(
+    db: Session,
+    metodo_pago: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    limite: int = 100,
+    offset: int = 0,
+) -> List[dict]:
+    filtros, params = [], {"limite": limite, "offset": offset}
+    if metodo_pago:
+        filtros.append("metodo_pago = :metodo")
+        params["metodo"] = metodo_pago
+    if desde:
+        filtros.append("fecha >= :desde")
+        params["desde"] = desde
+    if hasta:
+        filtros.append("fecha <= :hasta")
+        params["hasta"] = hasta
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    filas = db.execute(
+        text(f"""
+            SELECT id, metodo_pago, monto, saldo, origen, referencia_id, fecha
+            FROM movimientos_caja {where}
+            ORDER BY fecha DESC, id DESC
+            LIMIT :limite OFFSET :offset
+        """),
+        params,
+    ).mappings().all()
+    return [dict(f, metodo_pago=_valor_enum(f["metodo_pago"])) for f in filas]
+
+
+# ─── Reconstrucción desde el historial ───────────────────────────────────────
+
+# Mismas reglas que el cálculo original de liquidez: un ajuste fija el saldo
+# y solo cuentan los movimientos estrictamente posteriores (a igual fecha el
+# ajuste va último).  `segmento` cuenta los ajustes vistos hasta cada fila.
+_SQL_RECONSTRUIR = """
+    WITH eventos AS (
+        SELECT metodo_pago, fecha, total AS monto, CAST(NULL AS NUMERIC) AS fijar,
+               'venta' AS origen, id AS referencia_id, 0 AS orden
+        FROM ventas WHERE estado = 'confirmada'
+        UNION ALL
+        SELECT metodo_pago, fecha, -COALESCE(total, 0), NULL, 'compra', id, 0 FROM compras
+        UNION ALL
+        SELECT metodo_pago, fecha, -monto, NULL, 'gasto', id, 0 FROM gastos
+        UNION ALL
+        SELECT tipo, fecha, NULL, monto_nuevo, 'ajuste', id, 1 FROM ajustes_saldo
+    ),
+    segmentos AS (
+        SELECT *, COUNT(fijar) OVER (
+            PARTITION BY metodo_pago ORDER BY fecha, orden, referencia_id ROWS UNBOUNDED PRECEDING
+        ) AS segmento
+        FROM eventos
+    ),
+    corridos AS (
+        SELECT *, SUM(COALESCE(fijar, monto)) OVER (
+            PARTITION BY metodo_pago, segmento ORDER BY fecha, orden, referencia_id ROWS UNBOUNDED PRECEDING
+        ) AS saldo
+        FROM segmentos
+    )
+    INSERT INTO movimientos_caja (metodo_pago, monto, saldo, origen, referencia_id, fecha)
+    SELECT metodo_pago,
+           saldo - COALESCE(LAG(saldo) OVER (PARTITION BY metodo_pago ORDER BY fecha, orden, referencia_id), 0),
+           saldo, origen, referencia_id, fecha
+    FROM corridos
+    ORDER BY fecha, orden, referencia_id
+"""
+
+
+def inicializar(db: Session) -> bool:
+    """Crea las filas de saldo y, si el libro nunca se armó, lo reconstruye. Devuelve si hizo algo."""
+    existentes = {_valor_enum(m) for m in db.execute(text("SELECT metodo_pago FROM saldos_caja")).scalars()}
+    if existentes >= {m.value for m in MetodoPagoEnum}:
+        return False
+    reconstruir(db)
+    return True
+
+
+def reconstruir(db: Session):
+    """Rearma movimientos_caja y saldos_caja desde ventas, compras, gastos y ajustes."""
+    db.execute(text("LOCK TABLE saldos_caja IN EXCLUSIVE MODE"))
+    db.execute(text("DELETE FROM movimientos_caja"))
+    db.execute(text(_SQL_RECONSTRUIR))
+    for metodo in MetodoPagoEnum:
+        db.execute(
+            text("""
+                INSERT INTO saldos_caja (metodo_pago, saldo, actualizado_en)
+                VALUES (:metodo, COALESCE((
+                    SELECT saldo FROM movimientos_caja WHERE metodo_pago = :metodo
+                    ORDER BY fecha DESC, id DESC LIMIT 1
+                ), 0), NOW())
+                ON CONFLICT (metodo_pago) DO UPDATE
+                SET saldo = EXCLUDED.saldo, actualizado_en = EXCLUDED.actualizado_en
+            """),
+            {"metodo": metodo.value},
+        )
+
+
+# ─── Asientos a partir del flush ─────────────────────────────────────────────
+
+_CAMPOS = {
+    Venta: ("metodo_pago", "estado", "total"),
+    Compra: ("metodo_pago", "total"),
+    Gasto: ("metodo_pago", "monto"),
+}
+
+
+def _valor(obj, campo: str, anterior: bool):
+    historia = inspect(obj).attrs[campo].history
+    valores = (historia.deleted if anterior else historia.added) or historia.unchanged
+    if valores:
+        return valores[0]
+    if anterior and historia.added:
+        return None        # atributo nuevo sin valor previo
+    return getattr(obj, campo)
+
+
+def _aporte(obj, anterior: bool):
+    """(método, origen, monto) con que el objeto impacta en caja, o None."""
+    metodo = _valor_enum(_valor(obj, "metodo_pago", anterior))
+    if metodo is None:
+        return None
+    if isinstance(obj, Venta):
+        if _valor_enum(_valor(obj, "estado", anterior)) != "confirmada":
+            return None
+        return metodo, "venta", _valor(obj, "total", anterior) or Decimal("0")
+    if isinstance(obj, Compra):
+        return metodo, "compra", -(_valor(obj, "total", anterior) or Decimal("0"))
+    return metodo, "gasto", -(_valor(obj, "monto", anterior) or Decimal("0"))
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _registrar_aportes(session: Session, flush_context, instances):
+    pendientes = session.info.setdefault(_PENDIENTES, [])
+
+    def agregar(obj, aporte, signo, anterior):
+        if aporte is not None and aporte[2]:
+            metodo, origen, monto = aporte
+            # Sin fecha todavía (server_default): se resuelve después del flush
+            fecha = _valor(obj, "fecha", anterior)
+            pendientes.append((metodo, origen, obj, signo * Decimal(monto), None, fecha))
+
+    for obj in session.new:
+        if type(obj) in _CAMPOS:
+            agregar(obj, _aporte(obj, anterior=False), 1, False)
+        elif isinstance(obj, AjusteSaldo):
+            pendientes.append(
+                (_valor_enum(obj.tipo), "ajuste", obj, Decimal("0"), Decimal(obj.monto_nuevo), obj.fecha)
+            )
+    for obj in session.dirty:
+        campos = _CAMPOS.get(type(obj))
+        if campos and any(inspect(obj).attrs[c].history.has_changes() for c in campos + ("fecha",)):
+            agregar(obj, _aporte(obj, anterior=True), -1, True)
+            agregar(obj, _aporte(obj, anterior=False), 1, False)
+    for obj in session.deleted:
+        if type(obj) in _CAMPOS:
+            agregar(obj, _aporte(obj, anterior=True), -1, True)
+
+    if not pendientes:
+        session.info.pop(_PENDIENTES, None)
+
+
+# Un asiento en `:fecha`: saldo = el del último asiento anterior + monto (o
+# `:fijar` para un ajuste).  Los asientos posteriores corren su saldo hasta
+# el próximo ajuste, que absorbe la diferencia en su monto; sin ajuste
+# posterior la diferencia llega al saldo actual.  En el caso común (fecha ≈
+# ahora) no hay asientos posteriores y todo resuelve por el índice
+# (metodo_pago, fecha, id).
+_SQL_ASENTAR = """
+    INSERT INTO movimientos_caja (metodo_pago, monto, saldo, origen, referencia_id, fecha)
+    SELECT :metodo, COALESCE(CAST(:fijar AS NUMERIC) - previo.saldo, :monto),
+           COALESCE(CAST(:fijar AS NUMERIC), previo.saldo + :monto), :origen, :referencia_id, :fecha
+    FROM (
+        SELECT COALESCE((
+            SELECT saldo FROM movimientos_caja
+            WHERE metodo_pago = :metodo AND fecha <= :fecha
+            ORDER BY fecha DESC, id DESC LIMIT 1
+        ), 0) AS saldo
+    ) previo
+    RETURNING monto
+"""
+
+_SQL_SIGUIENTE_AJUSTE = """
+    SELECT fecha, id FROM movimientos_caja
+    WHERE metodo_pago = :metodo AND fecha > :fecha AND origen = 'ajuste'
+    ORDER BY fecha, id LIMIT 1
+"""
+
+_SQL_CORRER_SALDOS = """
+    UPDATE movimientos_caja SET saldo = saldo + :monto
+    WHERE metodo_pago = :metodo AND fecha > :fecha
+      AND (CAST(:hasta_id AS BIGINT) IS NULL OR (fecha, id) < (:hasta_fecha, :hasta_id))
+"""
+
+
+def _asentar_uno(session: Session, metodo, origen, referencia_id, fecha, monto, fijar):
+    monto = session.execute(text(_SQL_ASENTAR), {
+        "metodo": metodo, "monto": monto, "fijar": fijar,
+        "origen": origen, "referencia_id": referencia_id, "fecha": fecha,
+    }).scalar()
+    if not monto:
+        return
+    siguiente = session.execute(text(_SQL_SIGUIENTE_AJUSTE), {"metodo": metodo, "fecha": fecha}).first()
+    session.execute(text(_SQL_CORRER_SALDOS), {
+        "metodo": metodo, "fecha": fecha, "monto": monto,
+        "hasta_fecha": siguiente[0] if siguiente else None,
+        "hasta_id": siguiente[1] if siguiente else None,
+    })
+    if siguiente:
+        session.execute(
+            text("UPDATE movimientos_caja SET monto = monto - :monto WHERE id = :id"),
+            {"monto": monto, "id": siguiente[1]},
+        )
+    else:
+        session.execute(
+            text("UPDATE saldos_caja SET saldo = saldo + :monto, actualizado_en = clock_timestamp() "
+                 "WHERE metodo_pago = :metodo"),
+            {"monto": monto, "metodo": metodo},
+        )
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _asentar(session: Session):
+    # before_commit corre antes del flush final de commit(): flushear acá para ver todo
+    session.flush()
+    pendientes = session.info.pop(_PENDIENTES, None)
+    if not pendientes:
+        return
+
+    # Un asiento por (método, origen, referencia, fecha) y transacción; los ajustes van en orden
+    asientos: "OrderedDict[tuple, list]" = OrderedDict()
+    for metodo, origen, obj, monto, fijar, fecha in pendientes:
+        if fecha is None:
+            fecha = obj.fecha
+        clave = (metodo, origen, obj.id if fijar is None else ("ajuste", id(obj)), fecha)
+        if clave in asientos and fijar is None:
+            asientos[clave][0] += monto
+        else:
+            asientos[clave] = [monto, fijar, obj.id]
+
+    # Locks de saldo siempre en el mismo orden de métodos para evitar deadlocks
+    orden = {m.value: i for i, m in enumerate(MetodoPagoEnum)}
+    bloqueados = set()
+    for (metodo, origen, _, fecha), (monto, fijar, referencia_id) in sorted(
+        asientos.items(), key=lambda a: orden.get(a[0][0], 99)
+    ):
+        if fijar is None and not monto:
+            continue
+        if metodo not in bloqueados:
+            session.execute(
+                text("SELECT saldo FROM saldos_caja WHERE metodo_pago = :metodo FOR UPDATE"), {"metodo": metodo}
+            )
+            bloqueados.add(metodo)
+        if fecha is None:
+            fecha = session.execute(text("SELECT clock_timestamp()")).scalar()
+        _asentar_uno(session, metodo, origen, referencia_id, fecha, monto, fijar)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar(session: Session):
+    session.info.pop(_PENDIENTES, None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del libro de caja.")
+    parser.add_argument("accion", choices=["reconstruir"])
+    parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        reconstruir(db)
+        db.commit()
+        for metodo, saldo in saldos(db).items():
+            print(f"{metodo}: {saldo}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Catálogo en memoria para el punto de venta (lookup por SKU / variante).
+
+Cada proceso mantiene una foto inmutable del catálogo vendible (variantes
+activas de productos activos): dos dicts de solo lectura, por SKU
+(normalizado) y por id de variante, que apuntan a los mismos `ItemCatalogo`
+(`__slots__`, precio y stock por sucursal activa).  Un lookup es un acceso
+a dict, sin base.
+
+La foto lleva la versión de los dominios productos / stock / sucursales
+(`versiones_dominio`, ver app/services/eventos.py); `version` es su suma,
+así que crece con cada cambio y es comparable entre workers.  Se revisa:
+
+- enseguida, si un commit de este proceso emitió alguno de esos dominios
+  (suscriptor local de eventos);
+- cada `POS_CATALOGO_VERIFICAR_MS`, para ver commits de otros workers (una
+  consulta por PK a `versiones_dominio`).
+
+Si cambió stock, solo se releen las variantes con movimientos en el libro
+de stock desde la última lectura (con `POS_CATALOGO_MARGEN_SEGUNDOS` de
+solapamiento para transacciones que commitearon tarde) y se arma una foto
+nueva reemplazando esos ítems.  Si cambiaron productos, precios o
+sucursales se reconstruye entera (una consulta; son cambios poco
+frecuentes), igual que cada `POS_CATALOGO_RECONSTRUIR_SEGUNDOS` como red
+de seguridad.  Los lectores nunca ven una foto a medio armar: la
+referencia se reemplaza de una vez.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.eventos import PRODUCTOS, STOCK, SUCURSALES, suscribir, versiones
+
+_DOMINIOS = (PRODUCTOS, STOCK, SUCURSALES)
+
+_SQL_VARIANTES = """
+    SELECT v.id, v.producto_id, v.sku, p.nombre, p.marca, v.sabor, v.tamanio, v.precio_venta
+    FROM variantes v JOIN productos p ON p.id = v.producto_id
+    WHERE v.activa AND p.activo
+"""
+
+_SQL_STOCK = """
+    SELECT ss.variante_id, ss.sucursal_id, ss.cantidad
+    FROM stock_sucursal ss JOIN sucursales s ON s.id = ss.sucursal_id AND s.activa
+    WHERE ss.cantidad <> 0
+      AND (CAST(:ids AS INTEGER[]) IS NULL OR ss.variante_id = ANY(CAST(:ids AS INTEGER[])))
+    ORDER BY ss.variante_id, ss.sucursal_id
+"""
+
+
+class ItemCatalogo:
+    """Variante vendible con su precio y stock por sucursal.  Inmutable."""
+
+    __slots__ = (
+        "variante_id", "producto_id", "sku", "nombre", "marca", "sabor", "tamanio",
+        "precio_venta", "stock",
+    )
+
+    def __init__(self, variante_id, producto_id, sku, nombre, marca, sabor, tamanio, precio_venta,
+                 stock: Tuple[Tuple[int, int], ...] = ()):
+        for campo, valor in zip(self.__slots__, (
+            variante_id, producto_id, sku, nombre, marca, sabor, tamanio, precio_venta, stock,
+        )):
+            object.__setattr__(self, campo, valor)
+
+    def __setattr__(self, campo, valor):
+        raise AttributeError("ItemCatalogo es inmutable")
+
+    def con_stock(self, stock: Tuple[Tuple[int, int], ...]) -> "ItemCatalogo":
+        return ItemCatalogo(
+            self.variante_id, self.producto_id, self.sku, self.nombre, self.marca,
+            self.sabor, self.tamanio, self.precio_venta, stock,
+        )
+
+    @property
+    def stock_total(self) -> int:
+        return sum(cantidad for _, cantidad in self.stock)
+
+
+class Catalogo:
+    """Foto del catálogo: índices de solo lectura y las versiones con que se armó."""
+
+    __slots__ = ("por_sku", "por_id", "versiones", "leido_hasta", "construido")
+
+    def __init__(self, por_id: Dict[int, ItemCatalogo], versiones: Dict[str, int],
+                 leido_hasta: datetime, construido: float):
+        self.por_id: Mapping[int, ItemCatalogo] = MappingProxyType(por_id)
+        self.por_sku: Mapping[str, ItemCatalogo] = MappingProxyType(
+            {normalizar_sku(i.sku): i for i in por_id.values() if i.sku}
+        )
+        self.versiones = MappingProxyType(dict(versiones))
+        self.leido_hasta = leido_hasta
+        self.construido = construido
+
+    @property
+    def version(self) -> int:
+        return sum(self.versiones.values())
+
+
+def normalizar_sku(sku: str) -> str:
+    return sku.strip().casefold()
+
+
+# ─── Estado del proceso ──────────────────────────────────────────────────────
+
+_catalogo: Optional[Catalogo] = None
+_verificado = 0.0
+_pendientes: Set[str] = set()
+_lock = threading.Lock()
+
+
+def _marcar(dominios: Set[str]):
+    """Suscriptor de eventos: un commit local tocó el catálogo."""
+    _pendientes.update(dominios.intersection(_DOMINIOS))
+
+
+suscribir(_marcar)
+
+
+def _stock(db: Session, ids: Optional[Iterable[int]] = None) -> Dict[int, Tuple[Tuple[int, int], ...]]:
+    agrupado: Dict[int, list] = {}
+    for variante_id, sucursal_id, cantidad in db.execute(
+        text(_SQL_STOCK), {"ids": list(ids) if ids is not None else None}
+    ):
+        agrupado.setdefault(variante_id, []).append((sucursal_id, cantidad))
+    return {vid: tuple(filas) for vid, filas in agrupado.items()}
+
+
+def _reloj(db: Session) -> datetime:
+    return db.execute(text("SELECT clock_timestamp()")).scalar()
+
+
+def construir(db: Session, vers: Optional[Dict[str, int]] = None) -> Catalogo:
+    """Foto completa: una consulta de variantes y una de stock."""
+    vers = vers if vers is not None else versiones(db, _DOMINIOS)
+    leido_hasta = _reloj(db)
+    stock = _stock(db)
+    por_id = {
+        fila[0]: ItemCatalogo(*fila, stock=stock.get(fila[0], ()))
+        for fila in db.execute(text(_SQL_VARIANTES))
+    }
+    return Catalogo(por_id, vers, leido_hasta, time.monotonic())
+
+
+def _actualizar_stock(db: Session, catalogo: Catalogo, vers: Dict[str, int]) -> Catalogo:
+    """Foto nueva con el stock releído solo para las variantes que se movieron."""
+    leido_hasta = _reloj(db)
+    desde = catalogo.leido_hasta - timedelta(seconds=settings.POS_CATALOGO_MARGEN_SEGUNDOS)
+    movidas = [
+        vid for vid in db.execute(
+            text("SELECT DISTINCT variante_id FROM movimientos_stock WHERE fecha >= :desde"),
+            {"desde": desde},
+        ).scalars()
+        if vid in catalogo.por_id
+    ]
+    por_id = dict(catalogo.por_id)
+    if movidas:
+        stock = _stock(db, movidas)
+        for vid in movidas:
+            por_id[vid] = por_id[vid].con_stock(stock.get(vid, ()))
+    return Catalogo(por_id, vers, leido_hasta, catalogo.construido)
+
+
+def actual(db: Session) -> Catalogo:
+    """
+    Foto vigente.  Solo toca la base si hay cambios locales pendientes o
+    pasó el intervalo de verificación; el resto de las llamadas devuelve la
+    referencia en memoria.
+    """
+    global _catalogo, _verificado
+    catalogo = _catalogo
+    ahora = time.monotonic()
+    if (catalogo is not None and not _pendientes
+            and (ahora - _verificado) * 1000 < settings.POS_CATALOGO_VERIFICAR_MS):
+        return catalogo
+
+    with _lock:
+        catalogo = _catalogo
+        if (catalogo is not None and not _pendientes
+                and (ahora - _verificado) * 1000 < settings.POS_CATALOGO_VERIFICAR_MS):
+            return catalogo
+        _pendientes.clear()
+        vers = versiones(db, _DOMINIOS)
+        if (catalogo is None
+                or vers[PRODUCTOS] != catalogo.versiones[PRODUCTOS]
+                or vers[SUCURSALES] != catalogo.versiones[SUCURSALES]
+                or ahora - catalogo.construido >= settings.POS_CATALOGO_RECONSTRUIR_SEGUNDOS):
+            catalogo = construir(db, vers)
+        elif vers[STOCK] != catalogo.versiones[STOCK]:
+            catalogo = _actualizar_stock(db, catalogo, vers)
+        _catalogo = catalogo
+        _verificado = time.monotonic()
+        return catalogo
+
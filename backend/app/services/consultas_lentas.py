@@ -0,0 +1,163 @@
+"""
+Timeouts de statement por ruta y registro de consultas lentas.
+
+Timeouts: `get_db` anota en la sesión la ruta del request (el template,
+p. ej. `/clientes/{cliente_id}`).  Al empezar cada transacción de esa
+sesión se aplica `SET LOCAL statement_timeout` con el valor del patrón más
+específico de `DB_TIMEOUTS_POR_RUTA` que la matchee (fnmatch) o, si
+ninguno, `DB_STATEMENT_TIMEOUT_MS`.  Al ser LOCAL vuelve solo al default al
+terminar la transacción, así que la conexión vuelve limpia al pool.  Una
+consulta cancelada por timeout responde 503 (ver `app.main`).
+
+Consultas lentas: listeners de los engines (primario y réplica) miden
+cada statement; las que superan `CONSULTA_LENTA_MS` se guardan con SQL, parámetros, ruta y el
+plan de `EXPLAIN` (sin ANALYZE: no se vuelve a ejecutar) en un buffer
+circular de `CONSULTAS_LENTAS_MAX` entradas por proceso.  El EXPLAIN corre
+en la misma conexión dentro de un SAVEPOINT, para que un error al
+planificar no aborte la transacción del request.  Las canceladas por
+timeout se registran sin plan.  Se consultan en GET /admin/consultas-lentas.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import RUTA, ReadSessionLocal, SessionLocal, engine, read_engine
+
+logger = logging.getLogger(__name__)
+
+_INICIOS = "consultas_inicios"
+_RUTA_CONEXION = "consultas_ruta"
+_EXPLICABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_MAX_SQL = 10_000
+_MAX_PARAMETROS = 2_000
+
+_registro: deque = deque(maxlen=settings.CONSULTAS_LENTAS_MAX)
+_lock = threading.Lock()
+
+
+def timeout_para(ruta: Optional[str]) -> int:
+    """Milisegundos de statement_timeout para la ruta (0 = sin límite)."""
+    if ruta:
+        patrones = [p for p in settings.DB_TIMEOUTS_POR_RUTA if fnmatchcase(ruta, p)]
+        if patrones:
+            # El patrón más largo es el más específico
+            return settings.DB_TIMEOUTS_POR_RUTA[max(patrones, key=len)]
+    return settings.DB_STATEMENT_TIMEOUT_MS
+
+
+def registradas(limite: Optional[int] = None) -> List[dict]:
+    """Consultas lentas registradas, de la más reciente a la más vieja."""
+    with _lock:
+        entradas = list(_registro)
+    entradas.reverse()
+    return entradas[:limite] if limite else entradas
+
+
+def limpiar() -> int:
+    with _lock:
+        cantidad = len(_registro)
+        _registro.clear()
+    return cantidad
+
+
+def _registrar(**entrada):
+    entrada["fecha"] = datetime.now(timezone.utc)
+    with _lock:
+        _registro.append(entrada)
+
+
+def _plan(cursor, statement: str, parameters) -> Optional[str]:
+    explicar = cursor.connection.cursor()
+    try:
+        explicar.execute("SAVEPOINT consulta_lenta")
+        try:
+            explicar.execute("EXPLAIN " + statement, parameters)
+            plan = "\n".join(str(fila[0]) for fila in explicar.fetchall())
+            explicar.execute("RELEASE SAVEPOINT consulta_lenta")
+            return plan
+        except Exception as exc:
+            explicar.execute("ROLLBACK TO SAVEPOINT consulta_lenta")
+            return f"(sin plan: {exc})"
+    except Exception:
+        logger.warning("No se pudo capturar el plan de una consulta lenta", exc_info=True)
+        return None
+    finally:
+        explicar.close()
+
+
+# ─── Timeout por ruta ────────────────────────────────────────────────────────
+
+def _aplicar_timeout(session: Session, transaction, connection):
+    ruta = session.info.get(RUTA)
+    connection.info[_RUTA_CONEXION] = ruta
+    if ruta is None:
+        return
+    milisegundos = timeout_para(ruta)
+    if milisegundos > 0:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(milisegundos)}")
+
+
+def _olvidar_ruta(dbapi_connection, registro):
+    registro.info.pop(_RUTA_CONEXION, None)
+
+
+# ─── Medición ────────────────────────────────────────────────────────────────
+
+def _inicio(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_INICIOS, []).append(time.perf_counter())
+
+
+def _fin(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get(_INICIOS)
+    if not inicios:
+        return
+    duracion = (time.perf_counter() - inicios.pop()) * 1000
+    if duracion < settings.CONSULTA_LENTA_MS:
+        return
+    plan = None
+    if not executemany and _EXPLICABLE.match(statement):
+        plan = _plan(cursor, statement, parameters)
+    _registrar(
+        ruta=conn.info.get(_RUTA_CONEXION),
+        duracion_ms=round(duracion, 1),
+        sql=statement[:_MAX_SQL],
+        parametros=repr(parameters)[:_MAX_PARAMETROS],
+        plan=plan,
+        error=None,
+    )
+
+
+def _error(contexto):
+    conn = contexto.connection
+    inicios = conn.info.get(_INICIOS) if conn is not None else None
+    if not inicios:
+        return
+    duracion = (time.perf_counter() - inicios.pop()) * 1000
+    if getattr(contexto.original_exception, "pgcode", None) == "57014":
+        _registrar(
+            ruta=conn.info.get(_RUTA_CONEXION),
+            duracion_ms=round(duracion, 1),
+            sql=(contexto.statement or "")[:_MAX_SQL],
+            parametros=repr(contexto.parameters)[:_MAX_PARAMETROS],
+            plan=None,
+            error="statement_timeout",
+        )
+
+
+for _fabrica in (SessionLocal, ReadSessionLocal):
+    event.listen(_fabrica, "after_begin", _aplicar_timeout)
+for _motor in {engine, read_engine}:
+    event.listen(_motor, "checkin", _olvidar_ruta)
+    event.listen(_motor, "before_cursor_execute", _inicio)
+    event.listen(_motor, "after_cursor_execute", _fin)
+    event.listen(_motor, "handle_error", _error)
@@ -0,0 +1,99 @@
+"""
+Eventos de dominio — versionado de datos por dominio.
+
+Cada endpoint de escritura declara qué dominios modificó con
+`emitir(db, VENTAS, STOCK, ...)` antes de hacer commit.  Justo antes del
+COMMIT se incrementa `versiones_dominio.version` de esos dominios dentro de
+la misma transacción, así que la versión nueva se vuelve visible exactamente
+junto con los datos que la originaron (también entre workers / procesos).
+
+Los lectores (cache de dashboards, ETags) usan `versiones(db, ...)` como
+parte de su clave; tras el commit se notifica además a los suscriptores
+locales del proceso (`suscribir`).
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+VENTAS = "ventas"
+COMPRAS = "compras"
+STOCK = "stock"
+PRODUCTOS = "productos"
+FINANZAS = "finanzas"
+SUCURSALES = "sucursales"
+CATEGORIAS = "categorias"
+MARCAS = "marcas"
+
+DOMINIOS = (VENTAS, COMPRAS, STOCK, PRODUCTOS, FINANZAS, SUCURSALES, CATEGORIAS, MARCAS)
+
+_PENDIENTES = "eventos_pendientes"
+_suscriptores: List[Callable[[Set[str]], None]] = []
+
+
+def emitir(db: Session, *dominios: str):
+    """Marca dominios como modificados; se publican al hacer commit de `db`."""
+    db.info.setdefault(_PENDIENTES, set()).update(dominios)
+
+
+def suscribir(funcion: Callable[[Set[str]], None]):
+    """Registra un callback local que recibe los dominios de cada commit."""
+    _suscriptores.append(funcion)
+
+
+def estado(db: Session, dominios: Iterable[str]) -> Dict[str, Tuple[int, Optional[datetime]]]:
+    """Versión y fecha de último cambio de cada dominio (una sola consulta por PK)."""
+    dominios = sorted(set(dominios))
+    filas = db.execute(
+        text("SELECT dominio, version, actualizado_en FROM versiones_dominio WHERE dominio = ANY(:dominios)"),
+        {"dominios": dominios},
+    ).all()
+    encontradas = {d: (v, f) for d, v, f in filas}
+    return {d: encontradas.get(d, (0, None)) for d in dominios}
+
+
+def versiones(db: Session, dominios: Iterable[str]) -> Dict[str, int]:
+    return {d: v for d, (v, _) in estado(db, dominios).items()}
+
+
+# ─── Ciclo de vida de la sesión ───────────────────────────────────────────────
+
+@event.listens_for(SessionLocal, "before_commit")
+def _publicar_versiones(session: Session):
+    dominios = session.info.get(_PENDIENTES)
+    if not dominios:
+        return
+    # Un único UPDATE al final de la transacción: el lock de fila se mantiene
+    # solo lo que tarda el COMMIT.
+    session.execute(
+        text("""
+            UPDATE versiones_dominio
+            SET version = version + 1, actualizado_en = NOW()
+            WHERE dominio = ANY(:dominios)
+        """),
+        {"dominios": sorted(dominios)},
+    )
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _notificar(session: Session):
+    dominios = session.info.pop(_PENDIENTES, None)
+    if not dominios:
+        return
+    for funcion in _suscriptores:
+        try:
+            funcion(set(dominios))
+        except Exception:
+            logger.exception("Error en suscriptor de eventos %s", funcion)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar(session: Session):
+    session.info.pop(_PENDIENTES, None)
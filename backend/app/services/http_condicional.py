@@ -0,0 +1,72 @@
+"""
+Requests condicionales (ETag / Last-Modified) para endpoints de catálogo.
+
+`condicional(*dominios)` devuelve una dependencia de FastAPI que, antes de
+ejecutar el endpoint, lee la versión de los dominios involucrados (una
+consulta por PK sobre `versiones_dominio`) y arma un ETag débil con la ruta,
+los query params y esas versiones.  Si el cliente ya tiene esa versión
+(`If-None-Match` / `If-Modified-Since`) se corta con 304 sin tocar el ORM
+ni serializar nada; si no, el endpoint corre normal y la respuesta sale con
+los encabezados para el próximo request.
+
+    @router.get("", dependencies=[Depends(condicional(PRODUCTOS, STOCK))])
+"""
+
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.services.eventos import estado
+
+
+def _etag(request: Request, versiones: dict) -> str:
+    base = f"{request.url.path}?{request.url.query}|{sorted(versiones.items())}"
+    return 'W/"' + hashlib.sha1(base.encode()).hexdigest()[:20] + '"'
+
+
+def _coincide(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Comparación débil: se ignora el prefijo W/ de ambos lados
+    objetivo = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == objetivo for t in if_none_match.split(","))
+
+
+def _no_modificado_desde(if_modified_since: str, ultima) -> bool:
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        # Zona "-0000" (y otras entradas sin zona): se interpreta como UTC
+        desde = desde.replace(tzinfo=timezone.utc)
+    return ultima.replace(microsecond=0) <= desde
+
+
+def condicional(*dominios: str):
+    def dependencia(request: Request, response: Response, db: Session = Depends(get_db)):
+        datos = estado(db, dominios)
+        etag = _etag(request, {d: v for d, (v, _) in datos.items()})
+        fechas = [f for _, f in datos.values() if f is not None]
+        ultima = max(fechas).astimezone(timezone.utc) if fechas else None
+
+        encabezados = {"ETag": etag, "Cache-Control": "no-cache"}
+        if ultima is not None:
+            encabezados["Last-Modified"] = format_datetime(ultima, usegmt=True)
+
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            no_modificado = _coincide(if_none_match, etag)
+        else:
+            no_modificado = bool(if_modified_since and ultima and _no_modificado_desde(if_modified_since, ultima))
+
+        if no_modificado:
+            raise HTTPException(status_code=304, headers=encabezados)
+        response.headers.update(encabezados)
+
+    return dependencia
@@ -2,12 +2,14 @@ import base64
 import json
 import logging
 import re
+import time
 from decimal import Decimal
 
 import anthropic
 
 from app.config import settings
 from app.schemas import FacturaIAResponse, FacturaItemIA
+from app.services.metricas import observar_ia
 
 logger = logging.getLogger(__name__)
 
@@ -137,6 +139,7 @@ async def procesar_factura_con_ia(contenido: bytes, content_type: str) -> Factur
             },
         }
 
+    inicio = time.perf_counter()
     try:
         message = client.messages.create(
             model=CLAUDE_MODEL,
@@ -155,14 +158,19 @@ async def procesar_factura_con_ia(contenido: bytes, content_type: str) -> Factur
             ],
         )
     except anthropic.AuthenticationError:
+        observar_ia("facturas", inicio, resultado="error")
         raise Exception("ANTHROPIC_API_KEY inválida. Verificá la variable de entorno en Railway.")
     except anthropic.RateLimitError:
+        observar_ia("facturas", inicio, resultado="rate_limit")
         raise Exception("Límite de requests alcanzado. Esperá unos segundos e intentá de nuevo.")
     except anthropic.BadRequestError as e:
+        observar_ia("facturas", inicio, resultado="error")
         raise Exception(f"La imagen no pudo ser procesada: {str(e)}")
     except anthropic.APIError as e:
+        observar_ia("facturas", inicio, resultado="error")
         logger.error(f"Anthropic API error: {e}")
         raise Exception(f"Error del servicio de IA: {str(e)}")
+    observar_ia("facturas", inicio, message)
 
     texto = message.content[0].text.strip()
     texto_limpio = _limpiar_json(texto)
@@ -9,12 +9,14 @@ Responsabilidades:
 
 import json
 import logging
+import time
 from decimal import Decimal
 from typing import Any
 
 import anthropic
 
 from app.config import settings
+from app.services.metricas import observar_ia
 
 logger = logging.getLogger(__name__)
 
@@ -161,6 +163,7 @@ async def generar_sugerencia_compra(
     client = _get_client()
     prompt = _build_prompt(presupuesto, config, inventario)
 
+    inicio = time.perf_counter()
     try:
         message = client.messages.create(
             model=CLAUDE_MODEL,
@@ -168,16 +171,20 @@ async def generar_sugerencia_compra(
             messages=[{"role": "user", "content": prompt}],
         )
     except anthropic.AuthenticationError:
+        observar_ia("sugerencias", inicio, resultado="error")
         raise RuntimeError(
             "ANTHROPIC_API_KEY inválida. Verificá la variable de entorno."
         )
     except anthropic.RateLimitError:
+        observar_ia("sugerencias", inicio, resultado="rate_limit")
         raise RuntimeError(
             "Límite de requests alcanzado en Anthropic. Esperá unos segundos."
         )
     except anthropic.APIError as e:
+        observar_ia("sugerencias", inicio, resultado="error")
         logger.error("Anthropic API error: %s", e)
         raise RuntimeError(f"Error del servicio de IA: {e}")
+    observar_ia("sugerencias", inicio, message)
 
     texto = message.content[0].text.strip()
     texto_limpio = _limpiar_json(texto)
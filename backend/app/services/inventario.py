@@ -0,0 +1,453 @@
+"""
+Totales de stock mantenidos por variante.
+
+`Variante.stock_total` (suma en sucursales activas, incluido el depósito
+central) y `Variante.stock_central` se actualizan en la misma transacción
+que cualquier cambio en `stock_sucursal` hecho a través del ORM: un
+listener `before_flush` toma el delta de cada fila nueva / modificada /
+borrada y lo aplica con un único UPDATE incremental sobre `variantes`.
+Así ventas, compras, transferencias y ajustes quedan cubiertos sin que
+cada endpoint tenga que acordarse, y las lecturas pasan a ser una columna.
+
+Si cambia `activa`/`es_central` de una sucursal, los totales de las
+variantes con stock en ella se recalculan al final del flush.  Las cargas
+por SQL crudo aplican sus deltas con `sumar_a_totales`; `reparar_totales`
+recalcula desde cero y queda para reparaciones offline y cargas por COPY
+(no es seguro con escrituras concurrentes a la misma variante).
+
+Libro de movimientos: los mismos deltas se asientan en `movimientos_stock`
+(variante, sucursal, delta, motivo, referencia) con un único INSERT por
+flush.  El motivo lo declara el endpoint con `declarar_motivo(db, "venta", venta)`
+antes de tocar el stock; rige para todo lo que se flushee mientras esté
+vigente.  Los caminos por SQL crudo asientan con `registrar_movimientos`.
+
+El stock a una fecha se reconstruye desde la última foto anterior
+(`snapshots_stock`) más los movimientos entre la foto y la fecha, así que
+el costo depende de la distancia a la foto y no del largo del historial.
+
+Chequeo / reparación / foto manual (la foto conviene programarla, p. ej.
+por cron una vez al día):
+
+    python -m app.services.inventario verificar
+    python -m app.services.inventario reparar
+    python -m app.services.inventario snapshot
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import StockSucursal, Sucursal, Variante
+
+_SUCURSALES_A_RECALCULAR = "inventario_sucursales_recalcular"
+_MOTIVO = "inventario_motivo"
+_MOVIMIENTOS = "inventario_movimientos"
+MOTIVO_POR_DEFECTO = "otro"
+
+# Totales esperados según stock_sucursal; `:ids` NULL = todas las variantes
+_ESPERADO = """
+    SELECT v.id,
+           v.stock_total,
+           v.stock_central,
+           COALESCE(SUM(ss.cantidad) FILTER (WHERE s.activa), 0)::int AS total_esperado,
+           COALESCE(SUM(ss.cantidad) FILTER (WHERE s.activa AND s.es_central), 0)::int AS central_esperado
+    FROM variantes v
+    LEFT JOIN stock_sucursal ss ON ss.variante_id = v.id
+    LEFT JOIN sucursales s ON s.id = ss.sucursal_id
+    WHERE CAST(:ids AS INTEGER[]) IS NULL OR v.id = ANY(CAST(:ids AS INTEGER[]))
+    GROUP BY v.id
+"""
+
+SQL_REPARAR = f"""
+    WITH esperado AS ({_ESPERADO})
+    UPDATE variantes v
+    SET stock_total = e.total_esperado, stock_central = e.central_esperado
+    FROM esperado e
+    WHERE v.id = e.id
+      AND (v.stock_total, v.stock_central) IS DISTINCT FROM (e.total_esperado, e.central_esperado)
+"""
+
+
+def verificar_totales(db: Session, variante_ids: Optional[Iterable[int]] = None) -> List[dict]:
+    """Variantes cuyo total mantenido no coincide con stock_sucursal."""
+    ids = list(variante_ids) if variante_ids is not None else None
+    filas = db.execute(
+        text(f"SELECT * FROM ({_ESPERADO}) e "
+             "WHERE (stock_total, stock_central) IS DISTINCT FROM (total_esperado, central_esperado) "
+             "ORDER BY id"),
+        {"ids": ids},
+    ).mappings().all()
+    return [dict(f) for f in filas]
+
+
+def reparar_totales(db: Session, variante_ids: Optional[Iterable[int]] = None) -> int:
+    """Recalcula los totales desde stock_sucursal. Devuelve cuántas variantes corrigió."""
+    ids = list(variante_ids) if variante_ids is not None else None
+    corregidas = db.execute(text(SQL_REPARAR), {"ids": ids}).rowcount
+    _expirar_variantes(db, ids)
+    return corregidas
+
+
+def _expirar_variantes(db: Session, ids: Optional[List[int]]):
+    buscados = set(ids) if ids is not None else None
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, Variante) and (buscados is None or obj.id in buscados):
+            db.expire(obj, ["stock_total", "stock_central"])
+
+
+def sumar_a_totales(db: Session, deltas: Dict[tuple, int]):
+    """
+    Aplica {(variante_id, sucursal_id): delta} a los totales de cada variante
+    con un UPDATE incremental (`stock_total = stock_total + Δ`).  Sumar en vez
+    de recalcular desde stock_sucursal hace que dos transacciones que tocan
+    la misma variante en sucursales distintas no se pisen el total.
+    """
+    conexion = db.connection()
+    banderas = {
+        sid: (activa, es_central)
+        for sid, activa, es_central in conexion.execute(
+            text("SELECT id, activa, es_central FROM sucursales WHERE id = ANY(:ids)"),
+            {"ids": sorted({sid for _, sid in deltas})},
+        )
+    }
+    por_variante: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+    for (variante_id, sucursal_id), delta in deltas.items():
+        activa, es_central = banderas.get(sucursal_id, (False, False))
+        if activa:
+            por_variante[variante_id][0] += delta
+            if es_central:
+                por_variante[variante_id][1] += delta
+
+    por_variante = {vid: d for vid, d in por_variante.items() if d[0] or d[1]}
+    if not por_variante:
+        return
+    ids = sorted(por_variante)
+    conexion.execute(
+        text("""
+            UPDATE variantes v
+            SET stock_total = v.stock_total + d.total, stock_central = v.stock_central + d.central
+            FROM unnest(CAST(:ids AS INTEGER[]), CAST(:totales AS INTEGER[]), CAST(:centrales AS INTEGER[]))
+                 AS d(id, total, central)
+            WHERE v.id = d.id
+        """),
+        {
+            "ids": ids,
+            "totales": [por_variante[i][0] for i in ids],
+            "centrales": [por_variante[i][1] for i in ids],
+        },
+    )
+    _expirar_variantes(db, ids)
+
+
+# ─── Libro de movimientos ────────────────────────────────────────────────────
+
+def declarar_motivo(db: Session, motivo: str, referencia=None):
+    """
+    Declara el motivo de los cambios de stock que siguen.  `referencia` es
+    un id o un objeto ORM (su id se toma al flushear, así sirve aunque
+    todavía no esté insertado).  Lo pendiente bajo el motivo anterior se
+    flushea antes de cambiarlo.
+    """
+    if _MOTIVO in db.info:
+        db.flush()
+    db.info[_MOTIVO] = (motivo, referencia)
+
+
+def registrar_movimientos(
+    db: Session,
+    variante_ids: List[int],
+    sucursal_ids: List[int],
+    deltas: List[int],
+    motivo: str,
+    referencia_id: Optional[int] = None,
+    referencia_ids: Optional[List[int]] = None,
+):
+    """
+    Asienta movimientos en un solo INSERT (para los caminos que no pasan por
+    el ORM).  `referencia_ids`, si viene, da una referencia por fila.
+    """
+    if not deltas:
+        return
+    db.execute(
+        text("""
+            INSERT INTO movimientos_stock (variante_id, sucursal_id, delta, motivo, referencia_id, fecha)
+            SELECT d.variante_id, d.sucursal_id, d.delta, :motivo, d.referencia_id, clock_timestamp()
+            FROM unnest(CAST(:variantes AS INTEGER[]), CAST(:sucursales AS INTEGER[]),
+                        CAST(:deltas AS INTEGER[]), CAST(:referencias AS INTEGER[]))
+                 AS d(variante_id, sucursal_id, delta, referencia_id)
+            WHERE d.delta <> 0
+        """),
+        {
+            "variantes": list(variante_ids), "sucursales": list(sucursal_ids), "deltas": list(deltas),
+            "referencias": list(referencia_ids) if referencia_ids is not None else [referencia_id] * len(deltas),
+            "motivo": motivo,
+        },
+    )
+
+
+def mover_stock(
+    db: Session,
+    deltas: Dict[tuple, int],
+    motivo: str,
+    referencia_id: Optional[int] = None,
+    referencias: Optional[Dict[tuple, int]] = None,
+):
+    """
+    Aplica {(variante_id, sucursal_id): delta} a stock_sucursal con un único
+    upsert (crea las filas que falten), asienta el libro y suma los deltas a
+    los totales de las variantes tocadas.  Es el camino en bloque para compras y
+    transferencias; el lock de las filas de origen, si hace falta validar
+    disponibilidad, lo toma quien llama.
+    """
+    claves = sorted(k for k, d in deltas.items() if d)
+    if not claves:
+        return
+    variante_ids = [v for v, _ in claves]
+    sucursal_ids = [s for _, s in claves]
+    cantidades = [deltas[k] for k in claves]
+    db.execute(
+        text("""
+            INSERT INTO stock_sucursal (variante_id, sucursal_id, cantidad)
+            SELECT * FROM unnest(CAST(:variantes AS INTEGER[]), CAST(:sucursales AS INTEGER[]), CAST(:cantidades AS INTEGER[]))
+            ON CONFLICT (variante_id, sucursal_id)
+            DO UPDATE SET cantidad = stock_sucursal.cantidad + EXCLUDED.cantidad
+        """),
+        {"variantes": variante_ids, "sucursales": sucursal_ids, "cantidades": cantidades},
+    )
+    registrar_movimientos(
+        db, variante_ids, sucursal_ids, cantidades, motivo, referencia_id,
+        referencia_ids=[referencias.get(k) for k in claves] if referencias is not None else None,
+    )
+    # El upsert no pasa por el ORM: totales por variante y objetos en sesión se refrescan
+    sumar_a_totales(db, {k: deltas[k] for k in claves})
+    for obj in list(db.identity_map.values()):
+        if isinstance(obj, StockSucursal):
+            db.expire(obj)
+
+
+def movimientos(
+    db: Session,
+    variante_id: Optional[int] = None,
+    sucursal_id: Optional[int] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    limite: int = 100,
+    offset: int = 0,
+) -> List[dict]:
+    filtros, params = [], {"limite": limite, "offset": offset}
+    for columna, valor, operador in (
+        ("variante_id", variante_id, "="), ("sucursal_id", sucursal_id, "="),
+        ("fecha", desde, ">="), ("fecha", hasta, "<="),
+    ):
+        if valor is not None:
+            nombre = f"p{len(filtros)}"
+            filtros.append(f"{columna} {operador} :{nombre}")
+            params[nombre] = valor
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    filas = db.execute(
+        text(f"""
+            SELECT id, variante_id, sucursal_id, delta, motivo, referencia_id, fecha
+            FROM movimientos_stock {where}
+            ORDER BY fecha DESC, id DESC
+            LIMIT :limite OFFSET :offset
+        """),
+        params,
+    ).mappings().all()
+    return [dict(f) for f in filas]
+
+
+def tomar_snapshot(db: Session) -> datetime:
+    """
+    Guarda una foto de stock_sucursal.  El lock SHARE espera a que terminen
+    las transacciones que están escribiendo stock y frena las nuevas hasta
+    el commit, así ningún movimiento queda a la vez fuera de la foto y antes
+    de su fecha.
+    """
+    db.execute(text("LOCK TABLE stock_sucursal IN SHARE MODE"))
+    snapshot_id, fecha = db.execute(
+        text("INSERT INTO snapshots_stock (fecha, filas) VALUES (clock_timestamp(), 0) RETURNING id, fecha")
+    ).one()
+    filas = db.execute(
+        text("""
+            INSERT INTO snapshot_stock_items (snapshot_id, variante_id, sucursal_id, cantidad)
+            SELECT :id, variante_id, sucursal_id, cantidad FROM stock_sucursal WHERE cantidad <> 0
+        """),
+        {"id": snapshot_id},
+    ).rowcount
+    db.execute(text("UPDATE snapshots_stock SET filas = :filas WHERE id = :id"), {"filas": filas, "id": snapshot_id})
+    return fecha
+
+
+def inicio_historial(db: Session) -> Optional[datetime]:
+    """Fecha de la primera foto: antes de eso el libro no alcanza para reconstruir."""
+    return db.execute(text("SELECT MIN(fecha) FROM snapshots_stock")).scalar()
+
+
+def cubre(db: Session, fecha: datetime) -> bool:
+    """Si hay una foto anterior o igual a `fecha` (comparado en SQL: `fecha` puede venir sin zona)."""
+    return db.execute(
+        text("SELECT EXISTS (SELECT 1 FROM snapshots_stock WHERE fecha <= :fecha)"), {"fecha": fecha}
+    ).scalar()
+
+
+# Stock por (variante, sucursal) a :fecha = última foto <= :fecha + movimientos posteriores hasta :fecha
+SQL_STOCK_A_FECHA = """
+    WITH base AS (
+        SELECT id, fecha FROM snapshots_stock WHERE fecha <= :fecha ORDER BY fecha DESC LIMIT 1
+    )
+    SELECT variante_id, sucursal_id, SUM(cantidad) AS cantidad
+    FROM (
+        SELECT i.variante_id, i.sucursal_id, i.cantidad
+        FROM snapshot_stock_items i JOIN base ON i.snapshot_id = base.id
+        UNION ALL
+        SELECT m.variante_id, m.sucursal_id, m.delta
+        FROM movimientos_stock m JOIN base ON m.fecha > base.fecha
+        WHERE m.fecha <= :fecha
+    ) movimientos
+    GROUP BY variante_id, sucursal_id
+"""
+
+
+def stock_a_fecha(
+    db: Session,
+    fecha: datetime,
+    sucursal_id: Optional[int] = None,
+    variante_ids: Optional[Iterable[int]] = None,
+) -> List[dict]:
+    """Stock por variante y sucursal a `fecha`. ValueError si es anterior a la primera foto."""
+    if not cubre(db, fecha):
+        inicio = inicio_historial(db)
+        raise ValueError(f"No hay historial de stock anterior a {inicio.isoformat() if inicio else 'hoy'}")
+    ids = list(variante_ids) if variante_ids is not None else None
+    filas = db.execute(
+        text(f"""
+            SELECT * FROM ({SQL_STOCK_A_FECHA}) s
+            WHERE cantidad <> 0
+              AND (CAST(:sucursal_id AS INTEGER) IS NULL OR sucursal_id = :sucursal_id)
+              AND (CAST(:ids AS INTEGER[]) IS NULL OR variante_id = ANY(CAST(:ids AS INTEGER[])))
+            ORDER BY variante_id, sucursal_id
+        """),
+        {"fecha": fecha, "sucursal_id": sucursal_id, "ids": ids},
+    ).mappings().all()
+    return [dict(f, cantidad=int(f["cantidad"])) for f in filas]
+
+
+# ─── Mantenimiento incremental ───────────────────────────────────────────────
+
+def _valor(historia, actual: bool) -> int:
+    if actual:
+        valores = historia.added or historia.unchanged
+    else:
+        valores = historia.deleted or historia.unchanged
+    return (valores[0] if valores else None) or 0
+
+
+def _deltas_pendientes(session: Session) -> Dict[tuple, int]:
+    """{(variante_id, sucursal_id): delta} de las filas de stock_sucursal a flushear."""
+    deltas: Dict[tuple, int] = defaultdict(int)
+    for obj in session.new:
+        if isinstance(obj, StockSucursal):
+            deltas[(obj.variante_id, obj.sucursal_id)] += obj.cantidad or 0
+    for obj in session.dirty:
+        if isinstance(obj, StockSucursal):
+            historia = inspect(obj).attrs.cantidad.history
+            if historia.has_changes():
+                deltas[(obj.variante_id, obj.sucursal_id)] += _valor(historia, True) - _valor(historia, False)
+    for obj in session.deleted:
+        if isinstance(obj, StockSucursal):
+            deltas[(obj.variante_id, obj.sucursal_id)] -= _valor(inspect(obj).attrs.cantidad.history, False)
+    return {k: d for k, d in deltas.items() if d and k[0] is not None}
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _aplicar_deltas(session: Session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, Sucursal) and obj.id is not None:
+            estado = inspect(obj)
+            if estado.attrs.activa.history.has_changes() or estado.attrs.es_central.history.has_changes():
+                session.info.setdefault(_SUCURSALES_A_RECALCULAR, set()).add(obj.id)
+
+    deltas = _deltas_pendientes(session)
+    if not deltas:
+        return
+    # El asiento va en after_flush: recién ahí el UPDATE de stock_sucursal tomó sus locks
+    nombre, referencia = session.info.get(_MOTIVO, (MOTIVO_POR_DEFECTO, None))
+    # Si la referencia es un objeto sin insertar, su id se resuelve después del flush
+    referencia = getattr(referencia, "id", referencia) or referencia
+    session.info.setdefault(_MOVIMIENTOS, []).append((deltas, nombre, referencia))
+
+    sumar_a_totales(session, deltas)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _asentar_movimientos(session: Session, flush_context):
+    for deltas, nombre, referencia in session.info.pop(_MOVIMIENTOS, []):
+        referencia_id = getattr(referencia, "id", referencia)
+        claves = list(deltas)
+        registrar_movimientos(
+            session,
+            [v for v, _ in claves], [s for _, s in claves], [deltas[k] for k in claves],
+            nombre, referencia_id,
+        )
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _recalcular_por_sucursal(session: Session, flush_context):
+    sucursales = session.info.pop(_SUCURSALES_A_RECALCULAR, None)
+    if not sucursales:
+        return
+    ids = session.connection().execute(
+        text("SELECT DISTINCT variante_id FROM stock_sucursal WHERE sucursal_id = ANY(:ids)"),
+        {"ids": sorted(sucursales)},
+    ).scalars().all()
+    if ids:
+        reparar_totales(session, ids)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _olvidar_motivo(session: Session):
+    session.info.pop(_MOTIVO, None)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar(session: Session):
+    for clave in (_SUCURSALES_A_RECALCULAR, _MOVIMIENTOS, _MOTIVO):
+        session.info.pop(clave, None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chequeo / reparación de totales de stock y fotos del libro.")
+    parser.add_argument("accion", choices=["verificar", "reparar", "snapshot"])
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.accion == "verificar":
+            diferencias = verificar_totales(db)
+            for d in diferencias[:50]:
+                print(
+                    f"variante {d['id']}: total {d['stock_total']} (esperado {d['total_esperado']}), "
+                    f"central {d['stock_central']} (esperado {d['central_esperado']})"
+                )
+            print(f"{len(diferencias)} variantes con diferencias")
+            return 1 if diferencias else 0
+        if args.accion == "snapshot":
+            fecha = tomar_snapshot(db)
+            db.commit()
+            print(f"Foto de stock tomada a {fecha.isoformat()}")
+            return 0
+        corregidas = reparar_totales(db)
+        db.commit()
+        print(f"{corregidas} variantes corregidas")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,283 @@
+"""
+Servicio de métricas — exposición en formato Prometheus (text 0.0.4).
+
+Responsabilidades:
+  • Registrar latencia y requests en curso por ruta (middleware ASGI).
+  • Exponer el estado del pool de SQLAlchemy (checked-out / overflow).
+  • Contar llamadas, latencia y tokens de Anthropic (facturas / sugerencias).
+  • Contadores de negocio (ventas creadas, movimientos de stock).
+
+Para no serializar los requests detrás de un lock, cada hilo escribe en su
+propio "shard" (dict local al hilo).  El lock solo se toma la primera vez
+que un hilo registra algo; el scrape suma todos los shards.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_IA = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# REGISTRO — shards por hilo
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Shard:
+    __slots__ = ("valores",)
+
+    def __init__(self):
+        # (métrica, labels) → float  |  (métrica, labels) → [buckets..., suma, cantidad]
+        self.valores: dict = {}
+
+
+class _Registro:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._lock = threading.Lock()
+        self._metricas: List["_Metrica"] = []
+
+    def shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def agregar(self, metrica: "_Metrica"):
+        self._metricas.append(metrica)
+
+    def valores(self, metrica: "_Metrica") -> dict:
+        """Suma los valores de todos los shards para una métrica."""
+        total: dict = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for (nombre, labels), valor in list(shard.valores.items()):
+                if nombre != metrica.nombre:
+                    continue
+                if isinstance(valor, list):
+                    acumulado = total.setdefault(labels, [0.0] * len(valor))
+                    for i, v in enumerate(valor):
+                        acumulado[i] += v
+                else:
+                    total[labels] = total.get(labels, 0.0) + valor
+        return total
+
+    def exponer(self) -> str:
+        lineas: List[str] = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+_registro = _Registro()
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_labels(nombres: Tuple[str, ...], valores: Tuple[str, ...], extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _formatear_numero(valor: float) -> str:
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# TIPOS DE MÉTRICA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, labels: Tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.labels = tuple(labels)
+        _registro.agregar(self)
+
+    def _encabezado(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+    def exponer(self) -> List[str]:
+        lineas = self._encabezado()
+        for labels, valor in sorted(_registro.valores(self).items()):
+            lineas.append(f"{self.nombre}{_formatear_labels(self.labels, labels)} {_formatear_numero(valor)}")
+        return lineas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, *labels: str, valor: float = 1.0):
+        valores = _registro.shard().valores
+        clave = (self.nombre, labels)
+        valores[clave] = valores.get(clave, 0.0) + valor
+
+
+class Gauge(Contador):
+    """Gauge sumable por shards: cada hilo aporta sus inc/dec."""
+    tipo = "gauge"
+
+    def dec(self, *labels: str, valor: float = 1.0):
+        self.inc(*labels, valor=-valor)
+
+
+class GaugeCallback(_Metrica):
+    """
+    Gauge cuyo valor se calcula en el momento del scrape.  Con `labels`,
+    `funcion` devuelve {(valores de labels): valor}.
+    """
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, funcion: Callable[[], float], labels: Tuple[str, ...] = ()):
+        super().__init__(nombre, ayuda, labels)
+        self.funcion = funcion
+
+    def exponer(self) -> List[str]:
+        try:
+            valores = self.funcion() if self.labels else {(): self.funcion()}
+            valores = {labels: float(valor) for labels, valor in valores.items()}
+        except Exception:
+            return []
+        return self._encabezado() + [
+            f"{self.nombre}{_formatear_labels(self.labels, labels)} {_formatear_numero(valor)}"
+            for labels, valor in sorted(valores.items())
+        ]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, labels: Tuple[str, ...] = (), buckets=BUCKETS_HTTP):
+        super().__init__(nombre, ayuda, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, valor: float, *labels: str):
+        valores = _registro.shard().valores
+        clave = (self.nombre, labels)
+        fila = valores.get(clave)
+        if fila is None:
+            # un casillero por bucket + "+Inf", luego suma y cantidad
+            fila = valores[clave] = [0.0] * (len(self.buckets) + 3)
+        fila[bisect_left(self.buckets, valor)] += 1
+        fila[-2] += valor
+        fila[-1] += 1
+
+    def exponer(self) -> List[str]:
+        lineas = self._encabezado()
+        for labels, fila in sorted(_registro.valores(self).items()):
+            acumulado = 0.0
+            for limite, cantidad in zip(self.buckets + (float("inf"),), fila):
+                acumulado += cantidad
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                etiquetas = _formatear_labels(self.labels, labels, 'le="%s"' % le)
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {_formatear_numero(acumulado)}")
+            lineas.append(f"{self.nombre}_sum{_formatear_labels(self.labels, labels)} {_formatear_numero(fila[-2])}")
+            lineas.append(f"{self.nombre}_count{_formatear_labels(self.labels, labels)} {_formatear_numero(fila[-1])}")
+        return lineas
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MÉTRICAS DE LA APP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+HTTP_DURACION = Histograma(
+    "http_request_duration_seconds", "Latencia de requests HTTP por ruta.",
+    ("method", "route", "status"),
+)
+HTTP_EN_CURSO = Gauge(
+    "http_requests_in_flight", "Requests HTTP en curso.", ("method",),
+)
+IA_DURACION = Histograma(
+    "anthropic_request_duration_seconds", "Latencia de llamadas a Anthropic.",
+    ("servicio", "resultado"), buckets=BUCKETS_IA,
+)
+IA_TOKENS = Contador(
+    "anthropic_tokens_total", "Tokens consumidos en Anthropic.", ("servicio", "tipo"),
+)
+VENTAS_CREADAS = Contador(
+    "ventas_creadas_total", "Ventas registradas.", ("estado",),
+)
+MOVIMIENTOS_STOCK = Contador(
+    "movimientos_stock_total", "Movimientos de stock aplicados.", ("motivo",),
+)
+
+
+def registrar_pool(engines: Dict[str, object]):
+    """
+    Expone el estado del QueuePool de cada engine, con label `pool`
+    (`{"primario": engine, "replica": read_engine}`; se lee en cada scrape).
+    """
+    def por_pool(medida: str):
+        return lambda: {(nombre,): getattr(e.pool, medida)() for nombre, e in engines.items()}
+
+    GaugeCallback("db_pool_size", "Tamaño configurado del pool.", por_pool("size"), ("pool",))
+    GaugeCallback("db_pool_checked_out", "Conexiones en uso.", por_pool("checkedout"), ("pool",))
+    GaugeCallback("db_pool_checked_in", "Conexiones libres en el pool.", por_pool("checkedin"), ("pool",))
+    GaugeCallback("db_pool_overflow", "Conexiones de overflow abiertas (negativo = capacidad libre).",
+                  por_pool("overflow"), ("pool",))
+
+
+def observar_ia(servicio: str, inicio: float, message=None, resultado: str = "ok"):
+    """Registra una llamada a Anthropic: latencia desde `inicio` y tokens del `message`."""
+    IA_DURACION.observe(time.perf_counter() - inicio, servicio, resultado)
+    usage = getattr(message, "usage", None)
+    if usage is not None:
+        IA_TOKENS.inc(servicio, "entrada", valor=float(getattr(usage, "input_tokens", 0) or 0))
+        IA_TOKENS.inc(servicio, "salida", valor=float(getattr(usage, "output_tokens", 0) or 0))
+
+
+def exponer() -> str:
+    return _registro.exponer()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MIDDLEWARE ASGI
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class MetricasMiddleware:
+    """
+    Middleware ASGI puro (sin BaseHTTPMiddleware) que mide cada request.
+    La ruta se toma del template de FastAPI (`/ventas/{venta_id}`) para no
+    generar una serie por id; lo que no matchea ninguna ruta va como "sin_ruta".
+    """
+
+    def __init__(self, app, excluir: Optional[Tuple[str, ...]] = ("/metrics",)):
+        self.app = app
+        self.excluir = set(excluir or ())
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.excluir:
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope.get("method", "GET")
+        estado = 500
+        inicio = time.perf_counter()
+
+        async def send_con_estado(message):
+            nonlocal estado
+            if message["type"] == "http.response.start":
+                estado = message["status"]
+            await send(message)
+
+        HTTP_EN_CURSO.inc(metodo)
+        try:
+            await self.app(scope, receive, send_con_estado)
+        finally:
+            HTTP_EN_CURSO.dec(metodo)
+            route = scope.get("route")
+            ruta = getattr(route, "path", None) or "sin_ruta"
+            HTTP_DURACION.observe(time.perf_counter() - inicio, metodo, ruta, str(estado))
@@ -0,0 +1,188 @@
+"""
+Historial de precios como serie temporal.
+
+`precio_historial` guarda un registro por cambio de costo o precio_venta
+(valor anterior → nuevo).  Todas las lecturas van por variante y campo
+sobre el índice `(variante_id, campo, fecha)`:
+
+- `serie`: tramo paginado de cambios entre dos fechas;
+- `serie_agrupada`: último valor por día / semana / mes, con mínimo,
+  máximo y cantidad de cambios del período;
+- `a_fecha`: valor vigente a una fecha — el `valor_nuevo` del último cambio
+  anterior o, si no hubo, el `valor_anterior` del primero posterior, o el
+  valor actual de la variante.
+
+Compactación: los cambios de un período anteriores a un corte se reemplazan
+por una sola fila con el anterior del primero, el nuevo del último, la
+fecha del último, `desde` = fecha del primero, `cambios`, y el mínimo y
+máximo que tomó el valor.  Los valores en los bordes de cada período
+quedan exactos, así que `a_fecha` sigue siendo exacto fuera del intervalo
+compactado; dentro de él devuelve el valor con que abrió el período.  Es
+idempotente: volver a compactar junta la fila resumen con los cambios
+nuevos del mismo período.
+
+    python -m app.services.precios compactar --meses 6 --periodo semana
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+
+# Períodos válidos → unidad de date_trunc
+PERIODOS = {"dia": "day", "semana": "week", "mes": "month"}
+CAMPOS = ("costo", "precio_venta")
+
+_MINIMO = "COALESCE(valor_minimo, LEAST(valor_anterior, valor_nuevo))"
+_MAXIMO = "COALESCE(valor_maximo, GREATEST(valor_anterior, valor_nuevo))"
+
+
+def valor_a_fecha(variante: str, campo: str, fecha: str, actual: str) -> str:
+    """Expresión SQL del valor vigente de `campo` a `fecha` (correlacionada por `variante`)."""
+    return f"""COALESCE(
+        (SELECT h.valor_nuevo FROM precio_historial h
+         WHERE h.variante_id = {variante} AND h.campo = {campo} AND h.fecha <= {fecha}
+         ORDER BY h.fecha DESC, h.id DESC LIMIT 1),
+        (SELECT h.valor_anterior FROM precio_historial h
+         WHERE h.variante_id = {variante} AND h.campo = {campo} AND h.fecha > {fecha}
+         ORDER BY h.fecha, h.id LIMIT 1),
+        {actual})"""
+
+
+def serie(db: Session, variante_id: int, campo: Optional[str] = None,
+          desde: Optional[datetime] = None, hasta: Optional[datetime] = None,
+          limite: int = 500, offset: int = 0) -> List[dict]:
+    """Cambios de la variante, del más reciente al más viejo."""
+    return [dict(f) for f in db.execute(
+        text("""
+            SELECT id, campo, valor_anterior, valor_nuevo, fecha, cambios, desde
+            FROM precio_historial
+            WHERE variante_id = :variante_id
+              AND (CAST(:campo AS VARCHAR) IS NULL OR campo = :campo)
+              AND (CAST(:desde AS TIMESTAMPTZ) IS NULL OR fecha >= :desde)
+              AND (CAST(:hasta AS TIMESTAMPTZ) IS NULL OR fecha < :hasta)
+            ORDER BY fecha DESC, id DESC
+            LIMIT :limite OFFSET :offset
+        """),
+        {"variante_id": variante_id, "campo": campo, "desde": desde, "hasta": hasta,
+         "limite": limite, "offset": offset},
+    ).mappings()]
+
+
+def serie_agrupada(db: Session, variante_id: int, campo: str, periodo: str,
+                   desde: Optional[datetime] = None, hasta: Optional[datetime] = None) -> List[dict]:
+    """Último valor por período (día / semana / mes), del más viejo al más reciente."""
+    return [dict(f) for f in db.execute(
+        text(f"""
+            SELECT date_trunc(:unidad, fecha) AS periodo,
+                   (array_agg(valor_nuevo ORDER BY fecha DESC, id DESC))[1] AS valor,
+                   MIN({_MINIMO}) AS minimo,
+                   MAX({_MAXIMO}) AS maximo,
+                   SUM(cambios) AS cambios
+            FROM precio_historial
+            WHERE variante_id = :variante_id AND campo = :campo
+              AND (CAST(:desde AS TIMESTAMPTZ) IS NULL OR fecha >= :desde)
+              AND (CAST(:hasta AS TIMESTAMPTZ) IS NULL OR fecha < :hasta)
+            GROUP BY 1
+            ORDER BY 1
+        """),
+        {"unidad": PERIODOS[periodo], "variante_id": variante_id, "campo": campo,
+         "desde": desde, "hasta": hasta},
+    ).mappings()]
+
+
+def a_fecha(db: Session, variante_ids: Iterable[int], fecha: datetime, campo: str) -> Dict[int, Decimal]:
+    """{variante_id: valor de `campo` vigente a `fecha`} (un lookup por índice por variante)."""
+    actual = "v.costo" if campo == "costo" else "v.precio_venta"
+    filas = db.execute(
+        text(f"""
+            SELECT v.id, {valor_a_fecha("v.id", ":campo", ":fecha", actual)} AS valor
+            FROM variantes v
+            WHERE v.id = ANY(:ids)
+        """),
+        {"ids": list(variante_ids), "fecha": fecha, "campo": campo},
+    ).all()
+    return {vid: valor for vid, valor in filas}
+
+
+def completar_costos_ventas(db: Session) -> int:
+    """
+    Ítems de venta sin `costo_unitario` (anteriores a que se guardara) toman
+    el costo vigente a la fecha de la venta.  No hace commit.
+    """
+    return db.execute(text(f"""
+        UPDATE venta_items vi
+        SET costo_unitario = {valor_a_fecha("vi.variante_id", "'costo'", "ve.fecha", "va.costo")}
+        FROM ventas ve, variantes va
+        WHERE ve.id = vi.venta_id AND va.id = vi.variante_id AND vi.costo_unitario IS NULL
+    """)).rowcount
+
+
+def compactar(db: Session, antes_de: datetime, periodo: str = "semana") -> Tuple[int, int]:
+    """
+    Resume en una fila por (variante, campo, período) los cambios anteriores
+    a `antes_de`.  Devuelve (filas borradas, filas resumen).  No hace commit.
+    """
+    filas = db.execute(
+        text(f"""
+            WITH grupos AS (
+                SELECT variante_id, campo, date_trunc(:unidad, fecha) AS periodo
+                FROM precio_historial
+                WHERE fecha < :antes
+                GROUP BY 1, 2, 3
+                HAVING COUNT(*) > 1
+            ),
+            borradas AS (
+                DELETE FROM precio_historial h
+                USING grupos g
+                WHERE h.variante_id = g.variante_id AND h.campo = g.campo
+                  AND h.fecha < :antes AND date_trunc(:unidad, h.fecha) = g.periodo
+                RETURNING h.*, g.periodo
+            ),
+            resumen AS (
+                INSERT INTO precio_historial
+                    (variante_id, campo, valor_anterior, valor_nuevo, fecha, desde, cambios, valor_minimo, valor_maximo)
+                SELECT variante_id, campo,
+                       (array_agg(valor_anterior ORDER BY fecha, id))[1],
+                       (array_agg(valor_nuevo ORDER BY fecha DESC, id DESC))[1],
+                       MAX(fecha),
+                       MIN(COALESCE(desde, fecha)),
+                       SUM(cambios),
+                       MIN({_MINIMO}),
+                       MAX({_MAXIMO})
+                FROM borradas
+                GROUP BY variante_id, campo, periodo
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM borradas), (SELECT COUNT(*) FROM resumen)
+        """),
+        {"unidad": PERIODOS[periodo], "antes": antes_de},
+    ).one()
+    return int(filas[0]), int(filas[1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compactación del historial de precios.")
+    parser.add_argument("accion", choices=["compactar"])
+    parser.add_argument("--meses", type=int, default=6, help="Compactar cambios más viejos que N meses")
+    parser.add_argument("--periodo", choices=list(PERIODOS), default="semana")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        antes_de = datetime.now(timezone.utc) - timedelta(days=30 * args.meses)
+        borradas, resumen = compactar(db, antes_de, args.periodo)
+        db.commit()
+        print(f"{borradas} cambios anteriores a {antes_de.date().isoformat()} resumidos en {resumen} filas")
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+"""
+Ranking de ventas en una sola consulta.
+
+Agrupa los items de ventas confirmadas de un rango de fechas por las
+dimensiones pedidas (variante, producto, marca, categoría, sucursal) y suma
+unidades, ingreso y costo.  El costo sale de `VentaItem.costo_unitario`
+(congelado al momento de la venta); los items viejos sin ese dato usan el
+costo actual de la variante, igual que `_calcular_ganancia_bruta`.
+
+Lo usan `/finanzas/productos-top`, `/finanzas/ranking-ventas`, el export CSV
+y el dashboard de sucursal.
+"""
+
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import Producto, Sucursal, Variante, Venta, VentaItem
+
+# dimensión → (columnas de salida, columnas de GROUP BY)
+DIMENSIONES = {
+    "variante": (
+        (Variante.id.label("variante_id"), Producto.nombre.label("nombre_producto"), Producto.marca.label("marca"),
+         Variante.sabor.label("sabor"), Variante.tamanio.label("tamanio")),
+        (Variante.id, Producto.id),
+    ),
+    "producto": (
+        (Producto.id.label("producto_id"), Producto.nombre.label("nombre_producto"), Producto.marca.label("marca")),
+        (Producto.id,),
+    ),
+    "marca": ((Producto.marca.label("marca"),), (Producto.marca,)),
+    "categoria": ((Producto.categoria.label("categoria"),), (Producto.categoria,)),
+    "sucursal": (
+        (Sucursal.id.label("sucursal_id"), Sucursal.nombre.label("sucursal_nombre")),
+        (Sucursal.id,),
+    ),
+}
+
+
+def rango_mes(mes: int, anio: int) -> Tuple[datetime, datetime]:
+    """[primer instante del mes, primer instante del mes siguiente)."""
+    inicio = datetime(anio, mes, 1)
+    fin = datetime(anio + 1, 1, 1) if mes == 12 else datetime(anio, mes + 1, 1)
+    return inicio, fin
+
+
+def rango_fechas(desde: date, hasta: date) -> Tuple[datetime, datetime]:
+    """Rango cerrado de días [desde, hasta] como intervalo semiabierto de instantes."""
+    return datetime.combine(desde, time.min), datetime.combine(hasta + timedelta(days=1), time.min)
+
+
+def ranking(
+    db: Session,
+    inicio: datetime,
+    fin: datetime,
+    dimensiones: Iterable[str] = ("variante",),
+    sucursal_id: Optional[int] = None,
+    limite: Optional[int] = None,
+    orden: str = "ingreso",
+) -> List[dict]:
+    """Filas ordenadas por ingreso o unidades (mayor primero), con ganancia y margen calculados."""
+    columnas, grupo, vistas = [], [], set()
+    for d in dict.fromkeys(dimensiones):
+        salida, agrupado = DIMENSIONES[d]
+        for col in salida:
+            if col.key not in vistas:
+                vistas.add(col.key)
+                columnas.append(col)
+        grupo.extend(agrupado)
+
+    ingreso = func.sum(VentaItem.subtotal)
+    unidades = func.sum(VentaItem.cantidad)
+    costo = func.sum(VentaItem.cantidad * func.coalesce(VentaItem.costo_unitario, Variante.costo))
+    query = (
+        select(
+            *columnas,
+            unidades.label("cantidad_vendida"),
+            ingreso.label("ingreso_total"),
+            costo.label("costo_total"),
+        )
+        .select_from(VentaItem)
+        .join(Venta, Venta.id == VentaItem.venta_id)
+        .join(Variante, Variante.id == VentaItem.variante_id)
+        .join(Producto, Producto.id == Variante.producto_id)
+        .join(Sucursal, Sucursal.id == Venta.sucursal_id)
+        .where(Venta.estado == "confirmada", Venta.fecha >= inicio, Venta.fecha < fin)
+        .group_by(*grupo)
+        .order_by((unidades if orden == "unidades" else ingreso).desc())
+    )
+    if sucursal_id:
+        query = query.where(Venta.sucursal_id == sucursal_id)
+    if limite:
+        query = query.limit(limite)
+
+    resultado = []
+    for fila in db.execute(query).mappings():
+        datos = dict(fila)
+        ingreso_total = datos["ingreso_total"] or Decimal("0")
+        ganancia = ingreso_total - (datos["costo_total"] or Decimal("0"))
+        datos["ganancia"] = ganancia
+        datos["margen_porcentaje"] = round(float(ganancia / ingreso_total * 100), 2) if ingreso_total > 0 else 0.0
+        resultado.append(datos)
+    return resultado
@@ -0,0 +1,229 @@
+"""
+Plan de reposición de sucursales desde el depósito central.
+
+Por cada (variante, sucursal) activa:
+
+    velocidad = unidades vendidas en la ventana / días de la ventana
+    objetivo  = max(stock_minimo, ⌈velocidad × días de cobertura⌉)
+    necesidad = max(0, objetivo - stock actual)
+
+El central reparte su stock disponible: si alcanza para todas las
+sucursales, cada una recibe su necesidad; si no, el stock se reparte en
+proporción a la demanda (velocidad) de cada sucursal, sin pasarse de su
+necesidad (las variantes sin ventas en la ventana, que solo piden el piso
+de stock_minimo, reparten en proporción a la necesidad), y lo que sobra de las sucursales saturadas se vuelve a repartir
+entre las demás.  Todo se resuelve con matrices variantes × sucursales en
+numpy, sin loops por variante: 5k variantes × 20 sucursales es del orden de
+milisegundos (ver `benchmarks/reposicion.py`); el costo dominante son las
+tres consultas que cargan ventas, stock y variantes.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from app.models import ConfiguracionERP, TipoTransferenciaEnum, Transferencia
+from app.services.inventario import mover_stock
+
+_RONDAS_REDISTRIBUCION = 8
+
+
+# ─── Solver ──────────────────────────────────────────────────────────────────
+
+def asignar(necesidad: np.ndarray, demanda: np.ndarray, disponible: np.ndarray) -> np.ndarray:
+    """
+    Reparte `disponible` (V) entre sucursales según `necesidad` (V×S, enteros
+    >= 0) en proporción a `demanda` (V×S).  Devuelve la asignación entera
+    V×S, con asignado <= necesidad y suma por fila <= disponible.
+    """
+    necesidad = necesidad.astype(np.int64)
+    disponible = np.maximum(disponible.astype(np.int64), 0)
+    asignado = np.zeros_like(necesidad)
+
+    # Sin escasez: cada sucursal recibe lo que necesita
+    alcanza = necesidad.sum(axis=1) <= disponible
+    asignado[alcanza] = necesidad[alcanza]
+
+    escasas = np.flatnonzero(~alcanza)
+    if escasas.size == 0:
+        return asignado
+    nec = necesidad[escasas].astype(np.float64)
+    # Peso = demanda; las filas sin ventas (solo piso de stock_minimo) reparten según necesidad
+    peso = np.where(nec > 0, demanda[escasas], 0.0)
+    sin_demanda = peso.sum(axis=1) == 0
+    peso[sin_demanda] = nec[sin_demanda]
+
+    asig = np.zeros_like(nec)
+    resto = disponible[escasas].astype(np.float64)
+    for _ in range(_RONDAS_REDISTRIBUCION):
+        abiertas = asig < nec
+        peso_abierto = np.where(abiertas, peso, 0.0)
+        total = peso_abierto.sum(axis=1, keepdims=True)
+        cuota = np.divide(resto[:, None] * peso_abierto, total, out=np.zeros_like(nec), where=total > 0)
+        asig = np.minimum(nec, asig + cuota)
+        resto = disponible[escasas] - asig.sum(axis=1)
+        if not (resto > 1e-9).any():
+            break
+
+    # A enteros: piso y las unidades restantes a los mayores restos fraccionarios
+    entero = np.floor(asig + 1e-9)
+    sobrante = np.maximum(disponible[escasas] - entero.sum(axis=1), 0).astype(np.int64)
+    fraccion = np.where(entero < nec, asig - entero, -1.0)
+    rango = np.argsort(np.argsort(-fraccion, axis=1, kind="stable"), axis=1)
+    entero += (rango < sobrante[:, None]) & (fraccion >= 0)
+
+    asignado[escasas] = entero.astype(np.int64)
+    return asignado
+
+
+# ─── Carga y plan ────────────────────────────────────────────────────────────
+
+def planificar(
+    db: Session,
+    ventana_dias: Optional[int] = None,
+    dias_cobertura: Optional[int] = None,
+    sucursal_ids: Optional[Iterable[int]] = None,
+    bloquear: bool = False,
+) -> dict:
+    """
+    Arma el plan.  Con `bloquear` las filas de stock del central quedan
+    tomadas FOR UPDATE hasta el fin de la transacción, para ejecutar el plan
+    sobre las mismas cantidades con que se calculó.
+    """
+    config = db.get(ConfiguracionERP, 1)
+    ventana_dias = max(1, ventana_dias or (config.ventana_dias_analisis_ventas if config else 30))
+    if dias_cobertura is None:
+        dias_cobertura = (config.dias_demora_proveedor + config.dias_stock_seguridad) if config else 8
+
+    central_id = db.execute(text("SELECT id FROM sucursales WHERE es_central AND activa LIMIT 1")).scalar()
+    if central_id is None:
+        raise ValueError("Depósito central no configurado")
+    sucursales = db.execute(text("""
+        SELECT id FROM sucursales
+        WHERE activa AND NOT es_central
+          AND (CAST(:ids AS INTEGER[]) IS NULL OR id = ANY(CAST(:ids AS INTEGER[])))
+        ORDER BY id
+    """), {"ids": list(sucursal_ids) if sucursal_ids else None}).scalars().all()
+
+    variantes = db.execute(text("""
+        SELECT v.id, COALESCE(v.stock_minimo, 0)
+        FROM variantes v JOIN productos p ON p.id = v.producto_id
+        WHERE v.activa AND p.activo
+        ORDER BY v.id
+    """)).all()
+
+    plan = {
+        "central_id": central_id, "ventana_dias": ventana_dias, "dias_cobertura": dias_cobertura,
+        "lineas": [], "unidades": 0, "faltante": 0,
+    }
+    if not sucursales or not variantes:
+        return plan
+
+    ids_variante = np.fromiter((v for v, _ in variantes), dtype=np.int64, count=len(variantes))
+    minimos = np.fromiter((m for _, m in variantes), dtype=np.int64, count=len(variantes))
+    ids_sucursal = np.asarray(sucursales, dtype=np.int64)
+    V, S = len(ids_variante), len(ids_sucursal)
+
+    def indices(columnas_variante, columnas_sucursal):
+        """Posición (fila, columna) de cada registro y máscara de los que participan del plan."""
+        fv = np.searchsorted(ids_variante, columnas_variante)
+        fs = np.searchsorted(ids_sucursal, columnas_sucursal)
+        fv_ok = (fv < V) & (ids_variante[np.minimum(fv, V - 1)] == columnas_variante)
+        fs_ok = (fs < S) & (ids_sucursal[np.minimum(fs, S - 1)] == columnas_sucursal)
+        return fv, fs, fv_ok & fs_ok
+
+    vendidas = np.zeros((V, S))
+    filas = db.execute(text("""
+        SELECT vi.variante_id, v.sucursal_id, SUM(vi.cantidad)
+        FROM venta_items vi JOIN ventas v ON v.id = vi.venta_id
+        WHERE v.estado = 'confirmada' AND v.fecha >= :desde AND v.sucursal_id = ANY(:sucursales)
+        GROUP BY vi.variante_id, v.sucursal_id
+    """), {
+        "desde": datetime.now(timezone.utc) - timedelta(days=ventana_dias),
+        "sucursales": sucursales,
+    }).all()
+    if filas:
+        datos = np.asarray(filas, dtype=np.int64)
+        fv, fs, ok = indices(datos[:, 0], datos[:, 1])
+        vendidas[fv[ok], fs[ok]] = datos[ok, 2]
+
+    stock = np.zeros((V, S), dtype=np.int64)
+    filas = db.execute(
+        text("SELECT variante_id, sucursal_id, cantidad FROM stock_sucursal WHERE sucursal_id = ANY(:sucursales)"),
+        {"sucursales": sucursales},
+    ).all()
+    if filas:
+        datos = np.asarray(filas, dtype=np.int64)
+        fv, fs, ok = indices(datos[:, 0], datos[:, 1])
+        stock[fv[ok], fs[ok]] = datos[ok, 2]
+
+    disponible = np.zeros(V, dtype=np.int64)
+    filas = db.execute(
+        text("SELECT variante_id, cantidad FROM stock_sucursal WHERE sucursal_id = :central ORDER BY variante_id"
+             + (" FOR UPDATE" if bloquear else "")),
+        {"central": central_id},
+    ).all()
+    if filas:
+        datos = np.asarray(filas, dtype=np.int64)
+        fv = np.searchsorted(ids_variante, datos[:, 0])
+        ok = (fv < V) & (ids_variante[np.minimum(fv, V - 1)] == datos[:, 0])
+        disponible[fv[ok]] = datos[ok, 1]
+
+    velocidad = vendidas / ventana_dias
+    objetivo = np.maximum(minimos[:, None], np.ceil(velocidad * dias_cobertura))
+    necesidad = np.maximum(objetivo.astype(np.int64) - stock, 0)
+    asignado = asignar(necesidad, velocidad, disponible)
+
+    fv, fs = np.nonzero(asignado)
+    plan["lineas"] = [
+        {
+            "variante_id": int(ids_variante[v]),
+            "sucursal_id": int(ids_sucursal[s]),
+            "cantidad": int(asignado[v, s]),
+            "necesidad": int(necesidad[v, s]),
+            "stock_actual": int(stock[v, s]),
+            "velocidad_diaria": round(float(velocidad[v, s]), 3),
+        }
+        for v, s in zip(fv.tolist(), fs.tolist())
+    ]
+    plan["unidades"] = int(asignado.sum())
+    plan["faltante"] = int((necesidad - asignado).sum())
+    return plan
+
+
+def ejecutar(db: Session, plan: dict, notas: str = "Plan de reposición") -> Dict[tuple, int]:
+    """
+    Crea las transferencias del plan y mueve el stock en bloque (un
+    executemany + un upsert).  Debe llamarse en la misma transacción que
+    `planificar(..., bloquear=True)`.  Devuelve {(variante, sucursal): transferencia_id}.
+    """
+    lineas: List[dict] = plan["lineas"]
+    if not lineas:
+        return {}
+    central_id = plan["central_id"]
+    creadas = db.execute(
+        insert(Transferencia).returning(Transferencia.id, Transferencia.variante_id, Transferencia.sucursal_destino_id),
+        [
+            {
+                "variante_id": l["variante_id"],
+                "tipo": TipoTransferenciaEnum.central_a_sucursal,
+                "sucursal_origen_id": central_id,
+                "sucursal_destino_id": l["sucursal_id"],
+                "cantidad": l["cantidad"],
+                "notas": notas,
+            }
+            for l in lineas
+        ],
+    ).all()
+    transferencias = {(variante_id, sucursal_id): tid for tid, variante_id, sucursal_id in creadas}
+
+    deltas: Dict[tuple, int] = {}
+    for l in lineas:
+        deltas[(l["variante_id"], l["sucursal_id"])] = l["cantidad"]
+        clave_central = (l["variante_id"], central_id)
+        deltas[clave_central] = deltas.get(clave_central, 0) - l["cantidad"]
+    mover_stock(db, deltas, "reposicion", referencias=transferencias)
+    return transferencias
@@ -0,0 +1,50 @@
+"""
+Serialización y compresión de respuestas.
+
+  • RespuestaJSON — response class por defecto de la app, basada en orjson.
+    Produce el mismo JSON compacto que JSONResponse (UTF-8, sin espacios) y
+    codifica Decimal igual que FastAPI (`decimal_encoder`): entero si no
+    tiene decimales, float si los tiene.
+  • agregar_compresion — brotli (si `brotli-asgi` está instalado) con
+    fallback a gzip según Accept-Encoding, solo por encima de un umbral.
+"""
+
+import logging
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _default(valor: Any):
+    if isinstance(valor, Decimal):
+        return int(valor) if valor.as_tuple().exponent >= 0 else float(valor)
+    raise TypeError(f"Tipo no serializable a JSON: {type(valor).__name__}")
+
+
+class RespuestaJSON(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def agregar_compresion(app):
+    """Registra el middleware de compresión negociada (br → gzip → identity)."""
+    minimo = settings.COMPRESION_MIN_BYTES
+    try:
+        from brotli_asgi import BrotliMiddleware
+    except ImportError:
+        from starlette.middleware.gzip import GZipMiddleware
+
+        logger.info("brotli-asgi no instalado; se comprime solo con gzip")
+        app.add_middleware(GZipMiddleware, minimum_size=minimo, compresslevel=settings.COMPRESION_NIVEL_GZIP)
+        return
+    app.add_middleware(
+        BrotliMiddleware, minimum_size=minimo, quality=settings.COMPRESION_CALIDAD_BROTLI, gzip_fallback=True,
+    )
@@ -0,0 +1,173 @@
+"""
+Línea de tiempo de movimientos: ventas, compras, gastos, retiros de
+ganancia, ajustes de saldo y transferencias en una sola consulta.
+
+Cada tipo es una rama de un `UNION ALL` con las mismas columnas (id, tipo,
+fecha, descripcion, monto, metodo_pago, sucursal_id, sucursal_destino_id,
+cantidad).  El orden es (fecha, tipo, id) descendente y se pagina por
+keyset: el cursor es la última fila de la página anterior.  Los filtros y
+el cursor se aplican dentro de cada rama, y cada rama trae como mucho
+`limite` filas ordenadas por su índice (fecha, id); el UNION solo ordena
+esas `ramas × limite` filas.  Así la primera página (y cualquier otra)
+cuesta lo mismo con un mes o con diez años de historia.
+
+Como el tipo es constante en cada rama, la condición del cursor se
+resuelve al armar el SQL: una rama de tipo menor al del cursor sigue con
+`fecha <= f`, una mayor con `fecha < f` y la del mismo tipo con
+`(fecha, id) < (f, id)`.
+
+Filtros: `sucursal_id` no aplica a ganancia ni ajustes (no son de una
+sucursal) y en transferencias matchea origen o destino; con `metodo_pago`
+se omiten las ramas sin método (ganancia, transferencia).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+TIPOS = ("venta", "compra", "gasto", "ganancia", "ajuste", "transferencia")
+
+# tipo → (FROM, columnas después de id / tipo / fecha, condición por
+# sucursal o None, condición por método de pago o None, condición fija)
+_RAMAS = {
+    "venta": (
+        "ventas t LEFT JOIN clientes c ON c.id = t.cliente_id",
+        "c.nombre, t.total, CAST(t.metodo_pago AS VARCHAR), t.sucursal_id, NULL, NULL",
+        "t.sucursal_id = :sucursal_id", "t.metodo_pago = :metodo_pago", "t.estado = 'confirmada'",
+    ),
+    "compra": (
+        "compras t",
+        "t.proveedor, t.total, CAST(t.metodo_pago AS VARCHAR), t.sucursal_id, NULL, NULL",
+        "t.sucursal_id = :sucursal_id", "t.metodo_pago = :metodo_pago", None,
+    ),
+    "gasto": (
+        "gastos t",
+        "t.concepto, t.monto, CAST(t.metodo_pago AS VARCHAR), t.sucursal_id, NULL, NULL",
+        "t.sucursal_id = :sucursal_id", "t.metodo_pago = :metodo_pago", None,
+    ),
+    "ganancia": (
+        "ganancia_ajuste t",
+        "t.nota, t.monto_extraido, NULL, NULL, NULL, NULL",
+        None, None, None,
+    ),
+    "ajuste": (
+        "ajustes_saldo t",
+        "t.nota, t.monto_nuevo - t.monto_anterior, CAST(t.tipo AS VARCHAR), NULL, NULL, NULL",
+        None, "t.tipo = :metodo_pago", None,
+    ),
+    "transferencia": (
+        "transferencias t",
+        "t.notas, NULL, NULL, t.sucursal_origen_id, t.sucursal_destino_id, t.cantidad",
+        "(t.sucursal_origen_id = :sucursal_id OR t.sucursal_destino_id = :sucursal_id)", None, None,
+    ),
+}
+
+# Índices (fecha, id) que usa cada rama; los crea `_run_migrations`
+INDICES = {
+    "ix_ventas_confirmadas_fecha": "ventas (fecha, id) WHERE estado = 'confirmada'",
+    "ix_compras_fecha": "compras (fecha, id)",
+    "ix_gastos_fecha": "gastos (fecha, id)",
+    "ix_ganancia_ajuste_fecha": "ganancia_ajuste (fecha, id)",
+    "ix_ajustes_saldo_fecha": "ajustes_saldo (fecha, id)",
+    "ix_transferencias_fecha": "transferencias (fecha, id)",
+}
+
+
+def codificar_cursor(fila: dict) -> str:
+    crudo = json.dumps({"f": fila["fecha"].isoformat(), "t": fila["tipo"], "i": fila["id"]})
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def leer_cursor(cursor: str) -> Tuple[datetime, str, int]:
+    """(fecha, tipo, id) del cursor.  ValueError si no es un cursor válido."""
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        fecha, tipo, id_ = datetime.fromisoformat(datos["f"]), datos["t"], int(datos["i"])
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError("Cursor inválido") from exc
+    if tipo not in TIPOS:
+        raise ValueError("Cursor inválido")
+    return fecha, tipo, id_
+
+
+def _rama(tipo: str, sucursal_id: Optional[int], metodo_pago: Optional[str],
+          cursor: Optional[Tuple[datetime, str, int]]) -> Optional[str]:
+    desde, columnas, por_sucursal, por_metodo, fija = _RAMAS[tipo]
+    if metodo_pago and por_metodo is None:
+        return None
+    filtros = ["t.fecha IS NOT NULL"]
+    if fija:
+        filtros.append(fija)
+    filtros.append("(CAST(:fecha_desde AS TIMESTAMPTZ) IS NULL OR t.fecha >= :fecha_desde)")
+    filtros.append("(CAST(:fecha_hasta AS TIMESTAMPTZ) IS NULL OR t.fecha <= :fecha_hasta)")
+    if sucursal_id and por_sucursal:
+        filtros.append(por_sucursal)
+    if metodo_pago:
+        filtros.append(por_metodo)
+    if cursor:
+        _, tipo_cursor, _ = cursor
+        if tipo < tipo_cursor:
+            filtros.append("t.fecha <= :cursor_fecha")
+        elif tipo > tipo_cursor:
+            filtros.append("t.fecha < :cursor_fecha")
+        else:
+            filtros.append("(t.fecha, t.id) < (:cursor_fecha, :cursor_id)")
+    return f"""(
+        SELECT t.id, CAST('{tipo}' AS VARCHAR) AS tipo, t.fecha, {columnas}
+        FROM {desde}
+        WHERE {' AND '.join(filtros)}
+        ORDER BY t.fecha DESC, t.id DESC
+        LIMIT :limite
+    )"""
+
+
+def pagina(
+    db: Session,
+    tipos: Optional[Iterable[str]] = None,
+    fecha_desde: Optional[datetime] = None,
+    fecha_hasta: Optional[datetime] = None,
+    sucursal_id: Optional[int] = None,
+    metodo_pago: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limite: Optional[int] = 50,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    (filas, cursor de la página siguiente o None si no hay más).
+    `limite=None` trae todo el rango de una vez.
+    """
+    posicion = leer_cursor(cursor) if cursor else None
+    elegidos = [t for t in TIPOS if tipos is None or t in set(tipos)]
+    ramas = [r for r in (_rama(t, sucursal_id, metodo_pago, posicion) for t in elegidos) if r]
+    if not ramas:
+        return [], None
+
+    # Una fila de más para saber si hay página siguiente
+    limite_sql = limite + 1 if limite else None
+    filas = db.execute(
+        text(f"""
+            SELECT id, tipo, fecha, descripcion, monto, metodo_pago,
+                   sucursal_id, sucursal_destino_id, cantidad
+            FROM (
+                {" UNION ALL ".join(ramas)}
+            ) AS m (id, tipo, fecha, descripcion, monto, metodo_pago,
+                    sucursal_id, sucursal_destino_id, cantidad)
+            ORDER BY fecha DESC, tipo COLLATE "C" DESC, id DESC
+            LIMIT :limite
+        """),
+        {
+            "fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta,
+            "sucursal_id": sucursal_id, "metodo_pago": metodo_pago,
+            "cursor_fecha": posicion[0] if posicion else None,
+            "cursor_id": posicion[2] if posicion else None,
+            "limite": limite_sql,
+        },
+    ).mappings().all()
+    filas = [dict(f) for f in filas]
+    if limite and len(filas) > limite:
+        filas = filas[:limite]
+        return filas, codificar_cursor(filas[-1])
+    return filas, None
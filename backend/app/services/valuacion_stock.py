@@ -0,0 +1,133 @@
+"""
+Valuación del stock a costo y a precio de venta en una sola consulta.
+
+    SUM(cantidad * costo), SUM(cantidad * precio_venta), SUM(cantidad)
+    … GROUP BY GROUPING SETS ((), (sucursal), (marca), (categoria))
+
+El conjunto vacío `()` es el total general; cada dimensión pedida agrega su
+propio grouping set en la misma pasada y `GROUPING()` indica a cuál
+pertenece cada fila.
+
+Valuación histórica (`fecha`): si la fecha está cubierta por el libro de
+movimientos de stock, el stock sale de la foto anterior más los movimientos
+hasta la fecha (`inventario.SQL_STOCK_A_FECHA`, incluye ajustes manuales).
+Para fechas anteriores a la primera foto se reconstruye desde el actual
+deshaciendo los movimientos posteriores que sí quedaron registrados:
+transferencias (incluye los ingresos por compra, que se guardan como
+transferencias sin origen) y ventas confirmadas; ahí los ajustes manuales no
+se pueden deshacer.  Costo y precio se toman del historial de precios: el
+`valor_anterior` del primer cambio posterior a la fecha o, si no hubo
+cambios, el valor actual.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.inventario import SQL_STOCK_A_FECHA, cubre
+
+# dimensión → (columnas del grouping set, expresión clave, expresión nombre)
+DIMENSIONES = {
+    "sucursal": (("s.id", "s.nombre"), "CAST(s.id AS TEXT)", "s.nombre"),
+    "marca": (("p.marca",), "p.marca", "p.marca"),
+    "categoria": (("p.categoria",), "p.categoria", "p.categoria"),
+}
+
+_STOCK_ACTUAL = "SELECT variante_id, sucursal_id, cantidad FROM stock_sucursal"
+
+_STOCK_DESHACIENDO = """
+    SELECT variante_id, sucursal_id, SUM(cantidad) AS cantidad
+    FROM (
+        SELECT variante_id, sucursal_id, cantidad FROM stock_sucursal
+        UNION ALL
+        SELECT variante_id, sucursal_destino_id, -cantidad
+        FROM transferencias WHERE fecha > :fecha AND sucursal_destino_id IS NOT NULL
+        UNION ALL
+        SELECT variante_id, sucursal_origen_id, cantidad
+        FROM transferencias WHERE fecha > :fecha AND sucursal_origen_id IS NOT NULL
+        UNION ALL
+        SELECT vi.variante_id, v.sucursal_id, vi.cantidad
+        FROM venta_items vi JOIN ventas v ON v.id = vi.venta_id
+        WHERE v.estado = 'confirmada' AND v.fecha > :fecha
+    ) movimientos
+    GROUP BY variante_id, sucursal_id
+"""
+
+_PRECIOS_A_FECHA = """
+    SELECT DISTINCT ON (variante_id, campo) variante_id, campo, valor_anterior
+    FROM precio_historial
+    WHERE fecha > :fecha
+    ORDER BY variante_id, campo, fecha
+"""
+
+
+def _segun_grupo(dimensiones: List[str], expresion) -> str:
+    """CASE que elige `expresion(d)` según el grouping set de la fila (GROUPING(col) = 0)."""
+    if not dimensiones:
+        return "NULL"
+    casos = " ".join(f"WHEN GROUPING({DIMENSIONES[d][0][0]}) = 0 THEN {expresion(d)}" for d in dimensiones)
+    return f"CASE {casos} END"
+
+
+def valuar(db: Session, dimensiones: Iterable[str] = (), fecha: Optional[datetime] = None) -> List[dict]:
+    """
+    Filas de valuación: la primera (`dimension` None) es el total general y
+    le siguen las de cada dimensión pedida.
+    """
+    dimensiones = [d for d in DIMENSIONES if d in set(dimensiones)]
+
+    if fecha is None:
+        ctes = f"stock AS ({_STOCK_ACTUAL})"
+        costo, precio, join_precios = "v.costo", "v.precio_venta", ""
+    else:
+        stock = SQL_STOCK_A_FECHA if cubre(db, fecha) else _STOCK_DESHACIENDO
+        ctes = f"stock AS ({stock}), precios AS ({_PRECIOS_A_FECHA})"
+        costo = "COALESCE(pc.valor_anterior, v.costo)"
+        precio = "COALESCE(pv.valor_anterior, v.precio_venta)"
+        join_precios = """
+            LEFT JOIN precios pc ON pc.variante_id = v.id AND pc.campo = 'costo'
+            LEFT JOIN precios pv ON pv.variante_id = v.id AND pv.campo = 'precio_venta'
+        """
+
+    sets = ["()"] + [f"({', '.join(DIMENSIONES[d][0])})" for d in dimensiones]
+    dimension = _segun_grupo(dimensiones, lambda d: f"'{d}'")
+    clave = _segun_grupo(dimensiones, lambda d: DIMENSIONES[d][1])
+    nombre = _segun_grupo(dimensiones, lambda d: DIMENSIONES[d][2])
+
+    filas = db.execute(
+        text(f"""
+            WITH {ctes}
+            SELECT {dimension} AS dimension,
+                   {clave} AS clave,
+                   {nombre} AS nombre,
+                   COALESCE(SUM(st.cantidad * {costo}), 0) AS total_valor_costo,
+                   COALESCE(SUM(st.cantidad * {precio}), 0) AS total_valor_venta,
+                   COALESCE(SUM(st.cantidad), 0) AS cantidad_total_unidades
+            FROM stock st
+            JOIN variantes v ON v.id = st.variante_id
+            JOIN productos p ON p.id = v.producto_id
+            LEFT JOIN sucursales s ON s.id = st.sucursal_id
+            {join_precios}
+            GROUP BY GROUPING SETS ({", ".join(sets)})
+            ORDER BY dimension NULLS FIRST, total_valor_costo DESC
+        """),
+        {"fecha": fecha},
+    ).mappings().all()
+
+    resultado = []
+    for f in filas:
+        costo_total = Decimal(f["total_valor_costo"])
+        venta_total = Decimal(f["total_valor_venta"])
+        resultado.append({
+            "dimension": f["dimension"],
+            "clave": f["clave"],
+            "nombre": f["nombre"],
+            "total_valor_costo": costo_total,
+            "total_valor_venta": venta_total,
+            "cantidad_total_unidades": int(f["cantidad_total_unidades"]),
+            "diferencia_ganancia_potencial": venta_total - costo_total,
+        })
+    return resultado
@@ -0,0 +1,15 @@
+"""
+Benchmarks del backend.
+
+  • generador  — dataset sintético determinístico, cargado con COPY en un Postgres local.
+  • run        — mide los endpoints calientes in-process (latencia, consultas SQL,
+                 memoria) y emite un baseline JSON comparable entre commits.
+  • locustfile — la misma mezcla de endpoints como carga HTTP contra un servidor real.
+
+Uso típico (desde backend/, con DATABASE_URL apuntando a una base descartable):
+
+    python -m benchmarks.generador --productos 500 --anios 2 --semilla 42
+    python -m benchmarks.run --salida benchmarks/resultados/base.json
+    python -m benchmarks.run --comparar benchmarks/resultados/base.json
+    locust -f benchmarks/locustfile.py --host http://localhost:8000
+"""
@@ -0,0 +1,303 @@
+"""
+Generador de dataset sintético determinístico.
+
+Con la misma semilla y los mismos parámetros genera exactamente las mismas
+filas, también en días distintos (`--hasta` tiene un default fijo): productos con variantes, sucursales, clientes y `anios` de ventas,
+compras y gastos con distribuciones realistas (popularidad tipo Pareto,
+estacionalidad semanal, tickets de 1–4 ítems, precios log-normales).
+
+La carga se hace con COPY sobre la conexión psycopg2 del engine de la app,
+así que DATABASE_URL debe apuntar a una base descartable: las tablas se
+vacían antes de cargar.
+
+    python -m benchmarks.generador --productos 500 --anios 2 --semilla 42
+"""
+
+import argparse
+import csv
+import io
+import math
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+MARCAS = [
+    "Star Nutrition", "ENA", "Gentech", "Xtrenght", "Optimum Nutrition", "Body Advance",
+    "Nutrilab", "Universal", "MuscleTech", "Dymatize", "Ultra Tech", "Pulver",
+]
+CATEGORIAS = ["Proteína", "Creatina", "Pre-workout", "Aminoácidos", "Vitaminas", "Colágeno", "Magnesio", "Otro"]
+SABORES = ["Vainilla", "Chocolate", "Frutilla", "Cookies", "Banana", "Neutro", "Limón", "Frutos rojos"]
+TAMANIOS = ["250 g", "500 g", "1 kg", "2 lb", "5 lb", "60 caps", "120 caps", "300 g"]
+LOCALIDADES = ["Córdoba", "Rosario", "CABA", "La Plata", "Mendoza", "Tucumán", "Mar del Plata", "Salta"]
+PROVEEDORES = ["Distribuidora Norte", "Suplementos Mayorista", "Importadora Sur", "Fitness Supply"]
+CATEGORIAS_GASTO = ["Publicidad", "Envío", "Alquiler", "Otros"]
+# Último día por defecto: fijo, para que la misma semilla dé el mismo dataset
+# cualquier día y los baselines de `benchmarks.run` sigan siendo comparables
+HASTA_POR_DEFECTO = date(2025, 6, 30)
+METODOS = ["efectivo", "transferencia", "tarjeta"]
+PESOS_METODO = [0.45, 0.40, 0.15]
+# lunes → domingo: más movimiento a fin de semana
+PESO_DIA_SEMANA = [0.85, 0.9, 0.95, 1.0, 1.25, 1.35, 0.7]
+
+TABLAS = [
+    "venta_items", "ventas", "compra_items", "compras", "gastos", "transferencias",
+    "stock_sucursal", "precio_historial", "variantes", "productos", "clientes",
+    "categorias_gasto", "categorias_producto", "sucursales", "ajustes_saldo", "ganancia_ajuste",
+    "movimientos_caja", "movimientos_stock", "snapshot_stock_items", "snapshots_stock",
+]
+# Tablas con PK compuesta (sin columna `id` ni secuencia)
+SIN_ID = {"snapshot_stock_items"}
+
+
+def _precio(valor: float) -> Decimal:
+    return Decimal(str(round(valor, 2)))
+
+
+class Dataset:
+    """Filas listas para COPY, agrupadas por tabla (en orden de carga)."""
+
+    def __init__(self):
+        self.tablas: dict[str, tuple[list[str], list[tuple]]] = {}
+
+    def agregar(self, tabla: str, columnas: list[str], filas: list[tuple]):
+        self.tablas[tabla] = (columnas, filas)
+
+    def resumen(self) -> dict:
+        return {tabla: len(filas) for tabla, (_, filas) in self.tablas.items()}
+
+
+def generar(
+    productos: int = 500,
+    sucursales: int = 5,
+    clientes: int = 2000,
+    anios: int = 2,
+    ventas_por_dia: int = 60,
+    semilla: int = 42,
+    hasta: date | None = None,
+) -> Dataset:
+    rnd = random.Random(semilla)
+    hasta = hasta or HASTA_POR_DEFECTO
+    desde = hasta - timedelta(days=365 * anios)
+    ds = Dataset()
+
+    def instante(dia: date) -> datetime:
+        # horario comercial 9–21 hs
+        segundos = rnd.randint(9 * 3600, 21 * 3600)
+        return datetime.combine(dia, datetime.min.time(), tzinfo=timezone.utc) + timedelta(seconds=segundos)
+
+    alta = datetime.combine(desde, datetime.min.time(), tzinfo=timezone.utc)
+
+    # ── Sucursales (id 1 = depósito central) ─────────────────────────────────
+    filas_suc = [(1, "Depósito Central", True, True, alta)]
+    for i in range(2, sucursales + 2):
+        filas_suc.append((i, f"Sucursal {i - 1}", True, False, alta))
+    ds.agregar("sucursales", ["id", "nombre", "activa", "es_central", "creado_en"], filas_suc)
+    ids_sucursal = [f[0] for f in filas_suc if not f[3]]
+
+    ds.agregar("categorias_producto", ["id", "nombre", "activa"],
+               [(i + 1, c, True) for i, c in enumerate(CATEGORIAS)])
+    ds.agregar("categorias_gasto", ["id", "nombre", "activa"],
+               [(i + 1, c, True) for i, c in enumerate(CATEGORIAS_GASTO)])
+
+    # ── Productos y variantes ────────────────────────────────────────────────
+    filas_prod, filas_var, filas_stock = [], [], []
+    variantes = []  # (id, costo, precio, popularidad)
+    vid = 0
+    sid = 0
+    for pid in range(1, productos + 1):
+        marca = rnd.choice(MARCAS)
+        categoria = rnd.choice(CATEGORIAS)
+        activo = rnd.random() > 0.03
+        filas_prod.append((pid, f"{categoria} {marca} #{pid}", marca, categoria, None, activo, alta, None))
+
+        costo_base = math.exp(rnd.gauss(9.6, 0.6))  # ~ $15.000 mediana
+        popularidad = rnd.paretovariate(1.3)
+        for _ in range(rnd.choice([1, 1, 2, 3, 3, 4, 6])):
+            vid += 1
+            costo = _precio(costo_base * rnd.uniform(0.85, 1.2))
+            precio = _precio(float(costo) * rnd.uniform(1.25, 1.8))
+            activa = activo and rnd.random() > 0.05
+            filas_var.append((
+                vid, pid, rnd.choice(SABORES), rnd.choice(TAMANIOS), f"SKU-{vid:06d}",
+                costo, precio, 0, rnd.choice([0, 2, 5, 10]), activa, alta, None,
+            ))
+            if activa:
+                variantes.append((vid, costo, precio, popularidad * rnd.uniform(0.5, 1.5)))
+            # stock: central casi siempre, sucursales a veces
+            for suc_id in [1] + ids_sucursal:
+                if suc_id == 1 or rnd.random() < 0.6:
+                    sid += 1
+                    filas_stock.append((sid, vid, suc_id, max(0, int(rnd.gauss(12 if suc_id == 1 else 4, 6)))))
+
+    ds.agregar("productos", ["id", "nombre", "marca", "categoria", "imagen_url", "activo", "creado_en", "actualizado_en"], filas_prod)
+    ds.agregar("variantes", [
+        "id", "producto_id", "sabor", "tamanio", "sku", "costo", "precio_venta",
+        "stock_actual", "stock_minimo", "activa", "creado_en", "actualizado_en",
+    ], filas_var)
+    ds.agregar("stock_sucursal", ["id", "variante_id", "sucursal_id", "cantidad"], filas_stock)
+
+    # ── Clientes ─────────────────────────────────────────────────────────────
+    ds.agregar("clientes", ["id", "nombre", "ubicacion", "telefono", "activo", "creado_en"], [
+        (i, f"Cliente {i}", rnd.choice(LOCALIDADES), f"11{rnd.randint(10000000, 99999999)}", rnd.random() > 0.02, alta)
+        for i in range(1, clientes + 1)
+    ])
+
+    # ── Ventas ───────────────────────────────────────────────────────────────
+    pesos = [v[3] for v in variantes]
+    acumulados = []
+    total_pesos = 0.0
+    for p in pesos:
+        total_pesos += p
+        acumulados.append(total_pesos)
+
+    filas_venta, filas_vitem = [], []
+    venta_id = item_id = 0
+    dia = desde
+    while dia <= hasta:
+        esperadas = ventas_por_dia * PESO_DIA_SEMANA[dia.weekday()]
+        for _ in range(max(0, int(rnd.gauss(esperadas, esperadas * 0.2)))):
+            venta_id += 1
+            total = Decimal("0")
+            for v in rnd.choices(variantes, cum_weights=acumulados, k=rnd.choice([1, 1, 1, 2, 2, 3, 4])):
+                item_id += 1
+                cantidad = rnd.choice([1, 1, 1, 2, 3])
+                subtotal = v[2] * cantidad
+                total += subtotal
+                filas_vitem.append((item_id, venta_id, v[0], cantidad, v[2], v[1], subtotal))
+            cliente_id = rnd.randint(1, clientes) if clientes and rnd.random() < 0.7 else None
+            estado = "confirmada" if rnd.random() < 0.97 else "abierta"
+            filas_venta.append((
+                venta_id, cliente_id, rnd.choice(ids_sucursal), instante(dia),
+                rnd.choices(METODOS, PESOS_METODO)[0], estado, None, total,
+            ))
+        dia += timedelta(days=1)
+
+    ds.agregar("ventas", ["id", "cliente_id", "sucursal_id", "fecha", "metodo_pago", "estado", "notas", "total"], filas_venta)
+    ds.agregar("venta_items", ["id", "venta_id", "variante_id", "cantidad", "precio_unitario", "costo_unitario", "subtotal"], filas_vitem)
+
+    # ── Compras (reposición semanal) y gastos ────────────────────────────────
+    filas_compra, filas_citem, filas_gasto = [], [], []
+    compra_id = citem_id = gasto_id = 0
+    dia = desde
+    while dia <= hasta:
+        if dia.weekday() == 1:
+            compra_id += 1
+            total = Decimal("0")
+            for v in rnd.sample(variantes, k=min(len(variantes), rnd.randint(5, 30))):
+                citem_id += 1
+                cantidad = rnd.randint(3, 40)
+                subtotal = v[1] * cantidad
+                total += subtotal
+                filas_citem.append((citem_id, compra_id, v[0], cantidad, v[1], subtotal))
+            filas_compra.append((
+                compra_id, rnd.choice(PROVEEDORES), 1, instante(dia),
+                rnd.choices(METODOS, [0.2, 0.75, 0.05])[0], None, None, total,
+            ))
+        if rnd.random() < 0.3:
+            gasto_id += 1
+            categoria_id = rnd.randint(1, len(CATEGORIAS_GASTO))
+            filas_gasto.append((
+                gasto_id, CATEGORIAS_GASTO[categoria_id - 1], categoria_id,
+                _precio(math.exp(rnd.gauss(10, 0.8))), rnd.choice(METODOS),
+                rnd.choice(ids_sucursal + [None]), instante(dia), None,
+            ))
+        dia += timedelta(days=1)
+
+    ds.agregar("compras", ["id", "proveedor", "sucursal_id", "fecha", "metodo_pago", "factura_url", "notas", "total"], filas_compra)
+    ds.agregar("compra_items", ["id", "compra_id", "variante_id", "cantidad", "costo_unitario", "subtotal"], filas_citem)
+    ds.agregar("gastos", ["id", "concepto", "categoria_id", "monto", "metodo_pago", "sucursal_id", "fecha", "notas"], filas_gasto)
+
+    return ds
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CARGA
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def _preparar_esquema():
+    """Crea tablas y aplica las migraciones de la app sobre la base destino."""
+    from app.database import Base, engine
+    import app.models  # noqa: F401 — registra los modelos en Base.metadata
+    from app.main import _run_migrations
+
+    Base.metadata.create_all(bind=engine)
+    _run_migrations()
+
+
+def _post_carga(cur):
+    """Ajustes posteriores a la carga masiva (secuencias, estadísticas)."""
+    for tabla in TABLAS:
+        if tabla in SIN_ID:
+            continue
+        cur.execute(
+            f"SELECT setval(pg_get_serial_sequence('{tabla}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {tabla}), 0) + 1, false)"
+        )
+    cur.execute("ANALYZE")
+
+
+def cargar(ds: Dataset):
+    from app.database import engine
+
+    _preparar_esquema()
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(f"TRUNCATE {', '.join(TABLAS)} RESTART IDENTITY CASCADE")
+        for tabla, (columnas, filas) in ds.tablas.items():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for fila in filas:
+                writer.writerow(["" if v is None else v.isoformat() if isinstance(v, datetime) else v for v in fila])
+            buffer.seek(0)
+            cur.copy_expert(
+                f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv, NULL '')",
+                buffer,
+            )
+        _post_carga(cur)
+        raw.commit()
+    finally:
+        raw.close()
+
+    # COPY no pasa por el ORM: totales por variante y libro de caja se recalculan aparte;
+    # la foto de stock marca el inicio del libro de movimientos
+    from app.database import SessionLocal
+    from app.services import caja
+    from app.services.inventario import reparar_totales, tomar_snapshot
+
+    with SessionLocal() as db:
+        reparar_totales(db)
+        caja.reconstruir(db)
+        tomar_snapshot(db)
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera y carga un dataset sintético determinístico.")
+    parser.add_argument("--productos", type=int, default=500)
+    parser.add_argument("--sucursales", type=int, default=5)
+    parser.add_argument("--clientes", type=int, default=2000)
+    parser.add_argument("--anios", type=int, default=2)
+    parser.add_argument("--ventas-por-dia", type=int, default=60)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--hasta", type=date.fromisoformat, default=None,
+                        help=f"Último día con movimientos (YYYY-MM-DD). Default: {HASTA_POR_DEFECTO}.")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    ds = generar(
+        productos=args.productos, sucursales=args.sucursales, clientes=args.clientes,
+        anios=args.anios, ventas_por_dia=args.ventas_por_dia, semilla=args.semilla, hasta=args.hasta,
+    )
+    generado = time.perf_counter()
+    cargar(ds)
+    fin = time.perf_counter()
+
+    for tabla, cantidad in ds.resumen().items():
+        print(f"{tabla:<22} {cantidad:>10,}")
+    print(f"generación {generado - inicio:.1f}s · carga {fin - generado:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Carga HTTP con Locust sobre los endpoints calientes.
+
+    locust -f benchmarks/locustfile.py --host http://localhost:8000 \
+        --users 50 --spawn-rate 10 --run-time 2m --headless --json > resultados.json
+
+Los pesos reproducen una sesión típica: el POS lista stock y registra
+ventas, el dashboard consulta finanzas y comparación de sucursales.
+"""
+
+import random
+
+from locust import HttpUser, between, events, task
+
+
+class Datos:
+    variantes: list = []
+    sucursales: list = []
+
+
+@events.test_start.add_listener
+def _cargar_datos(environment, **kwargs):
+    """Toma variantes y sucursales reales del catálogo para armar ventas válidas."""
+    import requests
+
+    host = environment.host.rstrip("/")
+    Datos.sucursales = [s["id"] for s in requests.get(f"{host}/sucursales", timeout=30).json() if not s["es_central"]]
+    Datos.variantes = [
+        (v["id"], v["precio_venta"])
+        for p in requests.get(f"{host}/stock", timeout=120).json()
+        for v in p["variantes"]
+        if float(v["precio_venta"]) > 0
+    ]
+
+
+class UsuarioPOS(HttpUser):
+    wait_time = between(0.5, 2)
+
+    @task(5)
+    def stock(self):
+        self.client.get("/stock")
+
+    @task(3)
+    def crear_venta(self):
+        if not Datos.variantes or not Datos.sucursales:
+            return
+        items = random.sample(Datos.variantes, k=min(len(Datos.variantes), random.randint(1, 4)))
+        self.client.post("/ventas", name="/ventas [crear]", json={
+            "sucursal_id": random.choice(Datos.sucursales),
+            "metodo_pago": random.choice(["efectivo", "transferencia", "tarjeta"]),
+            "items": [
+                {"variante_id": vid, "cantidad": random.randint(1, 3), "precio_unitario": precio}
+                for vid, precio in items
+            ],
+        })
+
+    @task(2)
+    def clientes(self):
+        self.client.get("/clientes")
+
+
+class UsuarioDashboard(HttpUser):
+    wait_time = between(2, 5)
+
+    @task(3)
+    def liquidez(self):
+        self.client.get("/finanzas/liquidez")
+
+    @task(2)
+    def comparacion(self):
+        self.client.get("/sucursales/comparacion")
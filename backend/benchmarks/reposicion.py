@@ -0,0 +1,54 @@
+"""
+Benchmark del solver de reposición (`app.services.reposicion.asignar`).
+
+Arma matrices sintéticas variantes × sucursales con el central escaso en
+una fracción de las variantes (el caso caro: reparto proporcional con
+redistribución) y mide el solver solo, sin base.  La corrida completa del
+endpoint suma las tres consultas de carga; para eso está
+`python -m benchmarks.run` contra una base cargada.
+
+    python -m benchmarks.reposicion
+    python -m benchmarks.reposicion --variantes 5000 --sucursales 20 --escasez 0.5
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.services.reposicion import asignar
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variantes", type=int, default=5000)
+    parser.add_argument("--sucursales", type=int, default=20)
+    parser.add_argument("--escasez", type=float, default=0.5, help="Fracción de variantes con central insuficiente")
+    parser.add_argument("--iteraciones", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.semilla)
+    V, S = args.variantes, args.sucursales
+    velocidad = rng.gamma(0.6, 1.5, (V, S)) * (rng.random((V, S)) < 0.7)
+    necesidad = np.ceil(velocidad * 8).astype(np.int64)
+    total = necesidad.sum(axis=1)
+    escasa = rng.random(V) < args.escasez
+    disponible = np.where(escasa, (total * rng.uniform(0.1, 0.9, V)).astype(np.int64), total + 10)
+
+    tiempos = []
+    for _ in range(args.iteraciones):
+        inicio = time.perf_counter()
+        asignado = asignar(necesidad, velocidad, disponible)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    assert (asignado <= necesidad).all() and (asignado.sum(axis=1) <= disponible).all()
+    cubierto = asignado.sum() / max(1, np.minimum(total, disponible).sum())
+    print(f"Matriz: {V} variantes × {S} sucursales ({escasa.sum()} con central escaso)")
+    print(f"Solver: p50 {statistics.median(tiempos):.1f} ms   min {min(tiempos):.1f} ms")
+    print(f"Unidades asignadas: {int(asignado.sum())} ({cubierto:.1%} de lo asignable)")
+
+
+if __name__ == "__main__":
+    main()
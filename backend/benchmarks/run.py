@@ -0,0 +1,280 @@
+"""
+Runner de benchmarks in-process.
+
+Levanta la app con TestClient sobre la base apuntada por DATABASE_URL
+(cargada con `benchmarks.generador`) y, por cada escenario, mide:
+
+  • latencia (media / p50 / p95 / máx) en ms
+  • cantidad de consultas SQL por request
+  • pico de memoria Python por request (tracemalloc, en una corrida aparte)
+  • bytes de la respuesta
+
+El resultado es un JSON con el commit actual; `--comparar` lo contrasta
+contra un baseline previo y sale con código 1 si algo empeoró más allá
+de la tolerancia.
+
+    python -m benchmarks.run --salida benchmarks/resultados/base.json
+    python -m benchmarks.run --comparar benchmarks/resultados/base.json --tolerancia 0.2
+"""
+
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Optional
+
+from sqlalchemy import event, text
+
+
+class Escenario:
+    def __init__(
+        self,
+        nombre: str,
+        metodo: str,
+        ruta: str,
+        params: Optional[dict] = None,
+        cuerpo: Optional[Callable[["Contexto"], dict]] = None,
+        estado_esperado: int = 200,
+    ):
+        self.nombre = nombre
+        self.metodo = metodo
+        self.ruta = ruta
+        self.params = params or {}
+        self.cuerpo = cuerpo
+        self.estado_esperado = estado_esperado
+
+
+class Contexto:
+    """Datos del dataset que necesitan los escenarios de escritura."""
+
+    def __init__(self, engine, semilla: int):
+        self.rnd = random.Random(semilla)
+        with engine.connect() as conn:
+            self.variantes = [
+                (r.id, r.precio_venta) for r in conn.execute(text(
+                    "SELECT id, precio_venta FROM variantes WHERE activa AND precio_venta > 0 ORDER BY id"
+                ))
+            ]
+            self.sucursales = [r.id for r in conn.execute(text(
+                "SELECT id FROM sucursales WHERE activa AND NOT es_central ORDER BY id"
+            ))]
+        if not self.variantes or not self.sucursales:
+            raise SystemExit("La base no tiene datos: corré primero `python -m benchmarks.generador`.")
+
+
+def _cuerpo_venta(ctx: Contexto) -> dict:
+    items = ctx.rnd.sample(ctx.variantes, k=min(len(ctx.variantes), ctx.rnd.randint(1, 4)))
+    return {
+        "sucursal_id": ctx.rnd.choice(ctx.sucursales),
+        "metodo_pago": ctx.rnd.choice(["efectivo", "transferencia", "tarjeta"]),
+        "items": [
+            {"variante_id": vid, "cantidad": ctx.rnd.randint(1, 3), "precio_unitario": str(precio)}
+            for vid, precio in items
+        ],
+    }
+
+
+def _cuerpo_compra_grande(ctx: Contexto) -> dict:
+    """Factura de proveedor: 200 líneas, cada una repartida entre hasta 5 sucursales."""
+    destinos = ctx.sucursales[:5]
+    items = ctx.rnd.sample(ctx.variantes, k=min(len(ctx.variantes), 200))
+    return {
+        "proveedor": "Benchmark",
+        "sucursal_id": destinos[0],
+        "metodo_pago": "transferencia",
+        "items": [
+            {
+                "variante_id": vid,
+                "cantidad": 10 * len(destinos) + 5,
+                "costo_unitario": str((precio * Decimal("0.6")).quantize(Decimal("0.01"))),
+                "distribucion": [{"sucursal_id": s, "cantidad": 10} for s in destinos],
+            }
+            for vid, precio in items
+        ],
+    }
+
+
+def _cuerpo_precio_lote(ctx: Contexto) -> dict:
+    """Ajuste por inflación sobre hasta 3.000 variantes, en modo simulación (no modifica la base)."""
+    return {
+        "variante_ids": [vid for vid, _ in ctx.variantes[:3000]],
+        "modo": "porcentaje",
+        "valor": "7.5",
+        "simular": True,
+    }
+
+
+ESCENARIOS = [
+    Escenario("finanzas_liquidez", "GET", "/finanzas/liquidez"),
+    Escenario("stock_listado", "GET", "/stock"),
+    Escenario("stock_plan_reposicion", "GET", "/stock/plan-reposicion"),
+    Escenario("clientes_listado", "GET", "/clientes"),
+    Escenario("sucursales_comparacion", "GET", "/sucursales/comparacion"),
+    Escenario("movimientos_timeline", "GET", "/movimientos/timeline?limite=50"),
+    Escenario("ventas_crear", "POST", "/ventas", cuerpo=_cuerpo_venta, estado_esperado=201),
+    Escenario("compras_crear_200_lineas", "POST", "/compras", cuerpo=_cuerpo_compra_grande, estado_esperado=201),
+    Escenario("productos_precio_lote_3000", "POST", "/productos/lote/precio", cuerpo=_cuerpo_precio_lote),
+]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# MEDICIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+class _ContadorConsultas:
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args, **kwargs):
+        self.total += 1
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p
+    inferior = int(k)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (k - inferior)
+
+
+def _ejecutar(client, esc: Escenario, ctx: Contexto):
+    kwargs = {"params": esc.params}
+    if esc.cuerpo:
+        kwargs["json"] = esc.cuerpo(ctx)
+    resp = client.request(esc.metodo, esc.ruta, **kwargs)
+    if resp.status_code != esc.estado_esperado:
+        raise RuntimeError(f"{esc.nombre}: HTTP {resp.status_code} — {resp.text[:200]}")
+    return resp
+
+
+def medir(client, consultas: _ContadorConsultas, esc: Escenario, ctx: Contexto,
+          iteraciones: int, calentamiento: int) -> dict:
+    for _ in range(calentamiento):
+        _ejecutar(client, esc, ctx)
+
+    tiempos = []
+    consultas_por_request = []
+    tamanio = 0
+    for _ in range(iteraciones):
+        antes = consultas.total
+        inicio = time.perf_counter()
+        resp = _ejecutar(client, esc, ctx)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        consultas_por_request.append(consultas.total - antes)
+        tamanio = len(resp.content)
+
+    tracemalloc.start()
+    _ejecutar(client, esc, ctx)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iteraciones": iteraciones,
+        "media_ms": round(statistics.fmean(tiempos), 3),
+        "p50_ms": round(_percentil(tiempos, 0.50), 3),
+        "p95_ms": round(_percentil(tiempos, 0.95), 3),
+        "max_ms": round(max(tiempos), 3),
+        "consultas": max(consultas_por_request),
+        "memoria_pico_kb": round(pico / 1024, 1),
+        "bytes": tamanio,
+    }
+
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "desconocido"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# COMPARACIÓN
+# ═══════════════════════════════════════════════════════════════════════════════
+
+# métrica → tolerancia absoluta mínima para no reportar ruido en valores chicos
+METRICAS_COMPARADAS = {"p50_ms": 1.0, "p95_ms": 2.0, "consultas": 0, "memoria_pico_kb": 64}
+
+
+def comparar(base: dict, actual: dict, tolerancia: float) -> list[str]:
+    regresiones = []
+    for nombre, medido in actual["escenarios"].items():
+        previo = base.get("escenarios", {}).get(nombre)
+        if not previo:
+            continue
+        for metrica, minimo in METRICAS_COMPARADAS.items():
+            antes, ahora = previo.get(metrica), medido.get(metrica)
+            if antes is None or ahora is None:
+                continue
+            if ahora > antes * (1 + tolerancia) and ahora - antes > minimo:
+                regresiones.append(f"{nombre}.{metrica}: {antes} → {ahora}")
+    return regresiones
+
+
+def _imprimir(resultado: dict, base: Optional[dict]):
+    print(f"{'escenario':<26} {'p50 ms':>9} {'p95 ms':>9} {'SQL':>6} {'mem KB':>9} {'bytes':>10}")
+    for nombre, m in resultado["escenarios"].items():
+        fila = f"{nombre:<26} {m['p50_ms']:>9.2f} {m['p95_ms']:>9.2f} {m['consultas']:>6} {m['memoria_pico_kb']:>9.1f} {m['bytes']:>10,}"
+        previo = (base or {}).get("escenarios", {}).get(nombre)
+        if previo:
+            fila += f"   (base p50 {previo['p50_ms']:.2f} · SQL {previo['consultas']})"
+        print(fila)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks in-process de los endpoints calientes.")
+    parser.add_argument("--iteraciones", type=int, default=30)
+    parser.add_argument("--calentamiento", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--solo", nargs="*", help="Nombres de escenarios a correr")
+    parser.add_argument("--salida", type=Path, help="Ruta del JSON de resultados")
+    parser.add_argument("--comparar", type=Path, help="Baseline JSON contra el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.15)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from app.database import engine
+    from app.main import app
+
+    escenarios = [e for e in ESCENARIOS if not args.solo or e.nombre in args.solo]
+    consultas = _ContadorConsultas(engine)
+
+    with TestClient(app) as client:
+        ctx = Contexto(engine, args.semilla)
+        resultado = {
+            "commit": _commit_actual(),
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "iteraciones": args.iteraciones,
+            "escenarios": {
+                e.nombre: medir(client, consultas, e, ctx, args.iteraciones, args.calentamiento)
+                for e in escenarios
+            },
+        }
+
+    base = json.loads(args.comparar.read_text()) if args.comparar else None
+    _imprimir(resultado, base)
+
+    if args.salida:
+        args.salida.parent.mkdir(parents=True, exist_ok=True)
+        args.salida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+        print(f"\nresultados → {args.salida}")
+
+    if base:
+        regresiones = comparar(base, resultado, args.tolerancia)
+        if regresiones:
+            print("\nREGRESIONES:")
+            for r in regresiones:
+                print(f"  • {r}")
+            sys.exit(1)
+        print("\nsin regresiones respecto del baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark de serialización: listado de stock con ~5k variantes.
+
+Compara el costo de CPU de convertir la respuesta de GET /stock a bytes con
+`JSONResponse` (json de la stdlib) contra `RespuestaJSON` (orjson), y el
+tamaño en el cable sin comprimir / gzip / brotli.  No necesita base: arma
+los objetos en memoria con la misma forma que devuelve el endpoint.
+
+    python -m benchmarks.serializacion
+    python -m benchmarks.serializacion --productos 2000 --variantes 5 --iteraciones 20
+"""
+
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.schemas import ProductoConStockResponse
+from app.services.serializacion import RespuestaJSON
+
+
+def _catalogo(productos: int, variantes: int, sucursales: int, semilla: int) -> list:
+    rng = random.Random(semilla)
+    creado = datetime(2024, 1, 1, 12, 0, 0)
+    nombres_suc = [f"Sucursal {i}" for i in range(1, sucursales + 1)]
+    catalogo, vid = [], 0
+    for pid in range(1, productos + 1):
+        items = []
+        for _ in range(variantes):
+            vid += 1
+            stocks = [
+                {"sucursal_id": i + 1, "sucursal_nombre": nombres_suc[i], "cantidad": rng.randint(0, 40)}
+                for i in range(sucursales)
+            ]
+            central = rng.randint(0, 200)
+            costo = Decimal(rng.randint(1000, 50000)) / 100
+            items.append({
+                "id": vid,
+                "producto_id": pid,
+                "sabor": rng.choice(["Chocolate", "Vainilla", "Frutilla", None]),
+                "tamanio": rng.choice(["1kg", "2lb", "5lb", "300g"]),
+                "sku": f"SKU-{vid:06d}",
+                "costo": costo,
+                "precio_venta": (costo * Decimal("1.45")).quantize(Decimal("0.01")),
+                "stock_central": central,
+                "stock_total": central + sum(s["cantidad"] for s in stocks),
+                "stock_minimo": rng.randint(0, 10),
+                "activa": True,
+                "creado_en": creado,
+                "stocks_sucursal": stocks,
+            })
+        catalogo.append({
+            "id": pid,
+            "nombre": f"Producto {pid}",
+            "marca": f"Marca {pid % 40}",
+            "categoria": rng.choice(["proteina", "creatina", "vitaminas", "otros"]),
+            "imagen_url": None,
+            "activo": True,
+            "creado_en": creado,
+            "variantes": items,
+        })
+    return catalogo
+
+
+def _medir(funcion, iteraciones: int) -> dict:
+    tiempos = []
+    for _ in range(iteraciones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "media_ms": round(statistics.fmean(tiempos), 2),
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "min_ms": round(min(tiempos), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, default=1000)
+    parser.add_argument("--variantes", type=int, default=5)
+    parser.add_argument("--sucursales", type=int, default=4)
+    parser.add_argument("--iteraciones", type=int, default=10)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    adaptador = TypeAdapter(List[ProductoConStockResponse])
+    modelos = adaptador.validate_python(_catalogo(args.productos, args.variantes, args.sucursales, args.semilla))
+
+    # Igual que FastAPI con response_model: primero el modelo a tipos JSON,
+    # después la response class lo convierte a bytes.
+    contenido = adaptador.dump_python(modelos, mode="json")
+    stdlib = JSONResponse(contenido).body
+    rapido = RespuestaJSON(contenido).body
+    assert json.loads(stdlib) == json.loads(rapido), "orjson produjo un JSON distinto"
+
+    print(f"Variantes: {args.productos * args.variantes}")
+    print("\nCPU (modelo → bytes):")
+    for nombre, clase in (("json stdlib", JSONResponse), ("orjson", RespuestaJSON)):
+        total = _medir(lambda: clase(adaptador.dump_python(modelos, mode="json")), args.iteraciones)
+        render = _medir(lambda: clase(contenido), args.iteraciones)
+        print(f"  {nombre:<12} total {total['p50_ms']:>8} ms   solo render {render['p50_ms']:>8} ms")
+
+    print("\nBytes en el cable:")
+    print(f"  {'sin comprimir':<14} {len(rapido):>10}")
+    inicio = time.perf_counter()
+    comprimido = gzip.compress(rapido, compresslevel=6)
+    print(f"  {'gzip (6)':<14} {len(comprimido):>10}   {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    try:
+        import brotli
+    except ImportError:
+        print("  brotli         (paquete `brotli` no instalado)")
+    else:
+        inicio = time.perf_counter()
+        comprimido = brotli.compress(rapido, quality=4)
+        print(f"  {'brotli (4)':<14} {len(comprimido):>10}   {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark del perfil de producción: workers × tamaño de pool.
+
+Por cada combinación levanta gunicorn (`gunicorn.conf.py`) con
+WEB_WORKERS / DB_POOL_SIZE / DB_MAX_OVERFLOW en el entorno, espera el
+health check, calienta y genera carga HTTP concurrente durante un tiempo
+fijo sobre una mezcla de lecturas calientes.  Reporta requests/s, p50 y
+p95 por combinación y la mejor.  Usa la base de DATABASE_URL (cargada con
+`benchmarks.generador`); las combinaciones que superan `--max-conexiones`
+se saltean.
+
+    python -m benchmarks.servidor
+    python -m benchmarks.servidor --workers 1,2,4,8 --pool 5,10,20 --concurrencia 64 --duracion 20
+
+El generador de carga corre en esta misma máquina y compite por CPU con el
+servidor: para comparar combinaciones alcanza, para números absolutos
+conviene Locust desde otra máquina (`benchmarks/locustfile.py`).
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+RUTAS = [
+    "/productos?vista=lista&limite=50",
+    "/stock/alertas",
+    "/finanzas/liquidez",
+    "/sucursales/comparacion",
+    "/productos/buscar?q=prot",
+]
+
+
+def _lista(valor: str) -> list:
+    return [int(v) for v in valor.split(",") if v.strip()]
+
+
+def _esperar_arranque(url: str, proceso: subprocess.Popen, limite: float = 90) -> None:
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"gunicorn terminó con código {proceso.returncode}")
+        try:
+            if httpx.get(url + "/", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("gunicorn no respondió a tiempo")
+
+
+async def _carga(url: str, concurrencia: int, duracion: float) -> dict:
+    latencias, errores = [], 0
+    fin = time.monotonic() + duracion
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=30) as cliente:
+        async def usuario(n: int):
+            nonlocal errores
+            rutas = itertools.cycle(RUTAS[n % len(RUTAS):] + RUTAS[:n % len(RUTAS)])
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                try:
+                    resp = await cliente.get(next(rutas))
+                    if resp.status_code >= 400:
+                        errores += 1
+                        continue
+                except httpx.HTTPError:
+                    errores += 1
+                    continue
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+        await asyncio.gather(*(usuario(n) for n in range(concurrencia)))
+
+    latencias.sort()
+    return {
+        "rps": len(latencias) / duracion,
+        "p50": statistics.median(latencias) if latencias else 0.0,
+        "p95": latencias[int(len(latencias) * 0.95) - 1] if latencias else 0.0,
+        "errores": errores,
+    }
+
+
+def _medir(workers: int, pool: int, overflow: int, args) -> dict:
+    entorno = dict(
+        os.environ,
+        WEB_WORKERS=str(workers), DB_POOL_SIZE=str(pool), DB_MAX_OVERFLOW=str(overflow),
+        PORT=str(args.puerto), WEB_MAX_REQUESTS="0",
+    )
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+        cwd=RAIZ, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.puerto}"
+    try:
+        _esperar_arranque(url, proceso)
+        asyncio.run(_carga(url, args.concurrencia, args.calentamiento))
+        return asyncio.run(_carga(url, args.concurrencia, args.duracion))
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=_lista, default=[1, 2, 4])
+    parser.add_argument("--pool", type=_lista, default=[5, 10, 20])
+    parser.add_argument("--overflow", type=int, default=5)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--duracion", type=float, default=15, help="Segundos medidos por combinación")
+    parser.add_argument("--calentamiento", type=float, default=3)
+    parser.add_argument("--max-conexiones", type=int, default=90, help="Tope de conexiones a Postgres")
+    parser.add_argument("--puerto", type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    resultados = []
+    print(f"{'workers':>7} {'pool':>5} {'conex':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errores':>8}")
+    for workers, pool in itertools.product(args.workers, args.pool):
+        conexiones = workers * (pool + args.overflow)
+        if conexiones > args.max_conexiones:
+            print(f"{workers:>7} {pool:>5} {conexiones:>6}   (supera --max-conexiones, se saltea)")
+            continue
+        r = _medir(workers, pool, args.overflow, args)
+        resultados.append((workers, pool, r))
+        print(f"{workers:>7} {pool:>5} {conexiones:>6} {r['rps']:>9.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['errores']:>8}")
+
+    sin_errores = [x for x in resultados if x[2]["errores"] == 0] or resultados
+    if sin_errores:
+        workers, pool, r = max(sin_errores, key=lambda x: x[2]["rps"])
+        print(f"\nMejor: WEB_WORKERS={workers} DB_POOL_SIZE={pool} DB_MAX_OVERFLOW={args.overflow} "
+              f"({r['rps']:.1f} req/s, p95 {r['p95']:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark de reposición: N variantes del depósito central a una sucursal.
+
+Compara el loop que hace hoy el frontend (un POST /stock/transferencia por
+variante, cada uno en su transacción) contra un único
+POST /stock/transferencias/lote.  Mide tiempo total y consultas SQL sobre
+la base apuntada por DATABASE_URL (cargada con `benchmarks.generador`).  Al
+final devuelve el stock al central con otro lote, así la base queda igual.
+
+    python -m benchmarks.transferencias
+    python -m benchmarks.transferencias --variantes 300 --repeticiones 5
+"""
+
+import argparse
+import statistics
+import time
+
+from sqlalchemy import text
+
+from benchmarks.run import _ContadorConsultas
+
+
+def _variantes_con_stock(engine, cantidad: int, minimo: int) -> list:
+    with engine.connect() as conn:
+        return list(conn.execute(
+            text("""
+                SELECT ss.variante_id FROM stock_sucursal ss
+                JOIN sucursales s ON s.id = ss.sucursal_id AND s.es_central
+                WHERE ss.cantidad >= :minimo
+                ORDER BY ss.variante_id LIMIT :cantidad
+            """),
+            {"minimo": minimo, "cantidad": cantidad},
+        ).scalars())
+
+
+def _medir(consultas: _ContadorConsultas, funcion) -> tuple:
+    antes = consultas.total
+    inicio = time.perf_counter()
+    funcion()
+    return (time.perf_counter() - inicio) * 1000, consultas.total - antes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variantes", type=int, default=150)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    from fastapi.testclient import TestClient
+    from app.database import engine
+    from app.main import app
+
+    consultas = _ContadorConsultas(engine)
+    # cada repetición mueve 1 unidad por variante en cada modo
+    ids = _variantes_con_stock(engine, args.variantes, 2 * args.repeticiones)
+    if not ids:
+        raise SystemExit("La base no tiene stock en el central: corré primero `python -m benchmarks.generador`.")
+
+    with TestClient(app) as client:
+        sucursal = next(s["id"] for s in client.get("/sucursales").json() if not s["es_central"] and s["activa"])
+
+        def _esperar(resp, estado):
+            if resp.status_code != estado:
+                raise RuntimeError(f"HTTP {resp.status_code} — {resp.text[:200]}")
+
+        def por_item():
+            for vid in ids:
+                _esperar(client.post("/stock/transferencia", json={
+                    "variante_id": vid, "cantidad": 1, "sucursal_destino_id": sucursal,
+                }), 201)
+
+        def lote():
+            _esperar(client.post("/stock/transferencias/lote", json={
+                "sucursal_destino_id": sucursal,
+                "items": [{"variante_id": vid, "cantidad": 1} for vid in ids],
+            }), 201)
+
+        resultados = {"por ítem": [], "lote": []}
+        for _ in range(args.repeticiones):
+            resultados["por ítem"].append(_medir(consultas, por_item))
+            resultados["lote"].append(_medir(consultas, lote))
+
+        # Devolver lo movido al central
+        _esperar(client.post("/stock/transferencias/lote", json={
+            "sucursal_origen_id": sucursal,
+            "items": [{"variante_id": vid, "cantidad": 2 * args.repeticiones} for vid in ids],
+            "notas": "Benchmark: devolución",
+        }), 201)
+
+    print(f"Variantes por reposición: {len(ids)}   repeticiones: {args.repeticiones}")
+    print(f"{'modo':<10} {'p50 ms':>10} {'SQL':>8}")
+    for modo, medidas in resultados.items():
+        print(f"{modo:<10} {statistics.median(m[0] for m in medidas):>10.1f} {max(m[1] for m in medidas):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Perfil de producción: gunicorn con workers uvicorn.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Todo sale de app/config.py (variables de entorno / .env): WEB_WORKERS,
+PORT, WEB_TIMEOUT, WEB_MAX_REQUESTS y el pool de cada worker
+(DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+DB_STATEMENT_TIMEOUT_MS).  Cada worker tiene su propio pool: el total de
+conexiones es workers × (pool + overflow) y tiene que entrar en el
+max_connections de Postgres.
+
+Las migraciones y el seed corren una sola vez, en un subproceso que lanza
+el master antes de forkear; los workers arrancan con MIGRAR_AL_INICIAR
+apagado.  El master no importa la app, así que `kill -HUP` levanta
+workers con el código nuevo.  Para elegir
+workers × pool en una máquina: `python -m benchmarks.servidor`.
+"""
+
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# Antes de cargar la configuración: los workers heredan el entorno del master
+os.environ["MIGRAR_AL_INICIAR"] = "false"
+
+from app.config import settings  # noqa: E402
+
+bind = f"0.0.0.0:{settings.PORT}"
+# Sin WEB_WORKERS: uno por CPU, con tope (en contenedores cpu_count() ve las CPUs del host)
+workers = settings.WEB_WORKERS or min(multiprocessing.cpu_count(), 4)
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = settings.WEB_TIMEOUT
+graceful_timeout = 30
+keepalive = 5
+max_requests = settings.WEB_MAX_REQUESTS
+max_requests_jitter = settings.WEB_MAX_REQUESTS // 10
+
+
+def on_starting(server):
+    # En un proceso aparte: el master no importa la app, así `kill -HUP`
+    # recarga código nuevo en los workers y no comparten estado de módulo
+    subprocess.run([sys.executable, "-c", "from app.main import migrar; migrar()"], check=True)
+
+
+def when_ready(server):
+    por_worker = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+    server.log.info(
+        "%d workers × %d conexiones (pool %d + overflow %d) = hasta %d conexiones a Postgres",
+        workers, por_worker, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, workers * por_worker,
+    )
@@ -104,6 +104,16 @@ export const movimientosApi = {
     const q = new URLSearchParams(params).toString()
     return api.get(`/movimientos/otros${q ? '?' + q : ''}`)
   },
+  timeline: (params = {}) => {
+    // `tipo` puede ser una lista: va como claves repetidas (?tipo=gasto&tipo=ganancia)
+    const q = new URLSearchParams()
+    for (const [k, v] of Object.entries(params)) {
+      if (Array.isArray(v)) v.forEach((item) => q.append(k, item))
+      else if (v !== undefined && v !== null) q.append(k, v)
+    }
+    const s = q.toString()
+    return api.get(`/movimientos/timeline${s ? '?' + s : ''}`)
+  },
 }
 
 // ── STOCK (con desglose por sucursal) ──
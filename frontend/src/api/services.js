@@ -1,9 +1,15 @@
 import { api } from './client'
 
 const buildQuery = (params = {}) => {
-  const clean = Object.fromEntries(Object.entries(params).filter(([, v]) => v !== undefined && v !== null && v !== ''))
-  const q = new URLSearchParams(clean).toString()
-  return q ? '?' + q : ''
+  const q = new URLSearchParams()
+  for (const [k, v] of Object.entries(params)) {
+    if (v === undefined || v === null || v === '') continue
+    // Listas como claves repetidas (?tipo=a&tipo=b), que es lo que espera FastAPI
+    if (Array.isArray(v)) v.forEach((item) => q.append(k, item))
+    else q.append(k, v)
+  }
+  const s = q.toString()
+  return s ? '?' + s : ''
 }
 
 export const productosApi = {
@@ -67,6 +73,7 @@ export const movimientosApi = {
   ventas: (params = {}) => api.get(`/movimientos/ventas${buildQuery(params)}`),
   compras: (params = {}) => api.get(`/movimientos/compras${buildQuery(params)}`),
   otros: (params = {}) => api.get(`/movimientos/otros${buildQuery(params)}`),
+  timeline: (params = {}) => api.get(`/movimientos/timeline${buildQuery(params)}`),
 }
 
 export const stockApi = {